@@ -32,3 +32,19 @@ def get_optimized_sunrise_sunset(filled_data_matrix=None, raw_data_matrix=None):
         optimized_dict['meas_ss_f'] = None
         optimized_dict['thres_f'] = None
     return optimized_dict
+
+
+def merge_optimized_sunrise_sunset(*optimized_dicts):
+    """
+    Combines the outputs of several `get_optimized_sunrise_sunset` calls, e.g. one run on the raw data matrix and one
+    run on the filled data matrix, into a single dictionary with the same keys and key order.
+    :param optimized_dicts: dictionaries returned by `get_optimized_sunrise_sunset`.
+    :return: dictionary with the first value that is not None for each key.
+    """
+    merged = get_optimized_sunrise_sunset()
+    for key in merged:
+        for optimized_dict in optimized_dicts:
+            if optimized_dict.get(key) is not None:
+                merged[key] = optimized_dict[key]
+                break
+    return merged
@@ -1,17 +1,28 @@
 import numpy as np
 import cvxpy as cvx
+from pvsystemprofiler.utilities.result_cache import ResultCache, array_hash
 
 """
 Calculates the angle incidence for a system based on its power matrix using signal decomposition.
 """
 
+# fitted seasonal scale factors, keyed by the content of the power matrix and the clear day selection
+costheta_cache = ResultCache(maxsize=8)
 
-def find_fit_costheta(data_matrix, clear_index):
+
+def find_fit_costheta(data_matrix, clear_index, cache=costheta_cache):
     """
     :param data_matrix: power matrix.
     :param clear_index: boolean array specifying clear days.
+    :param cache: (optional) `ResultCache` instance used to reuse fits of identical inputs. None disables caching.
     :return: angle of incidence array.
     """
+    if cache is not None:
+        key = ('find_fit_costheta', array_hash(data_matrix, clear_index))
+        scale_factor_costheta = cache.get(key)
+        if scale_factor_costheta is not None:
+            costheta_fit = data_matrix / np.max(scale_factor_costheta)
+            return scale_factor_costheta, costheta_fit
     data = np.max(data_matrix, axis=0)
     s1 = cvx.Variable(len(data))
     s2 = cvx.Variable(len(data))
@@ -24,5 +35,7 @@ def find_fit_costheta(data_matrix, clear_index):
     problem = cvx.Problem(objective, constraints)
     problem.solve(solver='MOSEK')
     scale_factor_costheta = s1.value
+    if cache is not None:
+        cache.put(key, scale_factor_costheta)
     costheta_fit = data_matrix / np.max(s1.value)
     return scale_factor_costheta, costheta_fit
@@ -1,28 +1,60 @@
 import numpy as np
 import cvxpy as cvx
+from pvsystemprofiler.utilities.result_cache import ResultCache, array_hash
 
+# fitted daytime thresholds, keyed by the content of the data matrix and the (x1, x2) parameters
+threshold_cache = ResultCache(maxsize=256)
 
-def filter_data(data_matrix, daytime_threshold=None, x1=None, x2=None):
+
+def filter_data(data_matrix, daytime_threshold=None, x1=None, x2=None, quantile_row=None, cache=threshold_cache):
     """
     :param data_matrix: Pandas DataFrame data matrix with input signal.
     :param daytime_threshold: Optional. Daytime threshold signal value separating day from night.
     :param x1: Float. Parameter for signal decomposition threshold quantile seasonality calculation.
     :param x2: Float. Parameter for signal decomposition threshold quantile seasonality calculation.
+    :param quantile_row: Optional. Precomputed `x2` quantile of each day in `data_matrix`, as returned by
+    `calculate_threshold_quantiles`. Computed from `data_matrix` if not provided.
+    :param cache: (optional) `ResultCache` instance used to reuse threshold fits of identical inputs. None disables
+    caching.
     :return: Boolean DataFrame with daylight hours.
     """
     if daytime_threshold is None:
-        daytime_threshold_fit = find_daytime_threshold_quantile_seasonality(data_matrix, x1, x2)
+        if cache is not None:
+            key = ('find_daytime_threshold_quantile_seasonality', array_hash(data_matrix), float(x1), float(x2))
+            daytime_threshold_fit = cache.get(key)
+        else:
+            daytime_threshold_fit = None
+        if daytime_threshold_fit is None:
+            daytime_threshold_fit = find_daytime_threshold_quantile_seasonality(data_matrix, x1, x2, quantile_row)
+            if cache is not None:
+                cache.put(key, daytime_threshold_fit)
         boolean_daytime = data_matrix > daytime_threshold_fit
     else:
         boolean_daytime = data_matrix > daytime_threshold
     return boolean_daytime
 
 
-def find_daytime_threshold_quantile_seasonality(data_matrix, p1, p2):
+def calculate_threshold_quantiles(data_matrix, quantiles):
+    """
+    Calculates all requested quantiles of each day in the data matrix in a single pass, so that a sweep over threshold
+    quantiles does not sort the data matrix once per quantile.
+    :param data_matrix: Pandas DataFrame data matrix with input signal.
+    :param quantiles: Float or list of floats. Quantiles to be calculated.
+    :return: dictionary with quantiles as keys and arrays with the quantile of each day as values.
+    """
+    quantiles = np.atleast_1d(quantiles)
+    quantile_rows = np.quantile(data_matrix, quantiles, axis=0)
+    return dict(zip(quantiles, quantile_rows))
+
+
+def find_daytime_threshold_quantile_seasonality(data_matrix, p1, p2, quantile_row=None):
     m = cvx.Parameter(nonneg=True, value=10 ** 6)
     # setting local quantile for 10% of the data
     t = cvx.Parameter(nonneg=True, value=p1)
-    y = np.quantile(data_matrix, p2, axis=0)
+    if quantile_row is None:
+        y = np.quantile(data_matrix, p2, axis=0)
+    else:
+        y = quantile_row
     x1 = cvx.Variable(len(y))
     x2 = cvx.Variable(len(y))
     if data_matrix.shape[1] > 365:
@@ -21,14 +21,33 @@ from pvsystemprofiler.algorithms.angle_of_incidence.lambda_functions import sele
 from pvsystemprofiler.algorithms.angle_of_incidence.dynamic_value_functions import determine_keys
 from pvsystemprofiler.algorithms.angle_of_incidence.dynamic_value_functions import select_init_values
 from pvsystemprofiler.algorithms.tilt_azimuth.daytime_threshold_quantile import filter_data
+from pvsystemprofiler.algorithms.tilt_azimuth.daytime_threshold_quantile import calculate_threshold_quantiles
 from pvsystemprofiler.utilities.tools import random_initial_values
+from pvsystemprofiler.utilities.tools import cached_property
+from pvsystemprofiler.utilities.time_budget import get_time_budget
+from pvsystemprofiler.production_profile import profile_configurations
+from pvsystemprofiler.utilities.data_reduction import downsample_factor, downsample_matrix, stratified_days
 from pvsystemprofiler.algorithms.longitude.estimation import estimate_longitude
 from pvsystemprofiler.algorithms.latitude.estimation import estimate_latitude
 
 
 class ConfigurationEstimator():
     def __init__(self, data_handler, gmt_offset, day_selection_method='all', solar_noon_method='optimized_estimates',
-                 daylight_method='optimized_estimates', data_matrix='filled', daytime_threshold=None):
+                 daylight_method='optimized_estimates', data_matrix='filled', daytime_threshold=None, time_budget=None,
+                 fast_mode=False, fast_sampling=15, fast_days=90):
+        """
+        Equation of time, declination, solar noon and daylight hours are calculated on first use and then cached, so
+        that only the inputs of the estimation methods actually called are computed.
+
+        :param time_budget: (optional) time budget in seconds, or `TimeBudget` instance. When the budget runs low,
+        cheaper methods are used: energy center of mass solar noon and the closed form estimator for longitude,
+        threshold based daylight hours for latitude and an unsmoothed daytime threshold for tilt and azimuth. Once the
+        budget has expired, tilt and azimuth are not estimated. Degraded stages are listed in the `degraded` attribute.
+        :param fast_mode: (optional) if True, tilt and azimuth are fitted on the data matrix, hour angle and declination
+        aggregated to a `fast_sampling` time grid, using only about `fast_days` clear days spread across the seasons.
+        :param fast_sampling: (optional) coarsest data sampling in minutes used in fast mode.
+        :param fast_days: (optional) number of clear days used in the fit in fast mode.
+        """
         if not data_handler._ran_pipeline:
             data_handler.run_pipeline()
         self.data_handler = data_handler
@@ -43,7 +62,6 @@ class ConfigurationEstimator():
         self.azimuth = None
         # Attributes used for all calculations
         self.gmt_offset = gmt_offset
-        self.hours_daylight = None
         self.daily_meas = self.data_handler.filled_data_matrix.shape[0]
         self.daytime_threshold = None
         self.day_interval = None
@@ -52,60 +70,156 @@ class ConfigurationEstimator():
         self.data_sampling = self.data_handler.data_sampling
         self.num_days = self.data_handler.num_days
         self.day_of_year = self.data_handler.day_index.dayofyear
-        self.eot_duffie = eot_duffie(self.day_of_year)
-        self.eot_da_rosa = eot_da_rosa(self.day_of_year)
-        self.delta = delta_cooper(self.day_of_year, self.daily_meas)
         self.omega = None
         if day_selection_method == 'all':
             self.days = self.data_handler.daily_flags.no_errors
         elif day_selection_method == 'clear':
-            self.days = self.days.daily_flags.clear
+            self.days = self.data_handler.daily_flags.clear
         elif day_selection_method == 'cloudy':
             self.days = self.data_handler.daily_flags.cloudy
+        # Configuration of the lazily calculated attributes
+        self.solar_noon_method = solar_noon_method
+        self.daylight_method = daylight_method
+        self.daylight_threshold = daytime_threshold
+        self._input_data_matrix = self.data_matrix
+        self.time_budget = get_time_budget(time_budget)
+        self.degraded = []
+        self.fast_mode = fast_mode
+        self.fast_sampling = fast_sampling
+        self.fast_days = fast_days
+        # default longitude estimation configuration, see `from_profile`
+        self.longitude_estimator = 'fit_l1'
+        self.eot_calculation = 'duffie'
+
+    @classmethod
+    def from_profile(cls, data_handler, gmt_offset, longitude_profile=None, latitude_profile=None, **kwargs):
+        """
+        Creates an estimator that uses the best ranked configuration of each production profile among the
+        configurations it supports, see `production_profile`. Latitude configurations must share the data matrix and
+        day selection of the longitude configuration, since both estimations run on the same instance.
+        :param data_handler: `DataHandler` class instance loaded with a solar power data set.
+        :param gmt_offset: The offset in hours between the local timezone and GMT/UTC.
+        :param longitude_profile: (optional) `LongitudeStudy` production profile data frame.
+        :param latitude_profile: (optional) `LatitudeStudy` production profile data frame.
+        :param kwargs: other keyword arguments passed to the constructor.
+        :return: `ConfigurationEstimator` instance.
+        """
+        lon_config = None
+        if longitude_profile is not None:
+            for est, eot, sn, ds, dm in profile_configurations(longitude_profile, 'longitude'):
+                if sn in ('rise_set_average', 'energy_com', 'optimized_estimates'):
+                    lon_config = (est, eot, sn, ds, dm)
+                    kwargs.update(solar_noon_method=sn, day_selection_method=ds, data_matrix=dm)
+                    break
+        if latitude_profile is not None:
+            for delta_id, dlm, dm, ds in profile_configurations(latitude_profile, 'latitude'):
+                supported = delta_id == 'cooper' and dlm in ('sunrise-sunset', 'optimized_estimates')
+                if lon_config is not None:
+                    supported = supported and dm == lon_config[4] and ds == lon_config[3]
+                if supported:
+                    kwargs.update(daylight_method=dlm, day_selection_method=ds, data_matrix=dm)
+                    break
+        estimator = cls(data_handler, gmt_offset, **kwargs)
+        if lon_config is not None:
+            estimator.longitude_estimator, estimator.eot_calculation = lon_config[0], lon_config[1]
+        return estimator
+
+    @cached_property
+    def eot_duffie(self):
+        return eot_duffie(self.day_of_year)
+
+    @cached_property
+    def eot_da_rosa(self):
+        return eot_da_rosa(self.day_of_year)
+
+    @cached_property
+    def delta(self):
+        return delta_cooper(self.day_of_year, self.daily_meas)
 
-        if solar_noon_method == 'optimized_estimates' or daylight_method == 'optimized_estimates':
-            ss = SunriseSunset()
+    @cached_property
+    def solarnoon(self):
+        return self._calculate_solarnoon(self.solar_noon_method)
 
-        if solar_noon_method == 'rise_set_average':
-            self.solarnoon = avg_sunrise_sunset(self.data_matrix)
-        elif solar_noon_method == 'energy_com':
-            self.solarnoon = energy_com(self.data_matrix)
-        if solar_noon_method == 'optimized_estimates':
-            ss.run_optimizer(data=self.data_matrix)
-            self.solarnoon = np.nanmean([ss.sunrise_estimates, ss.sunset_estimates], axis=0)
+    @cached_property
+    def hours_daylight(self):
+        return self._calculate_hours_daylight(self.daylight_method)
 
-        if daylight_method in ('sunrise-sunset', 'sunrise sunset'):
-            self.hours_daylight = calculate_hours_daylight(self.data_matrix, daytime_threshold)
-        elif daylight_method == 'optimized_estimates':
-            self.hours_daylight = ss.sunset_estimates - ss.sunrise_estimates
+    def _calculate_solarnoon(self, method):
+        if method == 'rise_set_average':
+            return avg_sunrise_sunset(self._input_data_matrix)
+        elif method == 'energy_com':
+            return energy_com(self._input_data_matrix)
+        elif method == 'optimized_estimates':
+            ss = self._sunrise_sunset
+            return np.nanmean([ss.sunrise_estimates, ss.sunset_estimates], axis=0)
+        return None
 
-    def estimate_longitude(self, estimator='fit_l1', eot_calculation='duffie'):
+    def _calculate_hours_daylight(self, method):
+        if method in ('sunrise-sunset', 'sunrise sunset'):
+            if self.daylight_threshold is None:
+                return calculate_hours_daylight(self._input_data_matrix)
+            return calculate_hours_daylight(self._input_data_matrix, self.daylight_threshold)
+        elif method == 'optimized_estimates':
+            ss = self._sunrise_sunset
+            return ss.sunset_estimates - ss.sunrise_estimates
+        return None
+
+    @cached_property
+    def _sunrise_sunset(self):
+        ss = SunriseSunset()
+        ss.run_optimizer(data=self._input_data_matrix)
+        return ss
+
+    def estimate_longitude(self, estimator=None, eot_calculation=None):
         """
-        :param estimator: 'calculated', 'fit_l1', 'fit_l2' or 'fit_huber'
-        :param eot_calculation: 'rise_set_average', 'energy_com', 'optimized_estimates',
-        or 'optimized_measurements'
+        :param estimator: 'calculated', 'fit_l1', 'fit_l2' or 'fit_huber'. Defaults to 'fit_l1', or to the estimator
+        of the longitude profile if created with `from_profile`.
+        :param eot_calculation: 'duffie' or 'da_rosa'. Defaults to 'duffie', or to the equation of time of the
+        longitude profile if created with `from_profile`.
         :return: None
         """
+        if estimator is None:
+            estimator = self.longitude_estimator
+        if eot_calculation is None:
+            eot_calculation = self.eot_calculation
+        solarnoon = None
+        if self._budget_is_low():
+            # the degraded solar noon is not cached, the configured method is used again once there is time
+            if 'solarnoon' not in self.__dict__ and self.solar_noon_method == 'optimized_estimates':
+                solarnoon = self._calculate_solarnoon('energy_com')
+                self.degraded.append('longitude: energy_com solar noon')
+            if estimator != 'calculated':
+                estimator = 'calculated'
+                self.degraded.append('longitude: calculated estimator')
         if eot_calculation in ('duffie', 'd', 'duf'):
             eot = self.eot_duffie
         elif eot_calculation in ('da_rosa', 'dr', 'rosa'):
             eot = self.eot_da_rosa
-        self.longitude = estimate_longitude(estimator, eot, self.solarnoon, self.days, self.gmt_offset)
+        if solarnoon is None:
+            solarnoon = self.solarnoon
+        self.longitude = estimate_longitude(estimator, eot, solarnoon, self.days, self.gmt_offset)
         return
 
     def estimate_latitude(self):
-        hours_daylight_filtered, delta_filtered = self._prepare_lat_input_data()
+        if self._budget_is_low() and 'hours_daylight' not in self.__dict__ and \
+                self.daylight_method == 'optimized_estimates' and '_sunrise_sunset' not in self.__dict__:
+            # the degraded daylight hours are not cached, the configured method is used again once there is time
+            hours_daylight = self._calculate_hours_daylight('sunrise-sunset')
+            self.degraded.append('latitude: sunrise-sunset daylight hours')
+        else:
+            hours_daylight = self.hours_daylight
+        hours_daylight_filtered, delta_filtered = self._prepare_lat_input_data(hours_daylight)
         self.latitude = estimate_latitude(hours_daylight_filtered, delta_filtered)
         return
 
-    def _prepare_lat_input_data(self):
-        if np.any(np.isnan(self.hours_daylight)):
-            hours_mask = np.isnan(self.hours_daylight)
+    def _prepare_lat_input_data(self, hours_daylight):
+        if np.any(np.isnan(hours_daylight)):
+            hours_mask = np.isnan(hours_daylight)
             full_mask = ~hours_mask & self.days
-            hours_daylight_filtered = self.hours_daylight[full_mask]
+            hours_daylight_filtered = hours_daylight[full_mask]
             delta = self.delta[:, full_mask]
         else:
-            hours_daylight_filtered = self.hours_daylight[self.days]
+            hours_daylight_filtered = hours_daylight[self.days]
             delta = self.delta[:, self.days]
         return hours_daylight_filtered, delta
 
@@ -127,17 +241,14 @@ class ConfigurationEstimator():
         :param x2: Quantile of data used in estimation of daytime threshold.
         :return: None
         """
-
+        # longitude and latitude are estimated on this instance, reusing its solar noon, daylight hours, declination
+        # and day selection
         if longitude is None:
-            est_lon = ConfigurationEstimator(self.data_handler, self.gmt_offset)
-            est_lon.estimate_longitude()
-            self.longitude = est_lon.longitude
+            self.estimate_longitude()
         else:
             self.longitude = longitude
         if latitude is None:
-            est_lat = ConfigurationEstimator(self.data_handler, self.gmt_offset)
-            est_lat.estimate_latitude()
-            self.latitude = est_lat.latitude
+            self.estimate_latitude()
         else:
             self.latitude = latitude
 
@@ -156,7 +267,9 @@ class ConfigurationEstimator():
 
     def estimate_all(self, day_interval=None, x1=0.9, x2=0.9):
         """
-        Estimate latitude, longitude, tilt and azimuth all at once.
+        Estimate latitude, longitude, tilt and azimuth all at once. Longitude and latitude are estimated on this
+        instance with the day selection given to the constructor. Tilt and azimuth are then estimated from clear days,
+        without changing the day selection of the instance.
         :param day_interval: 'all', 'clear', 'cloudy'.
         :param x1: cvx parameter. Factor used in signal decomposition for estimation of daytime threshold.
         :param x2: Quantile of data used in estimation of daytime threshold.
@@ -167,36 +280,52 @@ class ConfigurationEstimator():
         self.day_interval = day_interval
         self.x1 = x1
         self.x2 = x2
+        self.estimate_longitude()
+        self.estimate_latitude()
         dh = self.data_handler
         self.data_matrix = dh.filled_data_matrix
-        self.days = dh.daily_flags.clear
         self.num_days = dh.num_days
-        self.delta = delta_cooper(self.day_of_year, self.daily_meas)
-        est_lon = ConfigurationEstimator(self.data_handler, self.gmt_offset)
-        est_lon.estimate_longitude()
-        self.longitude = est_lon.longitude
-        est_lat = ConfigurationEstimator(self.data_handler, self.gmt_offset)
-        est_lat.estimate_latitude()
-        self.latitude = est_lat.latitude
         self.omega = calculate_omega(self.data_sampling, self.num_days, self.longitude, self.day_of_year,
                                      self.gmt_offset)
 
-        self.tilt, self.azimuth = self._cal_orientation_helper()
+        self.tilt, self.azimuth = self._cal_orientation_helper(days=dh.daily_flags.clear)
+
+    def _budget_is_low(self):
+        return self.time_budget is not None and self.time_budget.is_low()
 
-    def _cal_orientation_helper(self):
+    def _cal_orientation_helper(self, days=None):
+        if days is None:
+            days = self.days
+        if self.time_budget is not None and self.time_budget.is_expired():
+            self.degraded.append('orientation: skipped')
+            return self.tilt, self.azimuth
         if self.day_interval is not None:
             day_range = (self.day_of_year > self.day_interval[0]) & (self.day_of_year < self.day_interval[1])
         else:
             day_range = np.ones(self.day_of_year.shape, dtype=bool)
 
-        scale_factor_costheta, costheta_fit = find_fit_costheta(self.data_matrix, self.days)
+        data_matrix, delta, omega, fit_days = self.data_matrix, self.delta, self.omega, days
+        if self.fast_mode:
+            factor = downsample_factor(self.data_sampling, data_matrix.shape[0], self.fast_sampling)
+            data_matrix = downsample_matrix(data_matrix, factor)
+            delta = downsample_matrix(delta, factor)
+            omega = downsample_matrix(omega, factor)
+            fit_days = stratified_days(self.day_of_year, days, self.fast_days)
 
-        boolean_filter = filter_data(self.data_matrix, self.daytime_threshold, self.x1, self.x2)
+        scale_factor_costheta, costheta_fit = find_fit_costheta(data_matrix, days)
+
+        if self.daytime_threshold is None and self._budget_is_low():
+            # daily quantile instead of the smoothed seasonal threshold fit
+            daytime_threshold = calculate_threshold_quantiles(data_matrix, self.x2)[self.x2]
+            self.degraded.append('orientation: unsmoothed daytime threshold')
+            boolean_filter = filter_data(data_matrix, daytime_threshold)
+        else:
+            boolean_filter = filter_data(data_matrix, self.daytime_threshold, self.x1, self.x2)
 
-        boolean_filter = boolean_filter * self.days * day_range
+        boolean_filter = boolean_filter * fit_days * day_range
 
-        delta_f = self.delta[boolean_filter]
-        omega_f = self.omega[boolean_filter]
+        delta_f = delta[boolean_filter]
+        omega_f = omega[boolean_filter]
         if ~np.any(boolean_filter):
             print('No data made it through filters')
 
@@ -0,0 +1,55 @@
+"""
+This module contains a class for estimating longitude and latitude from a table of per-day features, as returned by
+`pvsystemprofiler.utilities.daily_features.extract_daily_features`, instead of a power matrix. The feature table can
+be extracted once, saved, and the power data released before the estimation runs. The extraction needs the full power
+matrix, so the memory of the estimation is only bounded by the size of the table after extraction.
+"""
+import numpy as np
+from pvsystemprofiler.utilities.equation_of_time import eot_da_rosa, eot_duffie
+from pvsystemprofiler.algorithms.longitude.estimation import estimate_longitude
+from pvsystemprofiler.algorithms.latitude.estimation import estimate_latitude
+
+
+class FeatureEstimator():
+    def __init__(self, features, gmt_offset, day_selection_method='all', solar_noon_method='energy_com',
+                 declination_method='cooper'):
+        """
+        :param features: per-day feature data frame, see `extract_daily_features`.
+        :param gmt_offset: The offset in hours between the local timezone and GMT/UTC.
+        :param day_selection_method: 'all', 'clear' or 'cloudy'.
+        :param solar_noon_method: 'energy_com' or 'rise_set_average'.
+        :param declination_method: 'cooper' or 'spencer'.
+        """
+        self.features = features
+        self.gmt_offset = gmt_offset
+        self.longitude = None
+        self.latitude = None
+        self.day_of_year = features['day_of_year'].values
+        if day_selection_method == 'all':
+            self.days = features['no_errors'].values.astype(bool)
+        elif day_selection_method == 'clear':
+            self.days = features['clear'].values.astype(bool)
+        elif day_selection_method == 'cloudy':
+            self.days = features['cloudy'].values.astype(bool)
+        self.solarnoon = features['solar_noon_' + solar_noon_method].values
+        self.hours_daylight = features['hours_daylight'].values
+        self.declination = features['declination_' + declination_method].values
+
+    def estimate_longitude(self, estimator='fit_l1', eot_calculation='duffie'):
+        """
+        :param estimator: 'calculated', 'fit_l1', 'fit_l2' or 'fit_huber'.
+        :param eot_calculation: 'duffie' or 'da_rosa'.
+        :return: None
+        """
+        if eot_calculation in ('duffie', 'd', 'duf'):
+            eot = eot_duffie(self.day_of_year)
+        elif eot_calculation in ('da_rosa', 'dr', 'rosa'):
+            eot = eot_da_rosa(self.day_of_year)
+        self.longitude = estimate_longitude(estimator, eot, self.solarnoon, self.days, self.gmt_offset)
+        return
+
+    def estimate_latitude(self):
+        mask = self.days & ~np.isnan(self.hours_daylight)
+        # the latitude calculation reads the declination from the first row of a (samples x days) matrix
+        self.latitude = estimate_latitude(self.hours_daylight[mask], self.declination[mask][np.newaxis, :])
+        return
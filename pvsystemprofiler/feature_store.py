@@ -0,0 +1,111 @@
+""" Feature Store Module
+This module contains a class for persisting the per-day features of a fleet of systems, as returned by
+`build_feature_table`, keyed by site, system and date. Features are written once per system, after the `DataHandler`
+pipeline has run, and studies can then be rerun with new settings straight from the store, without loading the input
+signals or running the pipeline again:
+
+    store = FeatureStore('features/')
+    store.write(site, system, build_feature_table(dh))
+    ...
+    lon_study = LongitudeStudy(features=store.read(site, system), gmt_offset=-8, true_value=real_longitude)
+    lon_study.run(data_matrix='filled')
+
+Each system is stored in its own file, `<root>/site=<site>/system=<system>.parquet`, so systems can be written
+concurrently and read independently. Parquet files require `pyarrow` or `fastparquet`; 'csv' can be used as a file
+format where neither is installed.
+"""
+import os
+import pandas as pd
+
+BOOLEAN_COLUMNS = ('no_errors', 'clear', 'cloudy')
+
+
+class FeatureStore():
+    def __init__(self, root, file_format='parquet'):
+        """
+        :param root: path to the root directory of the store. Created if it does not exist.
+        :param file_format: 'parquet' or 'csv'.
+        """
+        if file_format not in ('parquet', 'csv'):
+            raise ValueError("file_format must be 'parquet' or 'csv'")
+        self.root = root
+        self.file_format = file_format
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, site, system):
+        """
+        :return: path to the file holding the features of `system` at `site`.
+        """
+        return os.path.join(self.root, 'site={}'.format(site), 'system={}.{}'.format(system, self.file_format))
+
+    def exists(self, site, system):
+        """
+        :return: True if features are stored for `system` at `site`.
+        """
+        return os.path.isfile(self.path(site, system))
+
+    def write(self, site, system, features):
+        """
+        Stores the features of a system, replacing any features previously stored for it. The file is written to a
+        temporary name and then renamed, so that readers never see a partially written file.
+        :param site: site identifier.
+        :param system: system identifier, e.g. the power column label.
+        :param features: feature table as returned by `build_feature_table`.
+        """
+        file_name = self.path(site, system)
+        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+        tmp_file_name = file_name + '.tmp'
+        if self.file_format == 'parquet':
+            features.to_parquet(tmp_file_name, index=False)
+        else:
+            features.to_csv(tmp_file_name, index=False)
+        os.replace(tmp_file_name, file_name)
+
+    def read(self, site, system, columns=None):
+        """
+        :param site: site identifier.
+        :param system: system identifier.
+        :param columns: (optional) feature columns to read. The 'date' and 'data_matrix' columns are always read.
+        :return: feature table of the system.
+        """
+        if columns is not None:
+            columns = ['date', 'data_matrix'] + [c for c in columns if c not in ('date', 'data_matrix')]
+        file_name = self.path(site, system)
+        if self.file_format == 'parquet':
+            features = pd.read_parquet(file_name, columns=columns)
+        else:
+            features = pd.read_csv(file_name, usecols=columns, parse_dates=['date'])
+            for column in BOOLEAN_COLUMNS:
+                if column in features.columns:
+                    features[column] = features[column].astype(bool)
+        return features
+
+    def systems(self):
+        """
+        :return: list of (site, system) tuples with stored features.
+        """
+        keys = []
+        extension = '.' + self.file_format
+        for site_dir in sorted(os.listdir(self.root)):
+            if not site_dir.startswith('site=') or not os.path.isdir(os.path.join(self.root, site_dir)):
+                continue
+            for file_name in sorted(os.listdir(os.path.join(self.root, site_dir))):
+                if file_name.startswith('system=') and file_name.endswith(extension):
+                    keys.append((site_dir[len('site='):], file_name[len('system='):-len(extension)]))
+        return keys
+
+    def read_fleet(self, columns=None, systems=None):
+        """
+        :param columns: (optional) feature columns to read.
+        :param systems: (optional) list of (site, system) tuples to read. Defaults to all stored systems.
+        :return: feature table of all systems, with 'site' and 'system' columns.
+        """
+        frames = []
+        for site, system in (self.systems() if systems is None else systems):
+            features = self.read(site, system, columns)
+            features.insert(0, 'system', system)
+            features.insert(0, 'site', site)
+            frames.append(features)
+        if len(frames) == 0:
+            return pd.DataFrame(columns=['site', 'system', 'date', 'data_matrix'])
+        return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,152 @@
+""" Fleet Estimator Module
+This module contains a function for estimating longitude, latitude, tilt and azimuth for many systems at once. Each
+system is given as a (system id, data source, GMT offset) tuple, where the data source is either a `solar-data-tools`
+`DataHandler` object or a function returning one. The `ConfigurationEstimator` of each system is run on a pool of
+worker processes, and results are streamed back in submission order as workers finish, so that only a bounded number of
+systems is held in memory at any time.
+
+Passing a loader function instead of a `DataHandler` is recommended for large fleets: the data is then loaded in the
+worker process and never has to be pickled and sent from the parent process. Loaders must be picklable, i.e. module
+level functions or `functools.partial` objects.
+"""
+import os
+from time import time
+import numpy as np
+import pandas as pd
+from pvsystemprofiler.estimator import ConfigurationEstimator
+from pvsystemprofiler.utilities.parallel import run_in_process_pool
+
+THREAD_LIMIT_VARIABLES = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS',
+                          'NUMEXPR_NUM_THREADS')
+
+
+def limit_threads(n_threads):
+    """
+    Limits the number of threads used by BLAS/OpenMP backends in the current process, to avoid oversubscription when
+    several worker processes run numerical solvers at the same time.
+    :param n_threads: maximum number of threads per process. If None, no limit is set.
+    """
+    if n_threads is None:
+        return
+    for variable in THREAD_LIMIT_VARIABLES:
+        os.environ[variable] = str(n_threads)
+    # environment variables are only read when a backend is loaded, limit already loaded backends if possible
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        return
+    threadpool_limits(limits=n_threads)
+
+
+def estimate_fleet(systems, estimation='all', max_workers=None, threads_per_worker=1, max_pending=None,
+                   estimator_kwargs=None, estimation_kwargs=None):
+    """
+    Estimates the configuration of every system in `systems` on a pool of worker processes. This is a generator: one
+    result dictionary is yielded per system, in the order in which systems were submitted. A full table can be built
+    with `pd.DataFrame(estimate_fleet(systems))`.
+
+    :param systems: iterable of (system id, `DataHandler` or loader function, gmt_offset) tuples. The iterable is
+    consumed lazily.
+    :param estimation: 'longitude', 'latitude', 'orientation' or 'all'.
+    :param max_workers: (optional) number of worker processes. Defaults to the number of CPUs.
+    :param threads_per_worker: (optional) number of BLAS/OpenMP threads per worker process. None sets no limit.
+    :param max_pending: (optional) maximum number of systems submitted and not yet yielded. Defaults to twice
+    `max_workers`.
+    :param estimator_kwargs: (optional) dictionary of keyword arguments passed to `ConfigurationEstimator`.
+    :param estimation_kwargs: (optional) dictionary of keyword arguments passed to the estimation method.
+    :return: generator of dictionaries with keys 'system', 'longitude', 'latitude', 'tilt', 'azimuth', 'run_time',
+    'degraded' and 'error'. 'error' is None if the estimation succeeded, otherwise a string describing the exception.
+    'degraded' lists the stages that switched to cheaper methods when a 'time_budget' is passed in `estimator_kwargs`.
+    A system whose worker process dies, e.g. killed for running out of memory, gets a 'BrokenProcessPool' error and the
+    other systems are run again on a new pool.
+    """
+    if estimation not in ('longitude', 'latitude', 'orientation', 'all'):
+        raise ValueError("estimation must be one of 'longitude', 'latitude', 'orientation' or 'all'")
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    if max_pending is None:
+        max_pending = 2 * max_workers
+    estimator_kwargs = {} if estimator_kwargs is None else estimator_kwargs
+    estimation_kwargs = {} if estimation_kwargs is None else estimation_kwargs
+
+    tasks = ((system_id, source, gmt_offset, estimation, estimator_kwargs, estimation_kwargs)
+             for system_id, source, gmt_offset in systems)
+    # a system whose worker process dies is reported with an error, the pool is restarted for the other systems
+    for task, record, error in run_in_process_pool(estimate_system, tasks, max_workers, initializer=limit_threads,
+                                                   initargs=(threads_per_worker,), max_pending=max_pending):
+        if error is not None:
+            record = _empty_record(task[0])
+            record['error'] = error
+        yield record
+
+
+def fast_mode_errors(systems, estimation='orientation', estimator_kwargs=None, **fleet_kwargs):
+    """
+    Measures the error introduced by the fast mode of `ConfigurationEstimator`, by estimating every system twice, on the
+    full data and in fast mode. Each data source is loaded twice.
+    :param systems: list of (system id, `DataHandler` or loader function, gmt_offset) tuples.
+    :param estimation: 'orientation' or 'all'.
+    :param estimator_kwargs: (optional) dictionary of keyword arguments passed to `ConfigurationEstimator` in both
+    runs, e.g. 'fast_sampling' and 'fast_days'.
+    :param fleet_kwargs: other keyword arguments passed to `estimate_fleet`.
+    :return: tuple of two data frames. The first one has one row per system with the full and fast tilt and azimuth,
+    their absolute differences ('tilt_error', 'azimuth_error') and the speedup. The second one summarizes the errors
+    and speedup with their median, 90th and 99th percentiles and maximum.
+    """
+    systems = list(systems)
+    estimator_kwargs = {} if estimator_kwargs is None else dict(estimator_kwargs)
+    full_kwargs = dict(estimator_kwargs, fast_mode=False)
+    fast_kwargs = dict(estimator_kwargs, fast_mode=True)
+    full = pd.DataFrame(estimate_fleet(systems, estimation, estimator_kwargs=full_kwargs, **fleet_kwargs))
+    fast = pd.DataFrame(estimate_fleet(systems, estimation, estimator_kwargs=fast_kwargs, **fleet_kwargs))
+    df = full[['system', 'tilt', 'azimuth', 'run_time']].merge(fast[['system', 'tilt', 'azimuth', 'run_time']],
+                                                                 on='system', suffixes=('_full', '_fast'))
+    df['tilt_error'] = np.abs(df['tilt_fast'] - df['tilt_full'])
+    # azimuth differences wrap around +/-180 Degrees
+    df['azimuth_error'] = np.abs((df['azimuth_fast'] - df['azimuth_full'] + 180) % 360 - 180)
+    df['speedup'] = df['run_time_full'] / df['run_time_fast']
+    summary = df[['tilt_error', 'azimuth_error', 'speedup']].quantile([0.5, 0.9, 0.99, 1.0])
+    summary.index = ['median', 'p90', 'p99', 'max']
+    return df, summary
+
+
+def estimate_system(system_id, source, gmt_offset, estimation='all', estimator_kwargs=None, estimation_kwargs=None):
+    """
+    Runs the `ConfigurationEstimator` for a single system, capturing any exception in the returned dictionary.
+    :param system_id: system identifier.
+    :param source: `DataHandler` or function returning a `DataHandler`.
+    :param gmt_offset: The offset in hours between the local timezone and GMT/UTC.
+    :param estimation: 'longitude', 'latitude', 'orientation' or 'all'.
+    :param estimator_kwargs: (optional) dictionary of keyword arguments passed to `ConfigurationEstimator`.
+    :param estimation_kwargs: (optional) dictionary of keyword arguments passed to the estimation method.
+    :return: dictionary with the estimation results for `system_id`.
+    """
+    estimator_kwargs = {} if estimator_kwargs is None else estimator_kwargs
+    estimation_kwargs = {} if estimation_kwargs is None else estimation_kwargs
+    t0 = time()
+    record = _empty_record(system_id)
+    try:
+        dh = source() if callable(source) else source
+        est = ConfigurationEstimator(dh, gmt_offset, **estimator_kwargs)
+        if estimation == 'longitude':
+            est.estimate_longitude(**estimation_kwargs)
+        elif estimation == 'latitude':
+            est.estimate_latitude(**estimation_kwargs)
+        elif estimation == 'orientation':
+            est.estimate_orientation(**estimation_kwargs)
+        elif estimation == 'all':
+            est.estimate_all(**estimation_kwargs)
+        for parameter in ('longitude', 'latitude', 'tilt', 'azimuth'):
+            value = getattr(est, parameter)
+            record[parameter] = np.nan if value is None else value
+        if len(est.degraded) > 0:
+            record['degraded'] = '; '.join(est.degraded)
+    except Exception as e:
+        record['error'] = '{}: {}'.format(type(e).__name__, e)
+    record['run_time'] = time() - t0
+    return record
+
+
+def _empty_record(system_id):
+    return {'system': system_id, 'longitude': np.nan, 'latitude': np.nan, 'tilt': np.nan, 'azimuth': np.nan,
+            'run_time': np.nan, 'degraded': None, 'error': None}
@@ -12,42 +12,65 @@ The following configurations can be run:
 
 """
 import numpy as np
-import pandas as pd
 from pvsystemprofiler.utilities.declination_equation import delta_spencer
 from pvsystemprofiler.utilities.declination_equation import delta_cooper
 from pvsystemprofiler.algorithms.latitude.hours_daylight import calculate_hours_daylight
 from pvsystemprofiler.algorithms.latitude.hours_daylight import calculate_hours_daylight_raw
 from pvsystemprofiler.algorithms.optimized_sunrise_sunset import get_optimized_sunrise_sunset
 from pvsystemprofiler.algorithms.latitude.estimation import estimate_latitude
+from pvsystemprofiler.utilities.results_buffer import ResultsBuffer
+from pvsystemprofiler.utilities.parallel import evaluate_configurations
+from pvsystemprofiler.utilities.time_budget import get_time_budget
+from pvsystemprofiler.production_profile import profile_configurations
+from pvsystemprofiler.utilities.daily_features import matrix_features, optimized_sunrise_sunset_features
+
+RESULT_COLUMNS = ['declination_method', 'daylight_calculation', 'data_matrix', 'threshold', 'day_selection_method',
+                  'latitude']
+OPTIMIZED_DAYLIGHT_METHODS = ('optimized_estimates', 'Optimized_Estimates', 'optimized_measurements',
+                              'Optimized_Measurements')
 
 
 class LatitudeStudy():
-    def __init__(self, data_handler, lat_true_value=None):
+    def __init__(self, data_handler=None, lat_true_value=None, intermediates=None, features=None):
         """
         :param data_handler: `DataHandler` class instance loaded with a solar power data set.
         :param lat_true_value: Optional. The ground truth value for the system's latitude. (Degrees).
+        :param intermediates: (optional) dictionary with precomputed intermediate results, as provided by
+        `StudyPlanner`. Supported keys: 'optimized_sunrise_sunset', 'delta_cooper', 'delta_spencer'.
+        :param features: (optional) feature table of the system, as returned by `build_feature_table` or read from a
+        `FeatureStore`, used instead of `data_handler`. Threshold based daylight methods are only available for the
+        threshold the features were extracted with, and optimized methods only if the optimizer outputs were stored.
         """
 
         self.data_handler = data_handler
+        self.features = features
         self.latitude_true_value = lat_true_value
-        if not data_handler._ran_pipeline:
-            print('Running DataHandler preprocessing pipeline with defaults')
-            self.data_handler.run_pipeline()
-        self.data_matrix = self.data_handler.filled_data_matrix
-        self.raw_data_matrix = self.data_handler.raw_data_matrix
-        self.day_of_year = self.data_handler.day_index.dayofyear
-        self.num_days = self.data_handler.num_days
-        self.daily_meas = self.data_handler.filled_data_matrix.shape[0]
-        self.data_sampling = self.data_handler.data_sampling
+        self.intermediates = {} if intermediates is None else dict(intermediates)
+        if features is not None:
+            self.data_matrix = None
+            self.raw_data_matrix = None
+            self.day_features = matrix_features(features, features['data_matrix'].iloc[0])
+            self.day_of_year = self.day_features['day_of_year'].values
+            self.num_days = len(self.day_features)
+            # only the first row of the declination matrices is used
+            self.daily_meas = 1
+            self.data_sampling = None
+            self.intermediates.setdefault('optimized_sunrise_sunset', optimized_sunrise_sunset_features(features))
+        else:
+            if not data_handler._ran_pipeline:
+                print('Running DataHandler preprocessing pipeline with defaults')
+                self.data_handler.run_pipeline()
+            self.data_matrix = self.data_handler.filled_data_matrix
+            self.raw_data_matrix = self.data_handler.raw_data_matrix
+            self.day_of_year = self.data_handler.day_index.dayofyear
+            self.num_days = self.data_handler.num_days
+            self.daily_meas = self.data_handler.filled_data_matrix.shape[0]
+            self.data_sampling = self.data_handler.data_sampling
         self.boolean_daytime = None
-        self.hours_daylight = None
-        self.delta = None
         self.delta_cooper = None
         self.delta_spencer = None
         self.residual = None
         self.daytime_threshold = None
-        self.opt_threshold = None
-        self.days = None
         self.estimates_sunrise_raw = None
         self.estimates_sunset_raw = None
         self.measurements_sunrise_raw = None
@@ -64,7 +87,7 @@ class LatitudeStudy():
     def run(self, data_matrix=('raw', 'filled'),
             daylight_method=('raw daylight', 'sunrise-sunset', 'optimized_estimates', 'optimized_measurements'),
             delta_method=('cooper', 'spencer'), day_selection_method=('all', 'clear', 'cloudy'),
-            threshold=None):
+            threshold=None, max_workers=None, time_budget=None, profile=None, top_k=None):
         """
         Run a study with the given configuration of options. Defaults to
         running all available options. Any kwarg can be constrained by
@@ -87,8 +110,69 @@ class LatitudeStudy():
         :param threshold: (optional) daylight threshold values, tuple of length one to twelve.
         :param delta_method: (optional) 'cooper', 'spencer'.
         :param day_selection_method: 'all', 'clear', 'cloudy'.
+        :param max_workers: (optional) number of threads used to evaluate configurations concurrently. If None, the
+        configurations are evaluated sequentially.
+        :param time_budget: (optional) time budget in seconds, or `TimeBudget` instance shared with other stages. When
+        the budget runs low, the sunrise/sunset optimizer and the optimized daylight methods are skipped, and once it
+        has expired all remaining configurations are skipped. Skipped configurations are flagged in a 'skipped'
+        column, which is only added if a budget is given.
+        :param profile: (optional) production profile data frame, see `production_profile`. If given, only the
+        configurations of the profile that are also allowed by the other options are run.
+        :param top_k: (optional) number of best ranked configurations of `profile` to run. All if None.
         :return: None.
         """
+        time_budget = get_time_budget(time_budget)
+        configurations = self._prepare_configurations(data_matrix, daylight_method, delta_method,
+                                                      day_selection_method, threshold, time_budget, profile,
+                                                      top_k)
+        total = len(configurations)
+        results = ResultsBuffer(result_columns(time_budget), total, numeric_columns=['threshold', 'latitude'],
+                                boolean_columns=['skipped'])
+        for ix, row in evaluate_configurations(self.evaluate_configuration, configurations, max_workers):
+            results.set_row(ix, row)
+        results = results.to_frame()
+        if self.latitude_true_value is not None:
+            results['residual'] = self.latitude_true_value - results['latitude']
+            results['measured_latitude'] = self.latitude_true_value
+
+        self.results = results
+
+    def iter_results(self, data_matrix=('raw', 'filled'),
+                     daylight_method=('raw daylight', 'sunrise-sunset', 'optimized_estimates',
+                                      'optimized_measurements'),
+                     delta_method=('cooper', 'spencer'), day_selection_method=('all', 'clear', 'cloudy'),
+                     threshold=None, max_workers=None, time_budget=None, profile=None, top_k=None):
+        """
+        Streaming version of `run`. Takes the same configuration options, but yields the result of each configuration as
+        soon as it is computed instead of collecting all of them. The `results` attribute is not set. If the generator
+        is closed early, configurations that have not started are not evaluated.
+        :param max_workers: (optional) number of threads used to evaluate configurations concurrently. If set,
+        records are yielded in order of completion.
+        :param time_budget: (optional) time budget in seconds or `TimeBudget` instance, see `run`.
+        :param profile: (optional) production profile data frame, see `run`.
+        :param top_k: (optional) number of best ranked configurations of `profile` to run.
+        :return: generator of dictionaries with the results columns as keys, plus 'residual' and 'measured_latitude' if
+        a ground truth value was provided.
+        """
+        time_budget = get_time_budget(time_budget)
+        columns = result_columns(time_budget)
+        configurations = self._prepare_configurations(data_matrix, daylight_method, delta_method,
+                                                      day_selection_method, threshold, time_budget, profile,
+                                                      top_k)
+        for ix, row in evaluate_configurations(self.evaluate_configuration, configurations, max_workers):
+            record = dict(zip(columns, row))
+            if self.latitude_true_value is not None:
+                record['residual'] = self.latitude_true_value - record['latitude']
+                record['measured_latitude'] = self.latitude_true_value
+            yield record
+
+    def _prepare_configurations(self, data_matrix, daylight_method, delta_method, day_selection_method, threshold,
+                                time_budget=None, profile=None, top_k=None):
+        """
+        Calculates the declination and runs the sunrise/sunset optimizer. The optimizer is skipped if `time_budget` is
+        low.
+        :return: list of argument tuples for `evaluate_configuration`, one per study configuration.
+        """
         data_matrix = np.atleast_1d(data_matrix)
         daylight_method = np.atleast_1d(daylight_method)
         delta_method = np.atleast_1d(delta_method)
@@ -100,103 +184,170 @@ class LatitudeStudy():
         else:
             self.daytime_threshold = threshold
 
-        self.delta_cooper = delta_cooper(self.day_of_year, self.daily_meas)
-        self.delta_spencer = delta_spencer(self.day_of_year, self.daily_meas)
+        if 'delta_cooper' in self.intermediates:
+            self.delta_cooper = self.intermediates['delta_cooper']
+        else:
+            self.delta_cooper = delta_cooper(self.day_of_year, self.daily_meas)
+        if 'delta_spencer' in self.intermediates:
+            self.delta_spencer = self.intermediates['delta_spencer']
+        else:
+            self.delta_spencer = delta_spencer(self.day_of_year, self.daily_meas)
 
-        if 'raw' in data_matrix:
+        selected = None
+        if profile is not None:
+            selected = set(profile_configurations(profile, 'latitude', top_k))
+        # data matrices and daylight methods of the configurations that will be run
+        run_matrices = [m for m in data_matrix if selected is None or m in {c[2] for c in selected}]
+        run_daylight_methods = [d for d in daylight_method if selected is None or d in {c[1] for c in selected}]
+
+        if 'raw' in run_matrices:
             rdm = self.raw_data_matrix
         else:
             rdm = None
-        if 'filled' in data_matrix:
+        if 'filled' in run_matrices:
             fdm = self.data_matrix
         else:
             fdm = None
 
-        opt_dict = get_optimized_sunrise_sunset(fdm, rdm)
+        optimized = [dlm for dlm in run_daylight_methods if dlm in OPTIMIZED_DAYLIGHT_METHODS]
+        if 'optimized_sunrise_sunset' in self.intermediates:
+            opt_dict = self.intermediates['optimized_sunrise_sunset']
+        elif len(optimized) == 0 or (time_budget is not None and time_budget.is_low()):
+            opt_dict = get_optimized_sunrise_sunset()
+        else:
+            opt_dict = get_optimized_sunrise_sunset(fdm, rdm)
         self.estimates_sunrise_raw, self.estimates_sunset_raw, self.measurements_sunrise_raw, \
         self.measurements_sunset_raw, self.opt_threshold_raw, \
         self.estimates_sunrise_filled, self.estimates_sunset_filled, self.measurements_sunrise_filled, \
         self.measurements_sunset_filled, self.opt_threshold_filled = opt_dict.values()
 
-        results = pd.DataFrame(columns=['declination_method', 'daylight_calculation', 'data_matrix', 'threshold',
-                                        'day_selection_method', 'latitude'])
-        counter = 0
+        configurations = []
         for delta_id in delta_method:
-            for matrix_ix, matrix_id in enumerate(data_matrix):
-
+            for matrix_id in data_matrix:
                 for daylight_method_id in daylight_method:
                     if daylight_method_id != 'optimized_estimates':
-                        dtt = self.daytime_threshold[counter]
+                        dtt = self.daytime_threshold[len(configurations)]
                     else:
                         dtt = None
-
                     for ds in day_selection_method:
-                        if ds == 'all':
-                            self.days = self.data_handler.daily_flags.no_errors
-                        elif ds == 'clear':
-                            self.days = self.data_handler.daily_flags.clear
-                        elif ds == 'cloudy':
-                            self.days = self.data_handler.daily_flags.cloudy
-                        dlm = daylight_method_id
-                        tm = data_matrix[matrix_ix]
-                        dm = delta_id
-
-                        self.prepare_input_data(matrix_id, daytime_threshold=dtt, daylight_method=dlm,
-                                                delta_method=delta_id)
-                        lat_est = estimate_latitude(self.hours_daylight, self.delta)
-
-                        if daylight_method_id in ['optimized_estimates', 'optimized_measurements']:
-                            dtt = self.opt_threshold
-
-                        results.loc[counter] = [dm, dlm, tm, dtt, ds, lat_est]
-                        counter += 1
-        if self.latitude_true_value is not None:
-            results['residual'] = self.latitude_true_value - results['latitude']
-            results['measured_latitude'] = self.latitude_true_value
+                        configurations.append((delta_id, daylight_method_id, matrix_id, dtt, ds, time_budget))
+        if selected is not None:
+            # thresholds are indexed on the full grid, filter afterwards
+            configurations = [c for c in configurations if (c[0], c[1], c[2], c[4]) in selected]
+        return configurations
 
-        self.results = results
+    def evaluate_configuration(self, delta_id, daylight_method_id, matrix_id, dtt, ds, time_budget=None):
+        """
+        Estimates latitude for a single study configuration. Only reads attributes set before the configurations are
+        evaluated, so configurations can be evaluated concurrently.
+        :param time_budget: (optional) `TimeBudget` instance. Nothing is evaluated once the budget has expired.
+        :return: list with the configuration labels and the latitude estimate, in results column order. If a time
+        budget is given, the list ends with a flag that is True if the configuration was skipped.
+        """
+        if daylight_method_id in OPTIMIZED_DAYLIGHT_METHODS:
+            if matrix_id == 'filled':
+                skipped = self.estimates_sunrise_filled is None
+            else:
+                skipped = self.estimates_sunrise_raw is None
+        else:
+            skipped = False
+        if time_budget is not None:
+            skipped = skipped or time_budget.is_expired()
+        if skipped:
+            row = [delta_id, daylight_method_id, matrix_id, dtt, ds, np.nan]
+            return row + [True] if time_budget is not None else row
+        hours_daylight, delta, opt_threshold = self.prepare_input_data(matrix_id, daytime_threshold=dtt,
+                                                                       daylight_method=daylight_method_id,
+                                                                       delta_method=delta_id, days=self.select_days(ds))
+        lat_est = estimate_latitude(hours_daylight, delta)
+        if daylight_method_id in ['optimized_estimates', 'optimized_measurements']:
+            dtt = opt_threshold
+        row = [delta_id, daylight_method_id, matrix_id, dtt, ds, lat_est]
+        return row + [False] if time_budget is not None else row
 
     def prepare_input_data(self, matrix_id=None, daytime_threshold=0.001,
                            daylight_method=('sunrise-sunset', 'raw daylight'),
-                           delta_method=('cooper', 'spencer')):
+                           delta_method=('cooper', 'spencer'), days=None):
         """"
         Latitude is estimated from equation (1.6.11) in:
         Duffie, John A., and William A. Beckman. Solar engineering of thermal processes. New York: Wiley, 1991.
-        """
 
+        :param days: (optional) boolean array with the selected days. Defaults to the days without errors, as selected by
+        `select_days('all')`.
+        :return: tuple with the filtered daylight hours, the filtered declination and the threshold used by the
+        sunrise/sunset optimizer (None for the other daylight methods).
+        """
+        if days is None:
+            days = self.select_days('all')
+        opt_threshold = None
         if matrix_id == 'raw':
             data_in = self.raw_data_matrix
         elif matrix_id == 'filled':
             data_in = self.data_matrix
-        if daylight_method in ('sunrise-sunset', 'sunrise sunset'):
+        if self.features is not None and daylight_method in ('sunrise-sunset', 'sunrise sunset', 'raw_daylight',
+                                                             'raw daylight'):
+            day_features = matrix_features(self.features, matrix_id)
+            if not np.isclose(daytime_threshold, day_features['daylight_threshold'].iloc[0]):
+                raise ValueError('features were extracted with a daylight threshold of {}'.format(
+                    day_features['daylight_threshold'].iloc[0]))
+            if daylight_method in ('sunrise-sunset', 'sunrise sunset'):
+                hours_daylight_all = day_features['hours_daylight'].values
+            else:
+                hours_daylight_all = day_features['hours_daylight_raw'].values
+        elif daylight_method in ('sunrise-sunset', 'sunrise sunset'):
             hours_daylight_all = calculate_hours_daylight(data_in, daytime_threshold)
         elif daylight_method in ('raw_daylight', 'raw daylight'):
             hours_daylight_all = calculate_hours_daylight_raw(data_in, self.data_sampling, daytime_threshold)
         elif daylight_method in ('optimized_estimates', 'Optimized_Estimates'):
             if matrix_id == 'filled':
                 hours_daylight_all = self.estimates_sunset_filled - self.estimates_sunrise_filled
-                self.opt_threshold = self.opt_threshold_raw
+                opt_threshold = self.opt_threshold_raw
             if matrix_id == 'raw':
                 hours_daylight_all = self.estimates_sunset_raw - self.estimates_sunrise_raw
-                self.opt_threshold = self.opt_threshold_filled
+                opt_threshold = self.opt_threshold_filled
         elif daylight_method in ('optimized_measurements', 'Optimized_Measurements'):
             if matrix_id == 'filled':
                 hours_daylight_all = self.measurements_sunset_filled - self.measurements_sunrise_filled
-                self.opt_threshold = self.opt_threshold_filled
+                opt_threshold = self.opt_threshold_filled
             if matrix_id == 'raw':
                 hours_daylight_all = self.measurements_sunset_raw - self.measurements_sunrise_raw
-                self.opt_threshold = self.opt_threshold_raw
+                opt_threshold = self.opt_threshold_raw
         if delta_method in ('Cooper', 'cooper'):
-            self.delta = self.delta_cooper
+            delta = self.delta_cooper
         elif delta_method in ('Spencer', 'spencer'):
-            self.delta = self.delta_spencer
+            delta = self.delta_spencer
 
         if np.any(np.isnan(hours_daylight_all)):
             hours_mask = np.isnan(hours_daylight_all)
-            full_mask = ~hours_mask & self.days
-            self.hours_daylight = hours_daylight_all[full_mask]
-            self.delta = self.delta[:, full_mask]
+            full_mask = ~hours_mask & days
+            hours_daylight = hours_daylight_all[full_mask]
+            delta = delta[:, full_mask]
         else:
-            self.hours_daylight = hours_daylight_all[self.days]
-            self.delta = self.delta[:, self.days]
-        return
+            hours_daylight = hours_daylight_all[days]
+            delta = delta[:, days]
+        return hours_daylight, delta, opt_threshold
+
+    def select_days(self, ds):
+        """
+        :param ds: 'all', 'clear', 'cloudy'.
+        :return: boolean array with the selected days.
+        """
+        if self.features is not None:
+            return self.day_features[{'all': 'no_errors', 'clear': 'clear', 'cloudy': 'cloudy'}[ds]].values
+        if ds == 'all':
+            days = self.data_handler.daily_flags.no_errors
+        elif ds == 'clear':
+            days = self.data_handler.daily_flags.clear
+        elif ds == 'cloudy':
+            days = self.data_handler.daily_flags.cloudy
+        return days
+
+
+def result_columns(time_budget=None):
+    """
+    :param time_budget: (optional) `TimeBudget` instance.
+    :return: list with the results columns, including 'skipped' if a time budget is given.
+    """
+    if time_budget is None:
+        return list(RESULT_COLUMNS)
+    return RESULT_COLUMNS + ['skipped']
@@ -18,40 +18,58 @@ The following configurations can be run:
 
 """
 import numpy as np
-import pandas as pd
 from solardatatools.solar_noon import energy_com, avg_sunrise_sunset
 from pvsystemprofiler.utilities.equation_of_time import eot_da_rosa, eot_duffie
 from pvsystemprofiler.utilities.progress import progress
+from pvsystemprofiler.utilities.results_buffer import ResultsBuffer
+from pvsystemprofiler.utilities.parallel import evaluate_configurations
+from pvsystemprofiler.utilities.time_budget import get_time_budget
+from pvsystemprofiler.production_profile import profile_configurations
+from pvsystemprofiler.utilities.daily_features import matrix_features, optimized_sunrise_sunset_features
 from pvsystemprofiler.algorithms.longitude.estimation import estimate_longitude
 from pvsystemprofiler.algorithms.optimized_sunrise_sunset import get_optimized_sunrise_sunset
 
+RESULT_COLUMNS = ['longitude', 'estimator', 'eot_calculation', 'solar_noon_method', 'day_selection_method',
+                  'data_matrix']
+
 
 class LongitudeStudy():
-    def __init__(self, data_handler, gmt_offset=-8, true_value=None):
+    def __init__(self, data_handler=None, gmt_offset=-8, true_value=None, intermediates=None, features=None):
         """
         Default value for GMT offset is -8 which corresponds to Pacific
         Standard Time, or systems located in California.
         :param data_handler: `DataHandler` class instance loaded with a solar power data set
         :param gmt_offset: The offset in hours between the local timezone and GMT/UTC
         :param true_value: (optional) the ground truth value for the system's longitude
+        :param intermediates: (optional) dictionary with precomputed intermediate results, as provided by
+        `StudyPlanner`. Supported key: 'optimized_sunrise_sunset'.
+        :param features: (optional) feature table of the system, as returned by `build_feature_table` or read from a
+        `FeatureStore`, used instead of `data_handler`. Optimized solar noon methods are only available if the
+        optimizer outputs were stored.
         """
         self.data_handler = data_handler
-        if not data_handler._ran_pipeline:
-            print('Running DataHandler preprocessing pipeline with defaults')
-            self.data_handler.run_pipeline()
-        self.data_matrix = self.data_handler.filled_data_matrix
-        self.raw_data_matrix = self.data_handler.raw_data_matrix
+        self.features = features
+        self.intermediates = {} if intermediates is None else dict(intermediates)
+        if features is not None:
+            self.data_matrix = None
+            self.raw_data_matrix = None
+            self.day_features = matrix_features(features, features['data_matrix'].iloc[0])
+            self.day_of_year = self.day_features['day_of_year'].values
+            self.intermediates.setdefault('optimized_sunrise_sunset', optimized_sunrise_sunset_features(features))
+        else:
+            if not data_handler._ran_pipeline:
+                print('Running DataHandler preprocessing pipeline with defaults')
+                self.data_handler.run_pipeline()
+            self.data_matrix = self.data_handler.filled_data_matrix
+            self.raw_data_matrix = self.data_handler.raw_data_matrix
+            self.day_of_year = self.data_handler.day_index.dayofyear
         self.true_value = true_value
         self.opt_threshold_raw = None
         self.opt_threshold_filled = None
         # Attributes used for all calculations
         self.gmt_offset = gmt_offset
-        self.day_of_year = self.data_handler.day_index.dayofyear
         self.eot_duffie = eot_duffie(self.day_of_year)
         self.eot_da_rosa = eot_da_rosa(self.day_of_year)
-        # Attributes that change depending on the configuration
-        self.solarnoon = None
-        self.days = None
         # Results
         self.results = None
         self.best_result = None
@@ -69,7 +87,7 @@ class LongitudeStudy():
             eot_calculation=('duffie', 'da_rosa'),
             solar_noon_method=('rise_set_average', 'energy_com', 'optimized_estimates', 'optimized_measurements'),
             day_selection_method=('all', 'clear', 'cloudy'),
-            verbose=True):
+            verbose=True, max_workers=None, time_budget=None, profile=None, top_k=None):
         """
         Run a study with the given configuration of options. Defaults to
         running all available options. Any kwarg can be constrained by
@@ -95,17 +113,93 @@ class LongitudeStudy():
         :param solar_noon_method: 'rise_set_average', 'energy_com', 'optimized_estimates', 'optimized_measurements'.
         :param day_selection_method: 'all', 'clear', 'cloudy'.
         :param verbose: show progress bar if True.
+        :param max_workers: (optional) number of threads used to evaluate configurations concurrently. If None, the
+        configurations are evaluated sequentially.
+        :param time_budget: (optional) time budget in seconds, or `TimeBudget` instance shared with other stages. When
+        the budget runs low, the sunrise/sunset optimizer and the curve fitting estimators are skipped, and once it
+        has expired all remaining configurations are skipped. Skipped configurations are flagged in a 'skipped'
+        column, which is only added if a budget is given.
+        :param profile: (optional) production profile data frame, see `production_profile`. If given, only the
+        configurations of the profile that are also allowed by the other options are run.
+        :param top_k: (optional) number of best ranked configurations of `profile` to run. All if None.
         :return: None.
         """
-        results = pd.DataFrame(columns=[
-            'longitude', 'estimator', 'eot_calculation', 'solar_noon_method',
-            'day_selection_method', 'data_matrix'
-        ])
+        time_budget = get_time_budget(time_budget)
+        configurations = self._prepare_configurations(data_matrix, estimator, eot_calculation, solar_noon_method,
+                                                      day_selection_method, time_budget, profile, top_k)
+        total = len(configurations)
+        results = ResultsBuffer(result_columns(time_budget), total, numeric_columns=['longitude'],
+                                boolean_columns=['skipped'])
+        counter = 0
+        if verbose:
+            progress(counter, total)
+        for ix, row in evaluate_configurations(evaluate_longitude_configuration, configurations, max_workers):
+            results.set_row(ix, row)
+            counter += 1
+            if verbose:
+                progress(counter, total)
+        results = results.to_frame()
+        if self.true_value is not None:
+            results['residual'] = self.true_value - results['longitude']
+            results['measured_longitude'] = self.true_value
+        self.results = results
+        if self.true_value is not None and results['residual'].notna().any():
+            best_loc = results['residual'].apply(lambda x: np.abs(x)).argmin()
+            self.best_result = results.loc[best_loc]
+            self.results = results.loc[np.argsort(np.abs(results['residual']).values)]
+        return
+
+    def iter_results(self, data_matrix=('raw', 'filled'),
+                     estimator=('calculated', 'fit_l1', 'fit_l2', 'fit_huber'),
+                     eot_calculation=('duffie', 'da_rosa'),
+                     solar_noon_method=('rise_set_average', 'energy_com', 'optimized_estimates',
+                                        'optimized_measurements'),
+                     day_selection_method=('all', 'clear', 'cloudy'), max_workers=None, time_budget=None,
+                     profile=None, top_k=None):
+        """
+        Streaming version of `run`. Takes the same configuration options, but yields the result of each configuration as
+        soon as it is computed instead of collecting all of them. The `results` and `best_result` attributes are not
+        set. If the generator is closed early, configurations that have not started are not evaluated.
+        :param max_workers: (optional) number of threads used to evaluate configurations concurrently. If set,
+        records are yielded in order of completion.
+        :param time_budget: (optional) time budget in seconds or `TimeBudget` instance, see `run`.
+        :param profile: (optional) production profile data frame, see `run`.
+        :param top_k: (optional) number of best ranked configurations of `profile` to run.
+        :return: generator of dictionaries with the results columns as keys, plus 'residual' and 'measured_longitude'
+        if a ground truth value was provided.
+        """
+        time_budget = get_time_budget(time_budget)
+        columns = result_columns(time_budget)
+        configurations = self._prepare_configurations(data_matrix, estimator, eot_calculation, solar_noon_method,
+                                                      day_selection_method, time_budget, profile, top_k)
+        for ix, row in evaluate_configurations(evaluate_longitude_configuration, configurations, max_workers):
+            record = dict(zip(columns, row))
+            if self.true_value is not None:
+                record['residual'] = self.true_value - record['longitude']
+                record['measured_longitude'] = self.true_value
+            yield record
+
+    def _prepare_configurations(self, data_matrix, estimator, eot_calculation, solar_noon_method,
+                                day_selection_method, time_budget=None, profile=None, top_k=None):
+        """
+        Runs the sunrise/sunset optimizer and calculates solar noon for every data matrix and solar noon method. The
+        optimizer is skipped if `time_budget` is low, in which case the solar noon of the optimized methods is None.
+        :return: list of argument tuples for `evaluate_longitude_configuration`, one per study configuration.
+        """
         estimator = np.atleast_1d(estimator)
         eot_calculation = np.atleast_1d(eot_calculation)
         solar_noon_method = np.atleast_1d(solar_noon_method)
         day_selection_method = np.atleast_1d(day_selection_method)
         data_matrix = np.atleast_1d(data_matrix)
+        selected = None
+        if profile is not None:
+            selected = set(profile_configurations(profile, 'longitude', top_k))
+            # only keep the options used by the selected configurations
+            estimator = [x for x in estimator if x in {c[0] for c in selected}]
+            eot_calculation = [x for x in eot_calculation if x in {c[1] for c in selected}]
+            solar_noon_method = [x for x in solar_noon_method if x in {c[2] for c in selected}]
+            day_selection_method = [x for x in day_selection_method if x in {c[3] for c in selected}]
+            data_matrix = [x for x in data_matrix if x in {c[4] for c in selected}]
 
         if 'raw' in data_matrix:
             rdm = self.raw_data_matrix
@@ -115,77 +209,132 @@ class LongitudeStudy():
             fdm = self.data_matrix
         else:
             fdm = None
-        opt_dict = get_optimized_sunrise_sunset(fdm, rdm)
+        optimized = [sn for sn in solar_noon_method if sn in ('optimized_estimates', 'optimized_measurements')]
+        if 'optimized_sunrise_sunset' in self.intermediates:
+            opt_dict = self.intermediates['optimized_sunrise_sunset']
+        elif len(optimized) == 0 or (time_budget is not None and time_budget.is_low()):
+            opt_dict = get_optimized_sunrise_sunset()
+        else:
+            opt_dict = get_optimized_sunrise_sunset(fdm, rdm)
         self.estimates_sunrise_raw, self.estimates_sunset_raw, self.measurements_sunrise_raw, \
         self.measurements_sunset_raw, self.opt_threshold_raw, \
         self.estimates_sunrise_filled, self.estimates_sunset_filled, self.measurements_sunrise_filled, \
         self.measurements_sunset_filled, self.opt_threshold_filled = opt_dict.values()
 
-        total = (len(estimator) * len(eot_calculation) * len(solar_noon_method)
-                 * len(day_selection_method) * len(data_matrix))
-        counter = 0
+        configurations = []
+        solarnoon = {}
         for dm in data_matrix:
-            if dm == 'raw':
-                data_in = self.raw_data_matrix
-            elif dm == 'filled':
-                data_in = self.data_matrix
             for sn in solar_noon_method:
-                if sn == 'rise_set_average':
-                    self.solarnoon = avg_sunrise_sunset(data_in)
-                elif sn == 'energy_com':
-                    self.solarnoon = energy_com(data_in)
-                elif sn == 'optimized_estimates':
-                    if dm == 'filled':
-                        sunset = np.copy(self.estimates_sunset_filled)
-                        sunrise = np.copy(self.estimates_sunrise_filled)
-                    if dm == 'raw':
-                        sunset = np.copy(self.estimates_sunset_raw)
-                        sunrise = np.copy(self.estimates_sunrise_raw)
-                    self.solarnoon = np.nanmean([sunrise, sunset], axis=0)
-                elif sn == 'optimized_measurements':
-                    if dm == 'filled':
-                        sunset = np.copy(self.measurements_sunset_filled)
-                        sunrise = np.copy(self.measurements_sunrise_filled)
-                    if dm == 'raw':
-                        sunset = np.copy(self.measurements_sunset_raw)
-                        sunrise = np.copy(self.measurements_sunrise_raw)
-                    sunrise[np.isnan(sunrise)] = 0
-                    sunset[np.isnan(sunset)] = 0
-                    self.solarnoon = np.nanmean([sunrise, sunset], axis=0)
                 for ds in day_selection_method:
-                    if ds == 'all':
-                        self.days = self.data_handler.daily_flags.no_errors
-                    elif ds == 'clear':
-                        self.days = self.data_handler.daily_flags.clear
-                    elif ds == 'cloudy':
-                        self.days = self.data_handler.daily_flags.cloudy
+                    days = self.select_days(ds)
                     for est in estimator:
                         for eot in eot_calculation:
-                            if verbose:
-                                progress(counter, total)
-
-                            try:
-                                if eot in ('duffie', 'd', 'duf') or eot is None:
-                                    eot_ref = self.eot_duffie
-                                elif eot in ('da_rosa', 'dr', 'rosa'):
-                                    eot_ref = self.eot_da_rosa
-                                lon = estimate_longitude(est, eot_ref, self.solarnoon, self.days, self.gmt_offset)
-
-                            except ValueError:
-                                lon = np.nan
-
-                            results.loc[counter] = [
-                                lon, est, eot, sn, ds, dm
-                            ]
-                            counter += 1
-        if verbose:
-            progress(counter, total)
-        if self.true_value is not None:
-            results['residual'] = self.true_value - results['longitude']
-            results['measured_longitude'] = self.true_value
-        self.results = results
-        if self.true_value is not None:
-            best_loc = results['residual'].apply(lambda x: np.abs(x)).argmin()
-            self.best_result = results.loc[best_loc]
-            self.results = results.loc[np.argsort(np.abs(results['residual']).values)]
-        return
+                            if selected is not None and (est, eot, sn, ds, dm) not in selected:
+                                continue
+                            if (dm, sn) not in solarnoon:
+                                solarnoon[(dm, sn)] = self.calculate_solarnoon(dm, sn)
+                            if eot in ('duffie', 'd', 'duf') or eot is None:
+                                eot_ref = self.eot_duffie
+                            elif eot in ('da_rosa', 'dr', 'rosa'):
+                                eot_ref = self.eot_da_rosa
+                            configurations.append((est, eot, sn, ds, dm, eot_ref, solarnoon[(dm, sn)], days,
+                                                   self.gmt_offset, time_budget))
+        return configurations
+
+    def calculate_solarnoon(self, dm, sn):
+        """
+        :param dm: 'raw', 'filled'.
+        :param sn: 'rise_set_average', 'energy_com', 'optimized_estimates', 'optimized_measurements'.
+        :return: array with the solar noon estimate of each day.
+        """
+        if dm == 'raw':
+            data_in = self.raw_data_matrix
+        elif dm == 'filled':
+            data_in = self.data_matrix
+        if self.features is not None and sn in ('rise_set_average', 'energy_com'):
+            solarnoon = matrix_features(self.features, dm)['solar_noon_' + sn].values
+        elif sn == 'rise_set_average':
+            solarnoon = avg_sunrise_sunset(data_in)
+        elif sn == 'energy_com':
+            solarnoon = energy_com(data_in)
+        elif sn in ('optimized_estimates', 'optimized_measurements') and \
+                (self.estimates_sunrise_filled if dm == 'filled' else self.estimates_sunrise_raw) is None:
+            # the sunrise/sunset optimizer was skipped
+            solarnoon = None
+        elif sn == 'optimized_estimates':
+            if dm == 'filled':
+                sunset = np.copy(self.estimates_sunset_filled)
+                sunrise = np.copy(self.estimates_sunrise_filled)
+            if dm == 'raw':
+                sunset = np.copy(self.estimates_sunset_raw)
+                sunrise = np.copy(self.estimates_sunrise_raw)
+            solarnoon = np.nanmean([sunrise, sunset], axis=0)
+        elif sn == 'optimized_measurements':
+            if dm == 'filled':
+                sunset = np.copy(self.measurements_sunset_filled)
+                sunrise = np.copy(self.measurements_sunrise_filled)
+            if dm == 'raw':
+                sunset = np.copy(self.measurements_sunset_raw)
+                sunrise = np.copy(self.measurements_sunrise_raw)
+            sunrise[np.isnan(sunrise)] = 0
+            sunset[np.isnan(sunset)] = 0
+            solarnoon = np.nanmean([sunrise, sunset], axis=0)
+        return solarnoon
+
+    def select_days(self, ds):
+        """
+        :param ds: 'all', 'clear', 'cloudy'.
+        :return: boolean array with the selected days.
+        """
+        if self.features is not None:
+            return self.day_features[{'all': 'no_errors', 'clear': 'clear', 'cloudy': 'cloudy'}[ds]].values
+        if ds == 'all':
+            days = self.data_handler.daily_flags.no_errors
+        elif ds == 'clear':
+            days = self.data_handler.daily_flags.clear
+        elif ds == 'cloudy':
+            days = self.data_handler.daily_flags.cloudy
+        return days
+
+
+def evaluate_longitude_configuration(est, eot, sn, ds, dm, eot_ref, solarnoon, days, gmt_offset, time_budget=None):
+    """
+    Estimates longitude for a single study configuration. The result only depends on the inputs, so configurations can
+    be evaluated concurrently.
+    :param est: 'calculated', 'fit_l1', 'fit_l2', 'fit_huber'.
+    :param eot: equation of time label, 'duffie' or 'da_rosa'.
+    :param sn: solar noon method label.
+    :param ds: day selection method label.
+    :param dm: data matrix label.
+    :param eot_ref: equation of time array.
+    :param solarnoon: solar noon array.
+    :param days: boolean array with the selected days.
+    :param gmt_offset: The offset in hours between the local timezone and GMT/UTC.
+    :param time_budget: (optional) `TimeBudget` instance. Only the closed form estimator is evaluated once the budget
+    is low, and nothing once it has expired.
+    :return: list with the longitude estimate followed by the configuration labels, in results column order. If a time
+    budget is given, the list ends with a flag that is True if the configuration was skipped.
+    """
+    skipped = solarnoon is None
+    if time_budget is not None:
+        skipped = skipped or time_budget.is_expired() or (est != 'calculated' and time_budget.is_low())
+    lon = np.nan
+    if not skipped:
+        try:
+            lon = estimate_longitude(est, eot_ref, solarnoon, days, gmt_offset)
+        except ValueError:
+            pass
+    row = [lon, est, eot, sn, ds, dm]
+    if time_budget is not None:
+        row.append(skipped)
+    return row
+
+
+def result_columns(time_budget=None):
+    """
+    :param time_budget: (optional) `TimeBudget` instance.
+    :return: list with the results columns, including 'skipped' if a time budget is given.
+    """
+    if time_budget is None:
+        return list(RESULT_COLUMNS)
+    return RESULT_COLUMNS + ['skipped']
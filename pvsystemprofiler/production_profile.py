@@ -0,0 +1,145 @@
+""" Production Profile Module
+This module contains functions for learning a "production profile" from the results of past `LongitudeStudy` and
+`LatitudeStudy` runs on systems with known ground truth, e.g. the results files written by
+`parameter_estimation_script.py`. A profile ranks the study configurations by how often they land near the best
+residual of each system. The studies can then run only the top-k configurations of a profile, and
+`ConfigurationEstimator.from_profile` uses the best ranked configuration it supports.
+
+Example:
+
+    profile = build_production_profile(['lon_results_1.csv', 'lon_results_2.csv'], study='longitude')
+    print(profile_tradeoff(['lon_results_1.csv', 'lon_results_2.csv'], profile, top_k=(1, 3, 10)))
+    save_production_profile(profile, 'longitude_profile.csv')
+    lon_study.run(profile=load_production_profile('longitude_profile.csv'), top_k=3)
+
+"""
+import numpy as np
+import pandas as pd
+
+# columns identifying a configuration of each study, in the order used by the study classes
+CONFIGURATION_COLUMNS = {
+    'longitude': ['estimator', 'eot_calculation', 'solar_noon_method', 'day_selection_method', 'data_matrix'],
+    'latitude': ['declination_method', 'daylight_calculation', 'data_matrix', 'day_selection_method']
+}
+# default distance to the best residual of a system within which a configuration counts as near best (Degrees)
+DEFAULT_TOLERANCE = {'longitude': 0.5, 'latitude': 0.5}
+
+
+def build_production_profile(results, study='longitude', tolerance=None, system_columns=('site', 'system')):
+    """
+    Aggregates the residuals of past study results into a ranked production profile.
+    :param results: results data frame, path to a results csv file, or list of either. Must contain the configuration
+    columns of `study`, a 'residual' column and the `system_columns`.
+    :param study: 'longitude' or 'latitude'.
+    :param tolerance: (optional) distance to the best absolute residual of a system, in Degrees, within which a
+    configuration counts as near best. Defaults to `DEFAULT_TOLERANCE`.
+    :param system_columns: columns identifying a system in `results`.
+    :return: data frame with one row per configuration, sorted by 'rank'. Columns are the configuration columns,
+    'rank', 'n_systems', 'wins' (number of systems for which the configuration had the best residual),
+    'near_best_rate', 'median_abs_residual' and 'p90_abs_residual'.
+    """
+    config_cols = CONFIGURATION_COLUMNS[study]
+    if tolerance is None:
+        tolerance = DEFAULT_TOLERANCE[study]
+    df = _system_residuals(results, study, system_columns)
+    best = df.groupby('system_key')['abs_residual'].transform('min')
+    df['win'] = df['abs_residual'] == best
+    df['near_best'] = df['abs_residual'] <= best + tolerance
+    profile = df.groupby(config_cols, observed=True).agg(n_systems=('system_key', 'nunique'), wins=('win', 'sum'),
+                                                         near_best_rate=('near_best', 'mean'),
+                                                         median_abs_residual=('abs_residual', 'median'),
+                                                         p90_abs_residual=('abs_residual',
+                                                                           lambda x: np.quantile(x, 0.9)))
+    profile = profile.reset_index()
+    profile = profile.sort_values(['near_best_rate', 'wins', 'median_abs_residual'],
+                                  ascending=[False, False, True])
+    profile.insert(0, 'rank', np.arange(1, len(profile) + 1))
+    profile.index = np.arange(len(profile))
+    return profile
+
+
+def save_production_profile(profile, file_name):
+    """
+    :param profile: profile data frame as returned by `build_production_profile`.
+    :param file_name: path to the output csv file.
+    """
+    profile.to_csv(file_name, index=False)
+
+
+def load_production_profile(file_name):
+    """
+    :param file_name: path to a csv file written by `save_production_profile`.
+    :return: profile data frame sorted by 'rank'.
+    """
+    profile = pd.read_csv(file_name)
+    profile = profile.sort_values('rank')
+    profile.index = np.arange(len(profile))
+    return profile
+
+
+def profile_configurations(profile, study, top_k=None):
+    """
+    :param profile: profile data frame.
+    :param study: 'longitude' or 'latitude'.
+    :param top_k: (optional) number of best ranked configurations to keep. All configurations if None.
+    :return: list of configuration tuples, with values in the order of `CONFIGURATION_COLUMNS[study]`, best first.
+    """
+    profile = profile.sort_values('rank')
+    if top_k is not None:
+        profile = profile.iloc[:top_k]
+    config_cols = CONFIGURATION_COLUMNS[study]
+    return [tuple(str(value) for value in row) for row in profile[config_cols].itertuples(index=False)]
+
+
+def profile_tradeoff(results, profile, study='longitude', top_k=(1, 2, 5, 10), system_columns=('site', 'system')):
+    """
+    Measures the accuracy given up by running only the top-k configurations of a profile. For each system, the best
+    absolute residual among the top-k configurations is compared with the best absolute residual of the full grid.
+    Results of systems not used to build the profile should be passed to get an unbiased estimate.
+    :param results: results data frame, path to a results csv file, or list of either.
+    :param profile: profile data frame.
+    :param study: 'longitude' or 'latitude'.
+    :param top_k: values of k to evaluate.
+    :param system_columns: columns identifying a system in `results`.
+    :return: data frame with one row per k and columns 'top_k', 'grid_fraction', 'n_systems',
+    'median_best_abs_residual', 'p90_best_abs_residual', 'median_full_abs_residual', 'p90_full_abs_residual' and
+    'top1_median_abs_residual' (median absolute residual of the best ranked configuration alone).
+    """
+    config_cols = CONFIGURATION_COLUMNS[study]
+    df = _system_residuals(results, study, system_columns)
+    keys = pd.Series([tuple(str(value) for value in row) for row in df[config_cols].itertuples(index=False)],
+                     index=df.index)
+    full_best = df.groupby('system_key')['abs_residual'].min()
+    top1 = df[keys.isin(profile_configurations(profile, study, 1))]['abs_residual']
+    n_configurations = max(len(keys.unique()), 1)
+    rows = []
+    for k in np.atleast_1d(top_k):
+        selected = profile_configurations(profile, study, int(k))
+        mask = keys.isin(selected)
+        best = df[mask].groupby('system_key')['abs_residual'].min().reindex(full_best.index)
+        rows.append([int(k), len(selected) / n_configurations, len(full_best), np.nanmedian(best),
+                     np.nanquantile(best, 0.9), np.median(full_best), np.quantile(full_best, 0.9),
+                     np.median(top1) if len(top1) > 0 else np.nan])
+    return pd.DataFrame(rows, columns=['top_k', 'grid_fraction', 'n_systems', 'median_best_abs_residual',
+                                       'p90_best_abs_residual', 'median_full_abs_residual', 'p90_full_abs_residual',
+                                       'top1_median_abs_residual'])
+
+
+def _system_residuals(results, study, system_columns):
+    if isinstance(results, (str, pd.DataFrame)) or hasattr(results, '__fspath__'):
+        results = [results]
+    frames = []
+    for ix, item in enumerate(results):
+        df = pd.read_csv(item) if not isinstance(item, pd.DataFrame) else item.copy()
+        system_cols = [col for col in system_columns if col in df.columns]
+        if len(system_cols) > 0:
+            df['system_key'] = df[system_cols].astype(str).agg('/'.join, axis=1)
+        else:
+            # results table of a single study run
+            df['system_key'] = 'results_' + str(ix)
+        frames.append(df)
+    df = pd.concat(frames, ignore_index=True)
+    config_cols = CONFIGURATION_COLUMNS[study]
+    df[config_cols] = df[config_cols].astype(str)
+    df['abs_residual'] = np.abs(df['residual'].astype(float))
+    return df[np.isfinite(df['abs_residual'])]
@@ -0,0 +1,103 @@
+""" Completion Ledger Module
+This module contains a class for recording the progress of a run in a small SQLite database next to the output file.
+Every (site, system, estimation) has a status, 'running' when its evaluation started and 'done' once its results were
+written, together with the number of attempts, the run time and the part file holding its results. A resumed run
+queries the ledger for completed sites instead of loading the results, and redoes only sites that did not finish.
+The database uses write-ahead logging, so that it can be read while a run is writing to it.
+"""
+import sqlite3
+from time import time
+
+# system label of the records tracking a whole site
+SITE = '*'
+
+
+class CompletionLedger():
+    def __init__(self, db_file):
+        """
+        :param db_file: path to the SQLite database file. Created if it does not exist.
+        """
+        self.db_file = db_file
+        self.connection = sqlite3.connect(db_file)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS ledger (site TEXT NOT NULL, system TEXT NOT NULL, '
+                                    'estimation TEXT NOT NULL, status TEXT NOT NULL, attempts INTEGER NOT NULL, '
+                                    'started REAL, finished REAL, run_time REAL, output TEXT, error TEXT, '
+                                    'PRIMARY KEY (site, system, estimation))')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS ledger_status ON ledger (estimation, status)')
+
+    def is_empty(self):
+        """
+        :return: True if nothing has been recorded yet.
+        """
+        return self.connection.execute('SELECT COUNT(*) FROM ledger').fetchone()[0] == 0
+
+    def start(self, site, estimation, system=SITE):
+        """
+        Records that the evaluation of a site, or of one of its systems, started.
+        """
+        with self.connection:
+            self.connection.execute('INSERT INTO ledger (site, system, estimation, status, attempts, started) '
+                                    "VALUES (?, ?, ?, 'running', 1, ?) ON CONFLICT (site, system, estimation) DO "
+                                    "UPDATE SET status = 'running', attempts = attempts + 1, started = excluded.started, "
+                                    'finished = NULL, run_time = NULL, error = NULL',
+                                    (str(site), str(system), estimation, time()))
+
+    def complete(self, site, estimation, systems=(), output=None, run_time=None):
+        """
+        Records that the results of a site were written.
+        :param site: site identifier.
+        :param estimation: estimation performed, e.g. 'longitude'.
+        :param systems: identifiers of the systems of the site with results.
+        :param output: (optional) path to the file holding the results of the site.
+        :param run_time: (optional) run time of the site in seconds.
+        """
+        finished = time()
+        with self.connection:
+            for system in [SITE] + [str(s) for s in systems]:
+                self.connection.execute('INSERT INTO ledger (site, system, estimation, status, attempts, finished, '
+                                        "run_time, output) VALUES (?, ?, ?, 'done', 1, ?, ?, ?) "
+                                        "ON CONFLICT (site, system, estimation) DO UPDATE SET status = 'done', "
+                                        'finished = excluded.finished, run_time = excluded.run_time, '
+                                        'output = excluded.output, error = NULL',
+                                        (str(site), system, estimation, finished, run_time, output))
+
+    def fail(self, site, estimation, error, system=SITE):
+        """
+        Records that the evaluation of a site failed. Failed sites are redone by a resumed run.
+        """
+        with self.connection:
+            self.connection.execute("UPDATE ledger SET status = 'failed', finished = ?, error = ? "
+                                    'WHERE site = ? AND system = ? AND estimation = ?',
+                                    (time(), error, str(site), str(system), estimation))
+
+    def completed_sites(self, estimation):
+        """
+        :return: list of the sites completed for `estimation`.
+        """
+        rows = self.connection.execute("SELECT site FROM ledger WHERE estimation = ? AND status = 'done' AND "
+                                       'system = ? ORDER BY site', (estimation, SITE))
+        return [row[0] for row in rows]
+
+    def incomplete_sites(self, estimation):
+        """
+        :return: list of the sites started but not completed for `estimation`, e.g. because the run crashed.
+        """
+        rows = self.connection.execute("SELECT site FROM ledger WHERE estimation = ? AND status != 'done' AND "
+                                       'system = ? ORDER BY site', (estimation, SITE))
+        return [row[0] for row in rows]
+
+    def record_completed(self, df, estimation):
+        """
+        Records the sites and systems of existing results as completed, e.g. results written before the ledger was
+        used.
+        :param df: Dataframe with 'site' and 'system' columns.
+        :param estimation: estimation performed.
+        """
+        for site, systems in df.groupby(df['site'].apply(str))['system']:
+            self.complete(site, estimation, systems.apply(str).unique())
+
+    def close(self):
+        self.connection.close()
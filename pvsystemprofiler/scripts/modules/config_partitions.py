@@ -2,7 +2,7 @@ class ConfigPartitions:
     def __init__(self, est=None, part_id=None, ix_0=None, ix_n=None, n_part=None, ifl=None, ofl=None, ip_address=None,
                  skf=None, au=None, ain=None, ar=None, ac=None, script_name=None, scripts_location=None, conda_env=None,
                  pcid=None, gof=None, god=None, cts=None, s3l=None, n_files=None, file_label=None, fix_time_shifts=None,
-                 time_zone_correction=None, check_json=None, sup_file=None, ds=None, gmt=None):
+                 time_zone_correction=None, check_json=None, sup_file=None, ds=None, gmt=None, options=None):
         self.estimation = est
         self.input_file_location = ifl
         self.ssh_key_file = skf
@@ -39,6 +39,8 @@ class ConfigPartitions:
             self.check_json = check_json
             self.data_source = ds
             self.gmt_offset = gmt
+            # optional flags of the run script, e.g. ['--workers', '4'], forwarded to the partition
+            self.options = [] if options is None else list(options)
         else:
             self.global_output_directory = god
             self.global_output_file = god + gof
@@ -47,13 +49,14 @@ class ConfigPartitions:
 def get_config(est=None, part_id=None, ix_0=None, ix_n=None, n_part=None, ifl=None, ofl=None, ip_address=None, skf=None,
                au=None, ain=None, ar=None, ac=None, script_name=None, scripts_location=None, conda_env=None, pcid=None,
                gof=None, god=None, cts=None, s3l=None, n_files=None, file_label=None, fix_time_shifts=None,
-               time_zone_correction=None, check_json=None, sup_file=None, data_source=None, gmt_offset=None):
+               time_zone_correction=None, check_json=None, sup_file=None, data_source=None, gmt_offset=None,
+               options=None):
     if ix_0 is not None and ix_n is not None:
         return ConfigPartitions(est=est, part_id=part_id, ix_0=ix_0, ix_n=ix_n, n_part=n_part, ifl=ifl, ofl=ofl,
                                 ip_address=ip_address, skf=skf, au=au, ain=ain, ar=ar, ac=ac, script_name=script_name,
                                 scripts_location=scripts_location, conda_env=conda_env, pcid=pcid, cts=cts, s3l=s3l,
                                 n_files=n_files, file_label=file_label, fix_time_shifts=fix_time_shifts,
                                 time_zone_correction=time_zone_correction, check_json=check_json, sup_file=sup_file,
-                                ds=data_source, gmt=gmt_offset)
+                                ds=data_source, gmt=gmt_offset, options=options)
     else:
         return ConfigPartitions(est=est, ifl=ifl, skf=skf, au=au, ain=ain, ar=ar, ac=ac, gof=gof, god=god)
@@ -37,6 +37,7 @@ def create_partition(partition):
     supplementary_file = partition.supplementary_file
     data_type = partition.data_source
     gmt_offset = partition.gmt_offset
+    options = partition.options
 
     # prepare python command to run local partition
     # extract conda installation folder from local .bashrc
@@ -84,6 +85,7 @@ def create_partition(partition):
                     + data_type + ' '
                     + supplementary_file + ' '
                     + python_command
+                    + ''.join(' ' + str(option) for option in options)
                     ]
     else:
         # if remote partition exist from previous run, resume run
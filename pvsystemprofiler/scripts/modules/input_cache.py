@@ -0,0 +1,176 @@
+""" Input Cache Module
+This module contains a class for caching the input signal csv files of the sites on local disk in a compressed columnar
+format. A site file is converted on its first read, with the timestamps stored as typed datetimes, and later reads
+load only the requested columns and time range from the local copy instead of parsing the full csv file again. Cached
+files are named after a hash of the full source path, so that sites with the same id in different locations do not
+share a cached copy, and the version of the source file, its ETag on s3 or its modification time and size on local
+disk, is stored next to the cached copy. A cached copy whose source file changed is replaced. The total size of the
+cache is bounded: when it is exceeded, the least recently read files are removed.
+
+Parquet files require `pyarrow` or `fastparquet`. If neither is installed, or a cached file cannot be read, signals
+are read from the csv file as if there was no cache.
+"""
+import os
+import hashlib
+import boto3
+import pandas as pd
+from pvsystemprofiler.scripts.modules.script_functions import load_generic_data
+from pvsystemprofiler.scripts.modules.s3_listing import get_s3_bucket_and_prefix
+
+CACHE_EXTENSION = '.parquet'
+VERSION_EXTENSION = '.version'
+
+
+def source_version(file_name, client=None):
+    """
+    :param file_name: String. Full path to a source file, on s3 or on local disk.
+    :param client: (optional) boto3 s3 client, used for s3 files.
+    :return: String identifying the version of the file: its ETag on s3, its modification time and size on local disk.
+    None for other locations.
+    """
+    if file_name.startswith('s3://'):
+        bucket, key = get_s3_bucket_and_prefix(file_name)
+        client = boto3.client('s3') if client is None else client
+        return client.head_object(Bucket=bucket, Key=key)['ETag'].strip('"')
+    if '://' in file_name:
+        return None
+    stat = os.stat(file_name)
+    return '{}-{}'.format(stat.st_mtime_ns, stat.st_size)
+
+
+class InputCache():
+    def __init__(self, cache_dir, max_bytes=None, client=None):
+        """
+        :param cache_dir: path to the local cache directory. Created if it does not exist.
+        :param max_bytes: (optional) maximum total size of the cached files in bytes. Unbounded if None.
+        :param client: (optional) boto3 s3 client, used to read the ETags of s3 source files.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.client = client
+        # set to False once converting a file fails, e.g. because no parquet engine is installed
+        self.can_store = True
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path(self, location, file_label, file_id, extension='.csv'):
+        """
+        :return: path to the cached copy of a site file.
+        """
+        name = file_id if file_label is None else file_id + file_label
+        key = hashlib.sha1(_source(location, file_label, file_id, extension).encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.cache_dir, '{}-{}{}'.format(name, key, CACHE_EXTENSION))
+
+    def load(self, location, file_label, file_id, extension='.csv', columns=None, start=None, end=None,
+             version=None):
+        """
+        Loads the input signals of a site, from the cache if the site file was read before.
+        :param location: String. absolute path to csv file containing input signals.
+        :param file_label: String. Repeating portion of data files label. If 'None', no file label is used.
+        :param file_id: String. Individual identifier of a site csv file
+        :param extension: String, optional. Extension of file containing input signal.
+        :param columns: (optional) list of columns to load. Columns missing from the file are ignored. All columns
+        if None.
+        :param start: (optional) first timestamp to load.
+        :param end: (optional) last timestamp to load.
+        :param version: (optional) version of the source file, e.g. its ETag from an `S3Manifest`. Read from the source
+        file if None.
+        :return: Dataframe containing the requested input signals for `file_id`.
+        """
+        file_name = self.path(location, file_label, file_id, extension)
+        if version is None and (self.can_store or os.path.isfile(file_name)):
+            version = source_version(_source(location, file_label, file_id, extension), self.client)
+        df = None
+        if os.path.isfile(file_name) and self._read_version(file_name) == version:
+            try:
+                df = self._read_cached(file_name, columns)
+                # reads count as uses for the least recently used eviction
+                os.utime(file_name)
+            except Exception:
+                df = None
+        if df is None and self.can_store:
+            df = load_generic_data(location, file_label, file_id, extension)
+            self.can_store = self._store(df, file_name, version)
+            if columns is not None:
+                df = df[[c for c in df.columns if c in set(columns)]]
+        elif df is None:
+            df = load_generic_data(location, file_label, file_id, extension, columns=columns)
+        if start is not None or end is not None:
+            df = df.loc[start:end]
+        return df
+
+    def size(self):
+        """
+        :return: total size of the cached files in bytes.
+        """
+        return sum(os.path.getsize(file_name) for file_name in self._cached_files() if os.path.isfile(file_name))
+
+    def _read_cached(self, file_name, columns):
+        if columns is None:
+            return pd.read_parquet(file_name)
+        try:
+            return pd.read_parquet(file_name, columns=list(columns))
+        except Exception:
+            # some of the columns are not in the file
+            df = pd.read_parquet(file_name)
+            return df[[c for c in df.columns if c in set(columns)]]
+
+    def _read_version(self, file_name):
+        try:
+            with open(file_name + VERSION_EXTENSION) as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _store(self, df, file_name, version):
+        tmp_file_name = file_name + '.tmp'
+        try:
+            df.to_parquet(tmp_file_name, compression='snappy')
+            # the old version is removed first, so that the new copy is never matched with it
+            if os.path.isfile(file_name + VERSION_EXTENSION):
+                os.remove(file_name + VERSION_EXTENSION)
+            os.replace(tmp_file_name, file_name)
+            if version is not None:
+                with open(tmp_file_name, 'w') as f:
+                    f.write(version)
+                os.replace(tmp_file_name, file_name + VERSION_EXTENSION)
+        except Exception:
+            # no parquet engine or unsupported column types
+            if os.path.isfile(tmp_file_name):
+                os.remove(tmp_file_name)
+            return False
+        self._evict(keep=file_name)
+        return True
+
+    def _evict(self, keep=None):
+        if self.max_bytes is None:
+            return
+        # several processes may share the cache directory, files can disappear at any time
+        files = []
+        for file_name in self._cached_files():
+            try:
+                files.append((os.path.getmtime(file_name), os.path.getsize(file_name), file_name))
+            except OSError:
+                continue
+        total = sum(size for _, size, _ in files)
+        for _, size, file_name in sorted(files):
+            if total <= self.max_bytes:
+                break
+            if file_name == keep:
+                continue
+            for to_remove in [file_name + VERSION_EXTENSION, file_name]:
+                try:
+                    os.remove(to_remove)
+                except OSError:
+                    pass
+            total -= size
+
+    def _cached_files(self):
+        return [os.path.join(self.cache_dir, file_name) for file_name in os.listdir(self.cache_dir)
+                if file_name.endswith(CACHE_EXTENSION)]
+
+
+def _source(location, file_label, file_id, extension):
+    # full path to a site file, as read by `load_generic_data`
+    if file_label is None:
+        return location + file_id + extension
+    return location + file_id + file_label + extension
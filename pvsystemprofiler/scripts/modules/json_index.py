@@ -0,0 +1,123 @@
+""" Json Index Module
+This module contains a class for indexing the site json files of an s3 location. Every json file is parsed once, on a
+thread pool, into a table with one row per system holding its zip code, longitude, latitude, tilt, azimuth and mount.
+The table can be stored in a local csv file together with the etag of each json file, so that later runs only parse
+the json files that were added or changed since the table was built. Systems are then looked up in a dictionary
+instead of re-reading the site json file of every system evaluated.
+"""
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor
+from smart_open import smart_open
+import numpy as np
+import pandas as pd
+
+INDEX_COLUMNS = ['system', 'file', 'etag', 'zip_code', 'longitude', 'latitude', 'tilt', 'azimuth', 'mount']
+PARAMETER_COLUMNS = ['zip_code', 'longitude', 'latitude', 'tilt', 'azimuth']
+
+
+def parse_site_json(file_json, file_name=None):
+    """
+    Extracts the parameters of every system of a site from its json content.
+    :param file_json: dictionary with the content of a site json file.
+    :param file_name: (optional) name of the json file, stored with the rows.
+    :return: list of rows with the system id, file name, zip code, longitude, latitude, tilt, azimuth and mount of each
+    system of the site. Empty if the site has no inverters.
+    """
+    rows = []
+    if len(file_json.get('Inverters', {})) == 0:
+        return rows
+    try:
+        zc = file_json['Site']['location'][-5:]
+        zc = '00000' if not zc.isnumeric() else zc
+    except (KeyError, TypeError):
+        zc = '00000'
+    site_coordinates = []
+    for coord_id in ['longitude', 'latitude']:
+        try:
+            val = float(file_json['Site'][coord_id])
+        except (KeyError, TypeError, ValueError):
+            val = np.nan
+        site_coordinates.append(val)
+    for inv_id in file_json['Inverters']:
+        mount_id = 'Mount ' + inv_id.split(' ')[1]
+        sys_id = file_json['Inverters'][inv_id]['inverter_id']
+        mount_coordinates = []
+        for coord_id in ['tilt', 'azimuth']:
+            try:
+                val = file_json['Mount'][mount_id][coord_id]
+            except KeyError:
+                val = np.nan
+            val = np.nan if val == '' else val
+            mount_coordinates.append(val)
+        rows.append([str(sys_id), file_name, None, zc] + site_coordinates + mount_coordinates + [mount_id])
+    return rows
+
+
+class JsonIndex():
+    def __init__(self, index_file=None, max_workers=8):
+        """
+        :param index_file: (optional) path to the local csv file storing the index. If None, the index is only kept in
+        memory.
+        :param max_workers: number of json files read at the same time.
+        """
+        self.index_file = index_file
+        self.max_workers = max_workers
+        self.table = self._read()
+
+    def update(self, location, json_files, etags=None):
+        """
+        Parses the json files that are not in the index or whose etag changed, and removes the files that no longer
+        exist from the index.
+        :param location: String. Full path to the folder containing the json files.
+        :param json_files: list of json file names.
+        :param etags: (optional) list with the etag of each json file, e.g. from an `S3Manifest`. If None, only json
+        files that are not in the index are parsed.
+        :return: number of json files parsed.
+        """
+        if etags is None:
+            etags = [None] * len(json_files)
+        etags = dict(zip(json_files, etags))
+        indexed = self.table.groupby('file')['etag'].first().to_dict()
+        to_parse = [f for f in json_files if f not in indexed or (etags[f] is not None and etags[f] != indexed[f])]
+        keep = self.table['file'].isin(set(json_files) - set(to_parse))
+        frames = [self.table[keep]]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for file_name, rows in zip(to_parse, executor.map(lambda f: self._parse(location, f), to_parse)):
+                if len(rows) == 0:
+                    # files without systems are kept in the index, so that they are not parsed again
+                    rows = [[np.nan, file_name, None, np.nan, np.nan, np.nan, np.nan, np.nan, np.nan]]
+                for row in rows:
+                    row[2] = etags[file_name]
+                frames.append(pd.DataFrame(rows, columns=INDEX_COLUMNS))
+        self.table = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+        if len(to_parse) > 0 or not keep.all():
+            self._write()
+        return len(to_parse)
+
+    def systems(self):
+        """
+        :return: dictionary with system ids as keys and lists with zip code, longitude, latitude, tilt and azimuth as
+        values.
+        """
+        df = self.table[self.table['system'].notna()]
+        return dict(zip(df['system'], df[PARAMETER_COLUMNS].values.tolist()))
+
+    def _parse(self, location, file_name):
+        rows = []
+        for line in smart_open(location + file_name, 'rb'):
+            rows.extend(parse_site_json(json.loads(line), file_name))
+        return rows
+
+    def _read(self):
+        if self.index_file is None or not os.path.isfile(self.index_file):
+            return pd.DataFrame(columns=INDEX_COLUMNS)
+        return pd.read_csv(self.index_file, dtype={'system': str, 'file': str, 'etag': str, 'zip_code': str,
+                                                   'mount': str})
+
+    def _write(self):
+        if self.index_file is None:
+            return
+        tmp_file_name = self.index_file + '.tmp'
+        self.table.to_csv(tmp_file_name, index=False)
+        os.replace(tmp_file_name, self.index_file)
@@ -26,6 +26,8 @@ gmt_offset = str(sys.argv[17])
 data_type = str(sys.argv[18])
 supplementary_file = str(sys.argv[19])
 python_command = str(sys.argv[20])
+# optional flags of the run script, e.g. `--workers 4`, forwarded as given to `run_partition_script`
+options = sys.argv[21:]
 
 # read full list of systems save a local copy of systems corresponding to partition
 df_full = pd.read_csv(global_input_file, index_col=0)
@@ -49,7 +51,8 @@ arguments = estimation + ' ' \
             + convert_to_ts + ' ' \
             + supplementary_file + ' ' \
             + gmt_offset + ' ' \
-            + data_type
+            + data_type \
+            + ''.join(' ' + option for option in options)
 
 full_command = command + ' ' + arguments + '>out &'
 # save local copy of run script
@@ -0,0 +1,92 @@
+""" Result Sink Module
+This module contains a class for writing the results of a run site by site without rewriting the results already
+written. Each site's results are written as a separate part file next to the output file, in
+`<output_file>.parts/`, and `finalize` compacts the part files into the single consolidated output csv file.
+Part files are written to a temporary name, flushed to disk and then renamed, so that a crash never leaves a partially
+written part file behind and a resumed run sees every site that was completed.
+"""
+import os
+import shutil
+import numpy as np
+import pandas as pd
+
+PART_EXTENSION = '.csv'
+
+
+class ResultSink():
+    def __init__(self, output_file):
+        """
+        :param output_file: Absolute path to the consolidated output csv file.
+        """
+        self.output_file = output_file
+        self.parts_dir = output_file + '.parts'
+        # part files are numbered in write order, numbers are not reused after parts are discarded
+        self.n_parts = max([int(os.path.basename(f)[len('part-'):len('part-000000')]) + 1
+                            for f in self._part_files()], default=0)
+
+    def write(self, site_id, partial_df):
+        """
+        Writes the results of a site as a new part file.
+        :param site_id: site identifier.
+        :param partial_df: Dataframe with the results of the systems of the site.
+        :return: path to the part file.
+        """
+        os.makedirs(self.parts_dir, exist_ok=True)
+        file_name = os.path.join(self.parts_dir, 'part-{:06d}-{}{}'.format(self.n_parts, site_id, PART_EXTENSION))
+        tmp_file_name = file_name + '.tmp'
+        with open(tmp_file_name, 'w') as f:
+            partial_df.to_csv(f, index=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file_name, file_name)
+        self.n_parts += 1
+        return file_name
+
+    def discard(self, site_id):
+        """
+        Removes the part files of a site, e.g. results written by a run that crashed before recording the site as
+        completed.
+        :param site_id: site identifier.
+        """
+        suffix = '-{}{}'.format(site_id, PART_EXTENSION)
+        for file_name in self._part_files():
+            if os.path.basename(file_name)[len('part-000000'):] == suffix:
+                os.remove(file_name)
+
+    def read(self):
+        """
+        :return: Dataframe with the consolidated results and the results of all part files, None if there are no
+        results yet.
+        """
+        frames = []
+        if os.path.isfile(self.output_file):
+            frames.append(pd.read_csv(self.output_file, index_col=0))
+        frames.extend(pd.read_csv(file_name) for file_name in self._part_files())
+        if len(frames) == 0:
+            return None
+        df = pd.concat(frames, ignore_index=True)
+        df['site'] = df['site'].apply(str)
+        df['system'] = df['system'].apply(str)
+        return df
+
+    def finalize(self):
+        """
+        Compacts the consolidated results and the part files into the consolidated output file, and removes the part
+        files.
+        :return: None
+        """
+        if len(self._part_files()) == 0:
+            return
+        df = self.read()
+        df.index = np.arange(len(df))
+        tmp_file_name = self.output_file + '.tmp'
+        df.to_csv(tmp_file_name)
+        os.replace(tmp_file_name, self.output_file)
+        shutil.rmtree(self.parts_dir)
+        self.n_parts = 0
+
+    def _part_files(self):
+        if not os.path.isdir(self.parts_dir):
+            return []
+        return sorted(os.path.join(self.parts_dir, file_name) for file_name in os.listdir(self.parts_dir)
+                      if file_name.startswith('part-') and file_name.endswith(PART_EXTENSION))
@@ -0,0 +1,221 @@
+""" S3 Listing Module
+This module contains functions and a class for listing the files of an AWS s3 location. Listings are paginated, so that
+locations with more than 1000 files are listed completely, and the sub-folders of the location are listed concurrently.
+A listing can be saved as a local manifest csv file with the key, size, etag and modification time of every object,
+which later runs reuse instead of listing the bucket again until the manifest is invalidated. The header lines of the
+csv files can be read the same way, by range requests of the first bytes of each object, and are cached next to the
+manifest.
+"""
+import os
+import csv
+from concurrent.futures import ThreadPoolExecutor
+from time import time
+import boto3
+from botocore.exceptions import ClientError
+import pandas as pd
+
+MANIFEST_COLUMNS = ['key', 'size', 'etag', 'mtime']
+HEADER_COLUMNS = ['key', 'etag', 'header']
+
+
+def get_s3_bucket_and_prefix(s3_location):
+    """
+    Splits absolute s3 location into bucket and prefix.
+    :param s3_location: full path to s3 bucket location.
+    :return: s3 bucket and prefix.
+    """
+    if s3_location[-1] != '/':
+        s3_location += '/'
+    i = 5
+    j = s3_location.find('/', i)
+    bucket = s3_location[i:j]
+    prefix = s3_location[j + 1:-1]
+    return bucket, prefix
+
+
+def list_objects(s3_location, client=None, max_workers=8):
+    """
+    Lists every object under an s3 location. The objects directly under the location are listed first, together
+    with its sub-folders, which are then listed concurrently.
+    :param s3_location: String. Full path to the s3 location.
+    :param client: (optional) boto3 s3 client. A new client is created if None.
+    :param max_workers: number of sub-folders listed at the same time.
+    :return: Dataframe with the key, size, etag and modification time of every object, sorted by key.
+    """
+    bucket, prefix = get_s3_bucket_and_prefix(s3_location)
+    if client is None:
+        client = boto3.client('s3')
+    if prefix != '':
+        prefix += '/'
+    rows, sub_prefixes = _list_prefix(client, bucket, prefix, delimiter='/')
+    if len(sub_prefixes) > 0:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for sub_rows, _ in executor.map(lambda p: _list_prefix(client, bucket, p), sub_prefixes):
+                rows.extend(sub_rows)
+    df = pd.DataFrame(rows, columns=MANIFEST_COLUMNS)
+    return df.sort_values('key', ignore_index=True)
+
+
+def read_header(client, bucket, key, nbytes=4096):
+    """
+    Reads the header line of a csv object with range requests of its first bytes, instead of downloading the object.
+    :param client: boto3 s3 client.
+    :param bucket: String. s3 bucket.
+    :param key: String. key of the csv object.
+    :param nbytes: number of bytes requested first. Doubled until the first line is complete.
+    :return: String with the header line. Empty if the object is empty.
+    """
+    while True:
+        try:
+            response = client.get_object(Bucket=bucket, Key=key, Range='bytes=0-{}'.format(nbytes - 1))
+        except ClientError as e:
+            # range requests of empty objects are not satisfiable
+            if e.response.get('Error', {}).get('Code') == 'InvalidRange':
+                return ''
+            raise
+        content = response['Body'].read()
+        if b'\n' in content or len(content) < nbytes:
+            return content.split(b'\n')[0].decode('utf-8-sig').rstrip('\r')
+        nbytes *= 2
+
+
+def _list_prefix(client, bucket, prefix, delimiter=None):
+    kwargs = {'Bucket': bucket, 'Prefix': prefix}
+    if delimiter is not None:
+        kwargs['Delimiter'] = delimiter
+    rows = []
+    sub_prefixes = []
+    for page in client.get_paginator('list_objects_v2').paginate(**kwargs):
+        for obj in page.get('Contents', []):
+            rows.append((obj['Key'], obj['Size'], obj.get('ETag', '').strip('"'), str(obj.get('LastModified'))))
+        sub_prefixes.extend(p['Prefix'] for p in page.get('CommonPrefixes', []))
+    return rows, sub_prefixes
+
+
+class S3Manifest():
+    def __init__(self, s3_location, manifest_file=None, max_age=None, client=None, max_workers=8):
+        """
+        :param s3_location: String. Full path to the s3 location.
+        :param manifest_file: (optional) path to the local manifest csv file. If None, the listing is only kept in
+        memory.
+        :param max_age: (optional) age in seconds after which the manifest file is invalidated. Never if None.
+        :param client: (optional) boto3 s3 client.
+        :param max_workers: number of sub-folders listed at the same time.
+        """
+        self.s3_location = s3_location
+        self.manifest_file = manifest_file
+        self.max_age = max_age
+        self.client = client
+        self.max_workers = max_workers
+        self._objects = None
+
+    def objects(self, refresh=False):
+        """
+        :param refresh: Boolean. If True, the location is listed again even if a valid manifest exists.
+        :return: Dataframe with the key, size, etag and modification time of every object of the location.
+        """
+        if refresh:
+            self.invalidate()
+        if self._objects is None:
+            self._objects = self._read()
+        if self._objects is None:
+            self._objects = list_objects(self.s3_location, self.client, self.max_workers)
+            self._write(self._objects)
+        return self._objects
+
+    def files(self, extension='.csv'):
+        """
+        :param extension: String. Extension of the files to be included.
+        :return: tuple with the list of the names of the files with `extension` and the list of their sizes.
+        """
+        df = self.objects()
+        df = df[df['key'].str.find(extension) != -1]
+        names = df['key'].apply(lambda key: key[key.rfind('/') + 1:]).tolist()
+        return names, df['size'].tolist()
+
+    def etags(self, extension='.csv'):
+        """
+        :param extension: String. Extension of the files to be included.
+        :return: tuple with the list of the names of the files with `extension` and the list of their etags.
+        """
+        df = self.objects()
+        df = df[df['key'].str.find(extension) != -1]
+        names = df['key'].apply(lambda key: key[key.rfind('/') + 1:]).tolist()
+        return names, df['etag'].tolist()
+
+    def headers(self, extension='.csv', max_workers=32):
+        """
+        Reads the header lines of the files with `extension` concurrently. Headers are cached next to the manifest
+        file, and only files whose etag changed are read again.
+        :param extension: String. Extension of the csv files.
+        :param max_workers: number of files read at the same time.
+        :return: Dataframe with the name and the list of column labels of every file.
+        """
+        df = self.objects()
+        df = df[df['key'].str.find(extension) != -1]
+        stored = self._read_headers()
+        # headers of files that were removed or changed are dropped
+        cached = stored.merge(df[['key', 'etag']], on=['key', 'etag'])
+        read = df[~df['key'].isin(cached['key'])][['key', 'etag', 'size']].copy()
+        if len(read) > 0:
+            bucket, _ = get_s3_bucket_and_prefix(self.s3_location)
+            client = boto3.client('s3') if self.client is None else self.client
+            # empty objects are not requested
+            empty = read['size'] == 0
+            read['header'] = ''
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                read.loc[~empty, 'header'] = list(executor.map(lambda key: read_header(client, bucket, key),
+                                                               read.loc[~empty, 'key']))
+            cached = pd.concat([cached, read[HEADER_COLUMNS]], ignore_index=True)
+        if len(read) > 0 or len(cached) != len(stored):
+            self._write_headers(cached)
+        cached = cached.sort_values('key', ignore_index=True)
+        names = cached['key'].apply(lambda key: key[key.rfind('/') + 1:])
+        columns = cached['header'].apply(lambda line: next(csv.reader([line]), []))
+        return pd.DataFrame({'file': names, 'columns': columns})
+
+    def invalidate(self):
+        """
+        Discards the listing and removes the manifest file, so that the location is listed again when needed. Cached
+        headers are kept, since they are checked against the etags of the new listing.
+        """
+        self._objects = None
+        if self.manifest_file is not None and os.path.isfile(self.manifest_file):
+            os.remove(self.manifest_file)
+
+    def _headers_file(self):
+        return None if self.manifest_file is None else self.manifest_file + '.headers'
+
+    def _read_headers(self):
+        file_name = self._headers_file()
+        if file_name is None or not os.path.isfile(file_name):
+            return pd.DataFrame(columns=HEADER_COLUMNS)
+        return pd.read_csv(file_name, dtype=str, keep_default_na=False)
+
+    def _write_headers(self, df):
+        file_name = self._headers_file()
+        if file_name is None:
+            return
+        df.to_csv(file_name + '.tmp', index=False)
+        os.replace(file_name + '.tmp', file_name)
+
+    def _read(self):
+        if self.manifest_file is None or not os.path.isfile(self.manifest_file):
+            return None
+        if self.max_age is not None and time() - os.path.getmtime(self.manifest_file) > self.max_age:
+            return None
+        with open(self.manifest_file) as f:
+            # the first line records the listed location, a manifest of another location is not reused
+            if f.readline().strip() != '# ' + self.s3_location:
+                return None
+            df = pd.read_csv(f, dtype={'key': str, 'etag': str, 'mtime': str}, keep_default_na=False)
+        return df
+
+    def _write(self, df):
+        if self.manifest_file is None:
+            return
+        tmp_file_name = self.manifest_file + '.tmp'
+        with open(tmp_file_name, 'w') as f:
+            f.write('# ' + self.s3_location + '\n')
+            df.to_csv(f, index=False)
+        os.replace(tmp_file_name, self.manifest_file)
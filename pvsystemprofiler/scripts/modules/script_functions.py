@@ -1,16 +1,22 @@
 import os
-import sys
 import json
 import boto3
 import subprocess
+from importlib.util import find_spec
 import paramiko
 from smart_open import smart_open
 import numpy as np
 import pandas as pd
-from solardatatools.utilities import progress
 from pvsystemprofiler.longitude_study import LongitudeStudy
 from pvsystemprofiler.latitude_study import LatitudeStudy
 from pvsystemprofiler.tilt_azimuth_study import TiltAzimuthStudy
+from pvsystemprofiler.fleet_estimator import limit_threads
+from pvsystemprofiler.utilities import parallel
+from pvsystemprofiler.feature_store import FeatureStore
+from pvsystemprofiler.utilities.daily_features import build_feature_table
+from pvsystemprofiler.scripts.modules.s3_listing import S3Manifest
+from pvsystemprofiler.scripts.modules.s3_listing import get_s3_bucket_and_prefix
+from pvsystemprofiler.scripts.modules.json_index import JsonIndex
 
 
 def get_address(tag_name, region, client):
@@ -69,22 +75,7 @@ def copy_to_s3(input_file_name, input_file_location):
     s3.put_object(Bucket=bucket, Key=destination_file_name, Body=content)
 
 
-def get_s3_bucket_and_prefix(s3_location):
-    """
-    Splits absolute s3 location into parameters used to copy and execute commands remotely.
-    :param s3_location: full path to s3 bucket location.
-    :return: s3 bucket and prefix.
-    """
-    if s3_location[-1] != '/':
-        s3_location += '/'
-    i = 5
-    j = s3_location.find('/', i)
-    bucket = s3_location[i:j]
-    prefix = s3_location[j + 1:-1]
-    return bucket, prefix
-
-
-def load_generic_data(location, file_label, file_id, extension='.csv', parse_dates=[0], nrows=None):
+def load_generic_data(location, file_label, file_id, extension='.csv', parse_dates=[0], nrows=None, columns=None):
     """
     Loads csv file containing input signals for a given site.
     :param location: String. absolute path to csv file containing input signals.
@@ -93,6 +84,8 @@ def load_generic_data(location, file_label, file_id, extension='.csv', parse_dat
     :param extension: String, optional. Extension of file containing input signal.
     :param parse_dates: Optional. 'read_csv' kwarg.
     :param nrows: number of rows from input signal file to be read.
+    :param columns: (optional) list of columns to read, besides the index column. Columns missing from the file are
+    ignored. All columns are read if None.
     :return: Dataframe containing input signals for `file_id`.
     """
     if file_label is None:
@@ -100,10 +93,14 @@ def load_generic_data(location, file_label, file_id, extension='.csv', parse_dat
     else:
         to_read = location + file_id + file_label + extension
 
+    usecols = None
+    if columns is not None:
+        header = pd.read_csv(to_read, nrows=0).columns
+        usecols = [header[0]] + [c for c in header[1:] if c in set(columns)]
     if nrows is None:
-        df = pd.read_csv(to_read, index_col=0, parse_dates=parse_dates)
+        df = pd.read_csv(to_read, index_col=0, parse_dates=parse_dates, usecols=usecols)
     else:
-        df = pd.read_csv(to_read, index_col=0, parse_dates=parse_dates, nrows=nrows)
+        df = pd.read_csv(to_read, index_col=0, parse_dates=parse_dates, nrows=nrows, usecols=usecols)
     return df
 
 
@@ -136,26 +133,19 @@ def resume_run(results_file):
     return df
 
 
-def enumerate_files(s3_location, extension='.csv', file_size_list=False):
+def enumerate_files(s3_location, extension='.csv', file_size_list=False, manifest=None):
     """
     Returns a list with the file names with a given extension located in a AWS s3 bucket.
     :param s3_location: String. Full path to s3 bucket from which a list of files is to be generated.
     :param extension: String. Extension of the files to be included in `output_list`.
     :param file_size_list: Boolean, generate a list with the size of each file with `extension`.
+    :param manifest: (optional) `S3Manifest` of `s3_location`, used to share one listing between calls. The location
+    is listed again if None.
     :return: `output_list' with file names and (optional) list with site of files in `output list'.
     """
-    s3_bucket, prefix = get_s3_bucket_and_prefix(s3_location)
-    s3 = boto3.client('s3')
-    output_list = []
-    size_list = []
-    for obj in s3.list_objects_v2(Bucket=s3_bucket, Prefix=prefix)['Contents']:
-        if (obj['Key']).find(extension) != -1:
-            file_name = obj['Key']
-            file_size = obj['Size']
-            i = file_name.rfind('/')
-            file_name = file_name[i + 1:]
-            output_list.append(file_name)
-            size_list.append(file_size)
+    if manifest is None:
+        manifest = S3Manifest(s3_location)
+    output_list, size_list = manifest.files(extension)
     if file_size_list:
         return output_list, size_list
     else:
@@ -267,32 +257,28 @@ def log_file_versions(utility, active_conda_env=None, output_folder_location='./
     return
 
 
-def create_system_list(file_label, signal_label, s3_location):
+def create_system_list(file_label, signal_label, s3_location, manifest_file=None, max_age=None, client=None):
     """
     returns a list of systems present in a `s3_bucket`.
     :param file_label: String. Repeating part of label of files containing input data. For the site list
     ['1_signal.csv', '2_signal.csv'] with `file_label`='_signal'.
     :param signal_label: String. Label of the input signal, i.e. `ac_power_inv_` and `dc_current_inv`.
     :param s3_location: full path to AWS s3 bucket containing csv files with site input signals.
+    :param manifest_file: (optional) path to the local manifest file of `s3_location`. The headers of the files are
+    cached next to it.
+    :param max_age: (optional) age in seconds after which the manifest file is invalidated. Never if None.
+    :param client: (optional) boto3 s3 client.
     :return: List containing ids for systems in s3_location.
     """
-    bucket, prefix = get_s3_bucket_and_prefix(s3_location)
-    file_list = enumerate_files(bucket, prefix)
+    # only the header line of each file is read, concurrently, with range requests
+    headers = S3Manifest(s3_location, manifest_file, max_age=max_age, client=client).headers()
     ll = len(signal_label)
-    system_list = pd.DataFrame(columns=['site', 'system'])
-
-    for file_ix, file_id in enumerate(file_list):
-        progress(file_ix, len(file_list), 'Generating system list', bar_length=20)
-        file_name = file_id.split('/')[1]
-        i = file_name.find(file_label)
-        file_id = file_name[:i]
-        df = load_generic_data(s3_location, file_label, file_id, nrows=2)
-        cols = df.columns
-        for col_label in cols:
-            if col_label.find(signal_label) != -1:
-                system_id = col_label[ll:]
-                system_list.loc[len(system_list)] = file_id, system_id
-    progress(len(file_list), len(file_list), 'Generating system list', bar_length=20)
+    headers['site'] = headers['file'].apply(lambda file_name: file_name[:file_name.find(file_label)])
+    # the first column is the index of the input signals
+    headers['columns'] = headers['columns'].apply(lambda cols: cols[1:])
+    df = headers[['site', 'columns']].explode('columns').dropna()
+    df = df[df['columns'].str.find(signal_label) != -1]
+    system_list = pd.DataFrame({'site': df['site'].values, 'system': df['columns'].str[ll:].values})
     return system_list
 
 
@@ -392,6 +378,31 @@ def run_failsafe_pipeline(dh, sys_tag, fts, tzc):
     return dh, True
 
 
+# optional flags of the run scripts, with their default values and types
+COMMANDLINE_OPTIONS = {'--workers': 1, '--system-workers': 1, '--cache-dir': None, '--cache-size': None, '--prefetch': 1,
+                       '--manifest': None, '--manifest-max-age': 24., '--json-index': None, '--feature-store': None}
+COMMANDLINE_OPTION_TYPES = {'--workers': int, '--system-workers': int, '--cache-dir': str, '--cache-size': float,
+                            '--prefetch': int, '--manifest': str, '--manifest-max-age': float, '--json-index': str,
+                            '--feature-store': str}
+
+
+def split_commandline_options(input_kwargs):
+    """
+    Separates the optional flags of the run scripts, e.g. `--workers 4`, from the positional arguments.
+    :param input_kwargs: list of command line arguments.
+    :return: tuple with the list of positional arguments and the list of the optional flags given, each followed by its
+    value.
+    """
+    positional_kwargs = list(input_kwargs)
+    option_kwargs = []
+    for option in COMMANDLINE_OPTIONS:
+        if option in positional_kwargs:
+            ix = positional_kwargs.index(option)
+            option_kwargs.extend(positional_kwargs[ix:ix + 2])
+            del positional_kwargs[ix:ix + 2]
+    return positional_kwargs, option_kwargs
+
+
 def get_commandline_inputs(input_kwargs):
     """
         :param estimation: Estimation to be performed. Options are 'report', 'longitude', 'latitude', 'tilt_azimuth'.
@@ -414,7 +425,31 @@ def get_commandline_inputs(input_kwargs):
         :param gmt_offset: String. Single value of gmt offset to be used for all estimations. If None a list with individual
         gmt offsets needs to be provided.
         :param data_source: String. Input signal data source. Options are 's3' and 'cassandra'.
+        :param --workers: Optional flag, anywhere in the command line, followed by the number of worker processes.
+        Defaults to 1, i.e. sites are processed sequentially in the main process.
+        :param --system-workers: Optional flag followed by the number of threads used to run the systems of a site
+        concurrently. Defaults to 1.
+        :param --cache-dir: Optional flag followed by the path to a local directory where the input signal files are
+        cached in a columnar format. No cache is used by default.
+        :param --cache-size: Optional flag followed by the maximum size of the input cache in GB. Unbounded by default.
+        :param --prefetch: Optional flag followed by the number of sites loaded ahead of the site being evaluated.
+        Defaults to 1, 0 disables prefetching.
+        :param --manifest: Optional flag followed by the path to a local manifest file of the s3 location. The listing
+        of the location is saved to the file and reused by later runs until the file is removed or expires.
+        :param --manifest-max-age: Optional flag followed by the age in hours after which the manifest file expires and
+        the location is listed again. Defaults to 24.
+        :param --json-index: Optional flag followed by the path to a local csv file storing the parameters of the
+        systems found in the site json files. Only json files added or changed since the last run are parsed.
+        :param --feature-store: Optional flag followed by the path to a feature store directory. The daily features of
+        each system are stored after the pipeline has run, and reruns of the longitude and latitude estimations read
+        them instead of extracting them again.
+        :return: dictionary with the inputs. The optional flags given are also kept as listed on the command line under
+        'options', so that `run_partition_script` can forward them to the remote partitions.
         """
+    input_kwargs, option_kwargs = split_commandline_options(input_kwargs)
+    options = dict(COMMANDLINE_OPTIONS)
+    for ix in range(0, len(option_kwargs), 2):
+        options[option_kwargs[ix]] = COMMANDLINE_OPTION_TYPES[option_kwargs[ix]](option_kwargs[ix + 1])
     inputs_dict = {'estimation': input_kwargs[1],
                    'input_site_file': input_kwargs[2] if input_kwargs[2] != 'None' else None,
                    'n_files': input_kwargs[3],
@@ -428,7 +463,17 @@ def get_commandline_inputs(input_kwargs):
                    'convert_to_ts': True if input_kwargs[11] == 'True' else False,
                    'system_summary_file': input_kwargs[12] if input_kwargs[12] != 'None' else None,
                    'gmt_offset': input_kwargs[13] if input_kwargs[13] != 'None' else None,
-                   'data_source': input_kwargs[14]}
+                   'data_source': input_kwargs[14],
+                   'workers': options['--workers'],
+                   'system_workers': options['--system-workers'],
+                   'cache_dir': options['--cache-dir'],
+                   'cache_size': options['--cache-size'],
+                   'prefetch': options['--prefetch'],
+                   'manifest_file': options['--manifest'],
+                   'manifest_max_age': options['--manifest-max-age'] * 3600,
+                   'json_index_file': options['--json-index'],
+                   'feature_store': options['--feature-store'],
+                   'options': option_kwargs}
     return inputs_dict
 
 
@@ -444,23 +489,39 @@ def load_system_metadata(df_in, file_label):
     return df
 
 
-def generate_list(inputs_dict, full_df, df_system_metadata):
+def generate_list(inputs_dict, full_df, df_system_metadata, ledger=None):
+    """
+    :param ledger: (optional) `CompletionLedger` of the run. If given, completed sites are queried from the ledger
+    instead of being read from `full_df`.
+    :return: tuple with the list of sites to evaluate and the dictionary with the json parameters of each system, None
+    if the json files are not checked.
+    """
+    if inputs_dict['check_json'] and inputs_dict['s3_location'] is None:
+        raise ValueError('the json files can only be checked if an s3 location is provided')
     if inputs_dict['s3_location'] is not None:
-        full_site_list = enumerate_files(inputs_dict['s3_location'])
+        # the location is listed once, for both the csv and the json files
+        manifest = S3Manifest(inputs_dict['s3_location'], inputs_dict.get('manifest_file'),
+                              max_age=inputs_dict.get('manifest_max_age'))
+        full_site_list = enumerate_files(inputs_dict['s3_location'], manifest=manifest)
         full_site_list = filename_to_siteid(full_site_list)
     else:
         full_site_list = []
 
-    previously_checked_site_list = get_checked_sites(full_df)
+    if ledger is not None:
+        previously_checked_site_list = ledger.completed_sites(inputs_dict['estimation'])
+    else:
+        previously_checked_site_list = get_checked_sites(full_df)
     file_list = list(set(full_site_list) - set(previously_checked_site_list))
 
     if inputs_dict['check_json']:
-        json_files = enumerate_files(inputs_dict['s3_location'], extension='.json')
+        json_files, json_etags = manifest.etags(extension='.json')
         print('Generating system list from json files')
-        json_file_dict = create_json_dict(json_files, inputs_dict['s3_location'])
+        json_index = JsonIndex(inputs_dict.get('json_index_file'))
+        json_index.update(inputs_dict['s3_location'], json_files, json_etags)
+        json_systems = json_index.systems()
         print('List generation completed')
     else:
-        json_file_dict = None
+        json_systems = None
 
     if inputs_dict['input_site_file'] is not None:
         input_site_list_df = pd.read_csv(inputs_dict['input_site_file'], index_col=0)
@@ -475,13 +536,36 @@ def generate_list(inputs_dict, full_df, df_system_metadata):
             file_list = list(set(file_list) & set(manually_checked_sites))
     file_list.sort()
 
-    return file_list, json_file_dict
+    return file_list, json_systems
+
+
+def load_system_features(feature_store, site_id, system_id, dh):
+    """
+    Reads the daily features of a system from a feature store, or extracts them from `dh` and stores them if the
+    system is not in the store yet, so that reruns skip the feature extraction.
+    :param feature_store: path to the root directory of the feature store.
+    :param site_id: site identifier.
+    :param system_id: system identifier.
+    :param dh: `DataHandler` on which the pipeline has been run.
+    :return: feature table of the system.
+    """
+    # features are stored as csv files if no parquet engine is installed
+    has_parquet = find_spec('pyarrow') is not None or find_spec('fastparquet') is not None
+    store = FeatureStore(feature_store, file_format='parquet' if has_parquet else 'csv')
+    if store.exists(site_id, system_id):
+        return store.read(site_id, system_id)
+    features = build_feature_table(dh)
+    store.write(site_id, system_id, features)
+    return features
 
 
-def run_failsafe_lon_estimation(dh_in, real_longitude, gmt_offset):
+def run_failsafe_lon_estimation(dh_in, real_longitude, gmt_offset, features=None):
     try:
         runs_lon_estimation = True
-        lon_study = LongitudeStudy(data_handler=dh_in, gmt_offset=gmt_offset, true_value=real_longitude)
+        if features is not None:
+            dh_in = None
+        lon_study = LongitudeStudy(data_handler=dh_in, gmt_offset=gmt_offset, true_value=real_longitude,
+                                   features=features)
         lon_study.run(verbose=False)
         p_df = lon_study.results.sort_index().copy()
     except:
@@ -492,10 +576,12 @@ def run_failsafe_lon_estimation(dh_in, real_longitude, gmt_offset):
     return p_df, runs_lon_estimation
 
 
-def run_failsafe_lat_estimation(dh_in, real_latitude):
+def run_failsafe_lat_estimation(dh_in, real_latitude, features=None):
     try:
         runs_lat_estimation = True
-        lat_study = LatitudeStudy(data_handler=dh_in, lat_true_value=real_latitude)
+        if features is not None:
+            dh_in = None
+        lat_study = LatitudeStudy(data_handler=dh_in, lat_true_value=real_latitude, features=features)
         lat_study.run()
         p_df = lat_study.results.sort_index().copy()
     except:
@@ -535,3 +621,24 @@ def run_failsafe_ta_estimation(dh, nrandom, threshold, lon, lat, tilt, azim, rea
         p_df = pd.DataFrame(columns=cols)
         p_df.loc[0, :] = np.nan
     return p_df, runs_ta_estimation
+
+
+def run_in_process_pool(func, tasks, workers, threads_per_worker=1, max_pending=None, max_attempts=2):
+    """
+    Runs `func` for every task on a pool of worker processes and yields the results in submission order, so that a
+    single consumer can write them. Only a bounded number of tasks is submitted and not yet yielded at any time. If a
+    worker process dies, e.g. killed for running out of memory, the pool is restarted and the lost tasks are run again
+    one at a time, see `pvsystemprofiler.utilities.parallel.run_in_process_pool`. A task that was lost in
+    `max_attempts` pool failures is given up.
+    :param func: picklable function called as `func(*task)` in a worker process.
+    :param tasks: iterable of argument tuples. The iterable is consumed lazily.
+    :param workers: number of worker processes.
+    :param threads_per_worker: number of BLAS/OpenMP threads per worker process. None sets no limit.
+    :param max_pending: maximum number of tasks submitted and not yet yielded. Defaults to twice `workers`.
+    :param max_attempts: number of pool failures a task can be lost in before it is given up.
+    :return: generator of (task, result, error) tuples. `error` is None if `func` returned, otherwise a string
+    describing the exception, in which case `result` is None.
+    """
+    return parallel.run_in_process_pool(func, tasks, workers, initializer=limit_threads,
+                                        initargs=(threads_per_worker,), max_pending=max_pending,
+                                        max_attempts=max_attempts)
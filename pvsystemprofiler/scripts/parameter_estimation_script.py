@@ -15,26 +15,52 @@ filepath = Path(__file__).resolve().parents[2]
 sys.path.append(str(filepath))
 from solardatatools.utilities import progress
 from pvsystemprofiler.scripts.modules.script_functions import run_failsafe_pipeline
-from pvsystemprofiler.scripts.modules.script_functions import resume_run
 from pvsystemprofiler.scripts.modules.script_functions import load_generic_data
 from pvsystemprofiler.scripts.modules.script_functions import log_file_versions
 from pvsystemprofiler.scripts.modules.script_functions import load_system_metadata
 from pvsystemprofiler.scripts.modules.script_functions import generate_list
 from solardatatools.dataio import load_cassandra_data
-from pvsystemprofiler.scripts.modules.script_functions import extract_sys_parameters
 from pvsystemprofiler.scripts.modules.script_functions import get_commandline_inputs
 from pvsystemprofiler.scripts.modules.script_functions import run_failsafe_lon_estimation
 from pvsystemprofiler.scripts.modules.script_functions import run_failsafe_lat_estimation
 from pvsystemprofiler.scripts.modules.script_functions import run_failsafe_ta_estimation
-from solardatatools import DataHandler
+from pvsystemprofiler.scripts.modules.script_functions import run_in_process_pool
+from pvsystemprofiler.scripts.modules.script_functions import load_system_features
+from pvsystemprofiler.scripts.modules.result_sink import ResultSink
+from pvsystemprofiler.scripts.modules.completion_ledger import CompletionLedger
+from pvsystemprofiler.scripts.modules.input_cache import InputCache
+from solardatatools import DataHandler, make_time_series
+from pvsystemprofiler.utilities.parallel import evaluate_configurations
+from pvsystemprofiler.utilities.prefetch import Prefetcher
 
 
-def evaluate_systems(site_id, inputs_dict, df, site_metadata, json_file_dict=None):
+def preprocess_site(df, convert_to_ts):
+    """
+    Converts the input signals of a site to a time series data frame once, to be shared by all the systems of the site.
+    :param df: Dataframe containing the input signals of the site.
+    :param convert_to_ts: Boolean. Specifies if conversion to time series is performed.
+    :return: tuple with the time series data frame and its column labels.
+    """
+    if convert_to_ts:
+        df, keys = make_time_series(df)
+        cols = [el[-1] for el in keys]
+    else:
+        cols = list(df.columns)
+    return df, cols
+
+
+def evaluate_systems(site_id, inputs_dict, df, site_metadata, json_systems=None):
+    """
+    Evaluates every system of a site. The input signals are converted to a time series once per site, and each system
+    gets its own column of the site frame as a Series, which is a view that shares the memory of the site frame. With `inputs_dict['system_workers']` larger than one, the pipelines of
+    the systems of the site run concurrently on threads.
+    :return: Dataframe with the results of the systems of the site, in column order.
+    """
     partial_df_cols = ['site', 'system', 'passes pipeline', 'length', 'capacity_estimate', 'data_sampling',
                        'data quality_score', 'data clearness_score', 'inverter_clipping', 'time_shifts_corrected',
                        'time_zone_correction', 'capacity_changes', 'normal_quality_scores']
 
-    if json_file_dict is not None:
+    if json_systems is not None:
         partial_df_cols.extend(['zip_code', 'real longitude', 'real latitude', 'real tilt', 'real azimuth'])
     if inputs_dict['time_shift_manual']:
         partial_df_cols.append('time_shift_manual')
@@ -42,140 +68,264 @@ def evaluate_systems(site_id, inputs_dict, df, site_metadata, json_file_dict=Non
     partial_df = pd.DataFrame(columns=partial_df_cols)
 
     ll = len(inputs_dict['power_column_label'])
+    site_df, cols = preprocess_site(df, inputs_dict['convert_to_ts'])
 
-    if inputs_dict['convert_to_ts']:
-        dh = DataHandler(df, convert_to_ts=inputs_dict['convert_to_ts'])
-        cols = [el[-1] for el in dh.keys]
-    else:
-        cols = df.columns
-
-    i = 0
+    systems = []
     for col_label in cols:
         if col_label.find(inputs_dict['power_column_label']) != -1:
             system_id = col_label[ll:]
             if system_id in site_metadata['system'].tolist():
-                i += 1
-                dh = DataHandler(df, convert_to_ts=inputs_dict['convert_to_ts'])
                 sys_tag = inputs_dict['power_column_label'] + system_id
-                sys_mask = site_metadata['system'] == system_id
-
-                if inputs_dict['time_shift_manual']:
-                    time_shift_manual = int(site_metadata.loc[sys_mask, 'time_shift_manual'].values[0])
-                    if time_shift_manual == 1:
-                        dh.fix_dst()
-                else:
-                    time_shift_manual = 0
-
-                dh, passes_pipeline = run_failsafe_pipeline(dh, sys_tag, inputs_dict['fix_time_shifts'],
-                                                            inputs_dict['time_zone_correction'])
-                if passes_pipeline:
-                    results_list = [site_id, system_id, passes_pipeline, dh.num_days, dh.capacity_estimate,
-                                    dh.data_sampling, dh.data_quality_score, dh.data_clearness_score,
-                                    dh.inverter_clipping, dh.time_shifts, dh.tz_correction, dh.capacity_changes,
-                                    dh.normal_quality_scores]
-
-                    if inputs_dict['time_shift_manual']:
-                        results_list.append(time_shift_manual)
-                    if json_file_dict is not None:
-                        if system_id in json_file_dict.keys():
-                            source_file = json_file_dict[system_id]
-                            json_information = extract_sys_parameters(source_file, system_id,
-                                                                      inputs_dict['s3_location'])
-                        else:
-                            json_information = [np.nan] * 4
-                        results_list.extend(json_information)
-
-                else:
-                    results_list = [site_id, system_id, passes_pipeline] + [np.nan] * (len(results_list) - 3)
-
-                if inputs_dict['estimation'] == 'longitude':
-                    if inputs_dict['longitude']:
-                        real_longitude = float(site_metadata.loc[sys_mask, 'longitude'])
-                    if inputs_dict['gmt_offset'] is not None:
-                        gmt_offset = inputs_dict['gmt_offset']
-                    else:
-                        gmt_offset = float(site_metadata.loc[sys_mask, 'gmt_offset'])
-                    results_df, passes_estimation = run_failsafe_lon_estimation(dh, real_longitude, gmt_offset)
-
-                elif inputs_dict['estimation'] == 'latitude':
-                    if inputs_dict['latitude']:
-                        real_latitude = float(site_metadata.loc[sys_mask, 'latitude'])
-                    results_df, passes_estimation = run_failsafe_lat_estimation(dh, real_latitude)
-
-                elif inputs_dict['estimation'] == 'tilt_azimuth':
-                    if inputs_dict['estimated_longitude']:
-                        longitude_input = float(site_metadata.loc[sys_mask, 'estimated_longitude'])
-                    if inputs_dict['estimated_latitude']:
-                        latitude_input = float(site_metadata.loc[sys_mask, 'latitude'])
-                    if inputs_dict['latitude']:
-                        real_latitude = float(site_metadata.loc[sys_mask, 'latitude'])
-                    if inputs_dict['tilt']:
-                        real_tilt = float(site_metadata.loc[sys_mask, 'tilt'])
-                    if inputs_dict['azimuth']:
-                        real_azimuth = float(site_metadata.loc[sys_mask, 'azimuth'])
-                    if inputs_dict['gmt_offset']:
-                        gmt_offset = inputs_dict['gmt_offset']
-                    else:
-                        gmt_offset = float(site_metadata.loc[sys_mask, 'gmt_offset'])
-                    results_df, passes_estimation = run_failsafe_ta_estimation(dh, 1, None, longitude_input,
-                                                                               latitude_input, None, None,
-                                                                               real_latitude, real_tilt, real_azimuth,
-                                                                               gmt_offset)
-                if inputs_dict['estimation'] in ['longitude', 'latitude', 'tilt_azimuth']:
-                    results_df[partial_df_cols] = results_list
-                    partial_df = partial_df.append(results_df)
-                elif inputs_dict['estimation'] == 'report':
-                    partial_df.loc[len(partial_df)] = results_list
+                systems.append((site_id, system_id, inputs_dict, site_df[sys_tag], site_metadata, partial_df_cols,
+                                json_systems))
+
+    results = dict(evaluate_configurations(evaluate_system, systems, inputs_dict.get('system_workers')))
+    for ix in range(len(systems)):
+        if inputs_dict['estimation'] in ['longitude', 'latitude', 'tilt_azimuth']:
+            partial_df = pd.concat([partial_df, results[ix]])
+        elif inputs_dict['estimation'] == 'report':
+            partial_df.loc[len(partial_df)] = results[ix]
     return partial_df
 
 
-def main(full_df, inputs_dict, df_system_metadata):
+def evaluate_system(site_id, system_id, inputs_dict, system_signal, site_metadata, partial_df_cols,
+                    json_systems=None):
+    """
+    Runs the pipeline and the estimation for a single system.
+    :param system_signal: time series Series with the input signal of the system, a column of the site frame. The
+    `DataHandler` of the system copies only this column.
+    :return: Dataframe with the estimation results of the system, or list with the report values if the estimation is
+    'report'.
+    """
+    dh = DataHandler(system_signal.to_frame())
+    sys_tag = inputs_dict['power_column_label'] + system_id
+    sys_mask = site_metadata['system'] == system_id
+
+    if inputs_dict['time_shift_manual']:
+        time_shift_manual = int(site_metadata.loc[sys_mask, 'time_shift_manual'].values[0])
+        if time_shift_manual == 1:
+            dh.fix_dst()
+    else:
+        time_shift_manual = 0
+
+    dh, passes_pipeline = run_failsafe_pipeline(dh, sys_tag, inputs_dict['fix_time_shifts'],
+                                                inputs_dict['time_zone_correction'])
+    if passes_pipeline:
+        results_list = [site_id, system_id, passes_pipeline, dh.num_days, dh.capacity_estimate,
+                        dh.data_sampling, dh.data_quality_score, dh.data_clearness_score,
+                        dh.inverter_clipping, dh.time_shifts, dh.tz_correction, dh.capacity_changes,
+                        dh.normal_quality_scores]
+
+        if inputs_dict['time_shift_manual']:
+            results_list.append(time_shift_manual)
+        if json_systems is not None:
+            json_information = json_systems.get(system_id, [np.nan] * 5)
+            results_list.extend(json_information)
+
+    else:
+        results_list = [site_id, system_id, passes_pipeline] + [np.nan] * (len(partial_df_cols) - 3)
+
+    # daily features are read from the feature store on reruns instead of being extracted again
+    features = None
+    if inputs_dict.get('feature_store') is not None and passes_pipeline and \
+            inputs_dict['estimation'] in ['longitude', 'latitude']:
+        features = load_system_features(inputs_dict['feature_store'], site_id, system_id, dh)
+
+    if inputs_dict['estimation'] == 'longitude':
+        if inputs_dict['longitude']:
+            real_longitude = float(site_metadata.loc[sys_mask, 'longitude'])
+        if inputs_dict['gmt_offset'] is not None:
+            gmt_offset = inputs_dict['gmt_offset']
+        else:
+            gmt_offset = float(site_metadata.loc[sys_mask, 'gmt_offset'])
+        results_df, passes_estimation = run_failsafe_lon_estimation(dh, real_longitude, gmt_offset, features)
+
+    elif inputs_dict['estimation'] == 'latitude':
+        if inputs_dict['latitude']:
+            real_latitude = float(site_metadata.loc[sys_mask, 'latitude'])
+        results_df, passes_estimation = run_failsafe_lat_estimation(dh, real_latitude, features)
+
+    elif inputs_dict['estimation'] == 'tilt_azimuth':
+        if inputs_dict['estimated_longitude']:
+            longitude_input = float(site_metadata.loc[sys_mask, 'estimated_longitude'])
+        if inputs_dict['estimated_latitude']:
+            latitude_input = float(site_metadata.loc[sys_mask, 'latitude'])
+        if inputs_dict['latitude']:
+            real_latitude = float(site_metadata.loc[sys_mask, 'latitude'])
+        if inputs_dict['tilt']:
+            real_tilt = float(site_metadata.loc[sys_mask, 'tilt'])
+        if inputs_dict['azimuth']:
+            real_azimuth = float(site_metadata.loc[sys_mask, 'azimuth'])
+        if inputs_dict['gmt_offset']:
+            gmt_offset = inputs_dict['gmt_offset']
+        else:
+            gmt_offset = float(site_metadata.loc[sys_mask, 'gmt_offset'])
+        results_df, passes_estimation = run_failsafe_ta_estimation(dh, 1, None, longitude_input,
+                                                                   latitude_input, None, None,
+                                                                   real_latitude, real_tilt, real_azimuth,
+                                                                   gmt_offset)
+    if inputs_dict['estimation'] in ['longitude', 'latitude', 'tilt_azimuth']:
+        results_df[partial_df_cols] = results_list
+        return results_df
+    return results_list
+
+
+def get_site(file_id, inputs_dict, df_system_metadata):
+    """
+    :param file_id: input signal file name.
+    :param inputs_dict: dictionary with the command line inputs.
+    :param df_system_metadata: Dataframe with the metadata of all systems.
+    :return: tuple with the site id and the metadata of the systems of the site.
+    """
+    if inputs_dict['file_label'] is not None:
+        i = file_id.find(inputs_dict['file_label'])
+        site_id = file_id[:i]
+        mask = df_system_metadata['site'] == site_id.split(inputs_dict['file_label'])[0]
+    else:
+        site_id = file_id.split('.')[0]
+
+        mask = df_system_metadata['site'] == site_id
+    site_metadata = df_system_metadata[mask]
+    return site_id, site_metadata
+
+
+def site_columns(inputs_dict, site_metadata):
+    """
+    :return: list of the power columns of the systems of a site, None if all columns are needed.
+    """
+    if inputs_dict['convert_to_ts']:
+        return None
+    return [inputs_dict['power_column_label'] + system_id for system_id in site_metadata['system']]
+
+
+def load_site_data(site_id, inputs_dict, columns=None):
+    """
+    :param columns: (optional) list of columns to load. Only used with the input cache.
+    """
+    # TODO: integrate option for other data inputs
+    if inputs_dict['data_source'] == 's3' and inputs_dict.get('cache_dir') is not None:
+        max_bytes = None if inputs_dict.get('cache_size') is None else int(inputs_dict['cache_size'] * 1e9)
+        cache = InputCache(inputs_dict['cache_dir'], max_bytes)
+        df = cache.load(inputs_dict['s3_location'], inputs_dict['file_label'], site_id, columns=columns)
+    elif inputs_dict['data_source'] == 's3':
+        df = load_generic_data(inputs_dict['s3_location'], inputs_dict['file_label'], site_id)
+    if inputs_dict['data_source'] == 'cassandra':
+        df = load_cassandra_data(site_id)
+    return df
+
+
+def evaluate_site(site_id, inputs_dict, site_metadata, json_systems=None):
+    """
+    Loads the input signals of a site and evaluates its systems. Used by the worker processes when running with
+    `--workers`.
+    :return: Dataframe with the results of the systems of the site.
+    """
+    df = load_site_data(site_id, inputs_dict, site_columns(inputs_dict, site_metadata))
+    return evaluate_systems(site_id, inputs_dict, df, site_metadata, json_systems)
+
+
+def run_parallel(file_list, inputs_dict, df_system_metadata, json_systems, sink, ledger):
+    """
+    Evaluates the sites of `file_list` on `inputs_dict['workers']` worker processes. Results are written to `sink` by
+    the main process, in the order of `file_list`, as soon as each site and all the sites before it are finished. A
+    site whose worker process crashes is reported and not written, so that it is evaluated again when the run is
+    resumed.
+    """
+    tasks = []
+    for file_id in file_list:
+        site_id, site_metadata = get_site(file_id, inputs_dict, df_system_metadata)
+        if not site_metadata.empty:
+            tasks.append((site_id, inputs_dict, site_metadata, json_systems))
+    t0 = time()
+    for ix, (task, partial_df, error) in enumerate(run_in_process_pool(evaluate_site, _started(tasks, ledger,
+                                                                                              inputs_dict),
+                                                                       inputs_dict['workers'])):
+        site_id = task[0]
+        if error is not None:
+            print('\nsite {} failed: {}'.format(site_id, error))
+            ledger.fail(site_id, inputs_dict['estimation'], error)
+        elif partial_df is not None and not partial_df.empty:
+            output = sink.write(site_id, partial_df)
+            ledger.complete(site_id, inputs_dict['estimation'], partial_df['system'].unique(), output)
+        else:
+            ledger.complete(site_id, inputs_dict['estimation'])
+        msg = 'Accum. run time: {0:2.2f} m'.format((time() - t0) / 60.0)
+        progress(ix + 1, len(tasks), msg, bar_length=20)
+
+
+def _started(tasks, ledger, inputs_dict):
+    # sites are recorded as started when they are submitted to the pool
+    for task in tasks:
+        ledger.start(task[0], inputs_dict['estimation'])
+        yield task
+
+
+def main(full_df, inputs_dict, df_system_metadata, ledger=None):
+    """
+    :param full_df: Dataframe with the results of a previous run, None if there are none. Only used to fill an empty
+    ledger, e.g. when resuming a run started before the ledger was used.
+    :param ledger: (optional) `CompletionLedger` of the run. Defaults to the ledger next to the output file.
+    """
     site_run_time = 0
     total_time = 0
-    file_list, json_file_dict = generate_list(inputs_dict, full_df, df_system_metadata)
+    if ledger is None:
+        ledger = CompletionLedger(inputs_dict['output_file'] + '.ledger.db')
+    if ledger.is_empty() and full_df is not None:
+        # results written before the ledger was used
+        ledger.record_completed(full_df, inputs_dict['estimation'])
+    file_list, json_systems = generate_list(inputs_dict, full_df, df_system_metadata, ledger)
 
     if inputs_dict['n_files'] != 'all':
         file_list = file_list[:int(inputs_dict['n_files'])]
-    if full_df is None:
-        full_df = pd.DataFrame()
-
-    for file_ix, file_id in enumerate(file_list):
+    # results of each site are written as a part file, and compacted into the output file at the end of the run
+    sink = ResultSink(inputs_dict['output_file'])
+    # sites started by a run that crashed may have written results without being recorded as completed
+    for site_id in ledger.incomplete_sites(inputs_dict['estimation']):
+        sink.discard(site_id)
+    if inputs_dict.get('workers', 1) > 1:
+        run_parallel(file_list, inputs_dict, df_system_metadata, json_systems, sink, ledger)
+        sink.finalize()
+        print('finished')
+        return
+
+    # the input signals of the next sites are downloaded and parsed while the current site is evaluated
+    sites = [get_site(file_id, inputs_dict, df_system_metadata) for file_id in file_list]
+    loads = [(site_id, inputs_dict, site_columns(inputs_dict, site_metadata)) for site_id, site_metadata in sites]
+    prefetcher = Prefetcher(load_site_data, loads, depth=inputs_dict.get('prefetch', 1))
+    for file_ix, (_, df, error) in enumerate(prefetcher):
         t0 = time()
         msg = 'Site/Accum. run time: {0:2.2f} s/{1:2.2f} m'.format(site_run_time, total_time / 60.0)
         progress(file_ix, len(file_list), msg, bar_length=20)
 
-        if inputs_dict['file_label'] is not None:
-            i = file_id.find(inputs_dict['file_label'])
-            site_id = file_id[:i]
-            mask = df_system_metadata['site'] == site_id.split(inputs_dict['file_label'])[0]
-        else:
-            site_id = file_id.split('.')[0]
-
-            mask = df_system_metadata['site'] == site_id
-        site_metadata = df_system_metadata[mask]
-
-        # TODO: integrate option for other data inputs
-        if inputs_dict['data_source'] == 's3':
-            df = load_generic_data(inputs_dict['s3_location'], inputs_dict['file_label'], site_id)
-        if inputs_dict['data_source'] == 'cassandra':
-            df = load_cassandra_data(site_id)
+        site_id, site_metadata = sites[file_ix]
+        ledger.start(site_id, inputs_dict['estimation'])
+        if error is not None:
+            print('\nsite {} failed: {}'.format(site_id, error))
+            ledger.fail(site_id, inputs_dict['estimation'], error)
+            continue
 
         if not site_metadata.empty:
-            partial_df = evaluate_systems(site_id, inputs_dict, df, site_metadata, json_file_dict)
+            partial_df = evaluate_systems(site_id, inputs_dict, df, site_metadata, json_systems)
         else:
             partial_df = None
 
-        if not partial_df.empty or partial_df is not None:
-            full_df = full_df.append(partial_df)
-            full_df.index = np.arange(len(full_df))
-            full_df.to_csv(inputs_dict['output_file'])
+        if partial_df is not None and not partial_df.empty:
+            output = sink.write(site_id, partial_df)
+            ledger.complete(site_id, inputs_dict['estimation'], partial_df['system'].unique(), output,
+                            time() - t0)
             t1 = time()
             site_run_time = t1 - t0
             total_time += site_run_time
+        else:
+            ledger.complete(site_id, inputs_dict['estimation'])
 
     msg = 'Site/Accum. run time: {0:2.2f} s/{1:2.2f} m'.format(site_run_time, total_time / 60.0)
     if len(file_list) != 0:
         progress(len(file_list), len(file_list), msg, bar_length=20)
+        metrics = prefetcher.metrics()
+        print('\nprefetch: mean queue depth {0:2.2f}, {1} stalls, stall time {2:2.2f} s'.format(
+            metrics['mean_queue_depth'], metrics['stalls'], metrics['stall_time']))
+    sink.finalize()
     print('finished')
     return
 
@@ -202,6 +352,16 @@ if __name__ == '__main__':
     :param gmt_offset: String. Single value of gmt offset to be used for all estimations. If None a list with individual
     gmt offsets needs to be provided.
     :param data_source: String. Input signal data source. Options are 's3' and 'cassandra'.
+    :param --workers: Optional. Number of worker processes used to evaluate sites concurrently, e.g. '--workers 8'.
+    :param --system-workers: Optional. Number of threads used to evaluate the systems of a site concurrently.
+    :param --cache-dir: Optional. Local directory where input signal files are cached in a columnar format.
+    :param --cache-size: Optional. Maximum size of the input cache in GB.
+    :param --prefetch: Optional. Number of sites loaded ahead of the site being evaluated, 0 disables prefetching.
+    :param --manifest: Optional. Local manifest file caching the listing of the s3 location.
+    :param --manifest-max-age: Optional. Age in hours after which the manifest file is listed again. Defaults to 24.
+    :param --json-index: Optional. Local csv file storing the parameters of the systems found in the site json files.
+    :param --feature-store: Optional. Feature store directory, reused by reruns of the longitude and latitude
+    estimations.
     """
 
     input_kwargs = sys.argv
@@ -210,7 +370,9 @@ if __name__ == '__main__':
     log_file_versions('solar-data-tools', active_conda_env='pvi-user')
     log_file_versions('pv-system-profiler')
 
-    full_df = resume_run(inputs_dict['output_file'])
+    # completed sites are read from the ledger, previous results are only read to fill a new ledger
+    ledger = CompletionLedger(inputs_dict['output_file'] + '.ledger.db')
+    full_df = ResultSink(inputs_dict['output_file']).read() if ledger.is_empty() else None
 
     ssf = inputs_dict['system_summary_file']
     if ssf is not None:
@@ -226,4 +388,4 @@ if __name__ == '__main__':
     else:
         df_system_metadata = None
 
-main(full_df, inputs_dict, df_system_metadata)
+    main(full_df, inputs_dict, df_system_metadata, ledger)
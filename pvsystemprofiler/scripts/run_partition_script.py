@@ -16,16 +16,22 @@ from pvsystemprofiler.scripts.modules.script_functions import copy_to_s3
 from pvsystemprofiler.scripts.modules.script_functions import remote_execute
 from pvsystemprofiler.scripts.modules.script_functions import get_address
 from pvsystemprofiler.scripts.modules.script_functions import get_commandline_inputs
+from pvsystemprofiler.scripts.modules.script_functions import split_commandline_options
+from pvsystemprofiler.scripts.modules.s3_listing import S3Manifest
 
 
-def build_input_file(s3_location, input_file_location='s3://pv.insight.misc/report_files/'):
+def build_input_file(s3_location, input_file_location='s3://pv.insight.misc/report_files/', manifest_file=None,
+                     manifest_max_age=None):
     """
     Builds a csv input file by looking at the contents of the s3 bucket containing csv files with signals.
     :param s3_location: aws s3 bucket location of csv files containing signals
     :param input_file_location: s3 bucket location of report files
+    :param manifest_file: (optional) path to the local manifest file of `s3_location`.
+    :param manifest_max_age: (optional) age in seconds after which the manifest file is invalidated. Never if None.
     :return: DataFrame with signals in a given folder
     """
-    site_list, size_list = enumerate_files(s3_location, file_size_list=True)
+    site_list, size_list = enumerate_files(s3_location, file_size_list=True,
+                                           manifest=S3Manifest(s3_location, manifest_file, max_age=manifest_max_age))
     site_df = pd.DataFrame()
     site_df['site'] = site_list
     site_df['site'] = site_df['site'].apply(lambda x: x.split('.')[0])
@@ -83,7 +89,7 @@ def check_completion(ssh_username, instance_id, ssh_key_file):
 def main(estimation, df, ec2_instances, site_input_file, output_folder_location, ssh_key_file, aws_username,
          aws_instance_name, aws_region, aws_client, script_name, script_location, conda_environment, power_column_id,
          convert_to_ts, s3_location, n_files, file_label, fix_time_shifts, time_zone_correction, check_json,
-         supplementary_file, data_source, gmt_offset):
+         supplementary_file, data_source, gmt_offset, options=None):
     # number of partitions
     n_part = len(ec2_instances)
     total_size = np.sum(df['file_size'])
@@ -110,7 +116,7 @@ def main(estimation, df, ec2_instances, site_input_file, output_folder_location,
                           cts=convert_to_ts, s3l=s3_location, n_files=n_files, file_label=file_label,
                           fix_time_shifts=fix_time_shifts, time_zone_correction=time_zone_correction,
                           check_json=check_json, sup_file=supplementary_file, data_source=data_source,
-                          gmt_offset=gmt_offset)
+                          gmt_offset=gmt_offset, options=options)
         # add partition to list
         partitions.append(part)
         create_partition(part)
@@ -171,15 +177,18 @@ if __name__ == '__main__':
     :param conda environment: conda environment used to run script_to_execute.
     :param aws_instance_name: name of amazon web services instances used for running the study. All instances must have
     the same name
+    The optional flags of the run script, e.g. `--workers 4` or `--cache-dir <dir>`, can be given anywhere in the command
+    line and are forwarded to every partition. Paths given with them are used on the remote instances.
     """
 
     input_kwargs = sys.argv
     inputs_dict = get_commandline_inputs(input_kwargs)
     # The three input arguments below are required in addition to the input arguments required by the run scripts.
     # They are related to 'aws' partition handling.
-    script_to_execute = str(sys.argv[-3])
-    conda_environment = str(sys.argv[-2])
-    aws_instance_name = str(sys.argv[-1])
+    positional_kwargs, _ = split_commandline_options(input_kwargs)
+    script_to_execute = str(positional_kwargs[-3])
+    conda_environment = str(positional_kwargs[-2])
+    aws_instance_name = str(positional_kwargs[-1])
 
     estimation = inputs_dict['estimation']
     input_site_file = inputs_dict['input_site_file']
@@ -197,7 +206,8 @@ if __name__ == '__main__':
 
     # Default input variables
     if not input_site_file:
-        build_input_file(s3_location)
+        build_input_file(s3_location, manifest_file=inputs_dict['manifest_file'],
+                         manifest_max_age=inputs_dict['manifest_max_age'])
         input_site_file = 's3://pv.insight.misc/report_files/generated_site_list.csv'
 
     aws_username = 'ubuntu'
@@ -231,4 +241,4 @@ if __name__ == '__main__':
     main(estimation, df, ec2_instances, input_site_file, output_folder_location, ssh_key_file, aws_username,
          aws_instance_name, aws_region, aws_client, script_name, script_location, conda_environment, power_column_label,
          convert_to_ts, s3_location, n_files, file_label, fix_time_shifts, time_zone_correction, check_json,
-         system_summary_file, data_source, gmt_offset)
+         system_summary_file, data_source, gmt_offset, inputs_dict['options'])
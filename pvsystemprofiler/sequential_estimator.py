@@ -0,0 +1,155 @@
+""" Sequential Estimator Module
+This module contains a class for estimating longitude and latitude while reading the input signal one chunk at a time,
+typically one calendar month at a time. The data read so far is preprocessed with the `solar-data-tools` `DataHandler`
+pipeline and the estimates are updated each time the number of days read has grown by a constant factor, so that the
+total preprocessing work stays proportional to the data read. Reading stops as soon as the estimates are stable, or
+after about one year of data, so that for most systems only the first months of a multi-year file are loaded and
+preprocessed.
+
+Example, reading a csv file month by month:
+
+    chunks = monthly_chunks(pd.read_csv(file_name, index_col=0, parse_dates=[0], chunksize=10000))
+    sest = SequentialEstimator(gmt_offset=-8, pipeline_kwargs={'power_col': 'ac_power_01'})
+    sest.run(chunks)
+    print(sest.longitude, sest.latitude, sest.days_read, sest.converged)
+
+"""
+from time import time
+import numpy as np
+import pandas as pd
+from solardatatools import DataHandler
+from pvsystemprofiler.estimator import ConfigurationEstimator
+
+
+def monthly_chunks(data):
+    """
+    Groups the rows of a time series into calendar months. Rows are read lazily when `data` is an iterator, so that
+    reading stops when the consumer of the chunks stops.
+    :param data: data frame with a datetime index, or iterable of such data frames in chronological order, e.g. the
+    reader returned by `pd.read_csv(..., chunksize=n)`.
+    :return: generator of data frames, one per calendar month.
+    """
+    if isinstance(data, pd.DataFrame):
+        data = [data]
+    buffer = []
+    for df in data:
+        months = df.index.to_period('M')
+        for month in months.unique():
+            part = df[months == month]
+            if len(buffer) > 0 and buffer[0].index[0].to_period('M') != month:
+                yield pd.concat(buffer)
+                buffer = []
+            buffer.append(part)
+    if len(buffer) > 0:
+        yield pd.concat(buffer)
+
+
+class SequentialEstimator():
+    def __init__(self, gmt_offset, estimate=('longitude', 'latitude'), tolerance=0.5, patience=2, min_days=60,
+                 max_days=365, growth=1.5, pipeline_kwargs=None, estimator_kwargs=None):
+        """
+        :param gmt_offset: The offset in hours between the local timezone and GMT/UTC.
+        :param estimate: parameters to estimate, 'longitude' and/or 'latitude'.
+        :param tolerance: largest change of each estimate between consecutive updates, in Degrees, for the estimates to
+        be considered stable.
+        :param patience: number of consecutive updates for which the estimates must be stable before reading stops.
+        :param min_days: minimum number of days read before reading can stop.
+        :param max_days: (optional) maximum number of days read. Reading stops once it is reached, even if the
+        estimates are not stable. If None, the whole input is read when the estimates never become stable.
+        :param growth: factor by which the number of days read must grow between two updates of the estimates.
+        :param pipeline_kwargs: (optional) dictionary of keyword arguments passed to `DataHandler.run_pipeline`.
+        :param estimator_kwargs: (optional) dictionary of keyword arguments passed to `ConfigurationEstimator`.
+        """
+        self.gmt_offset = gmt_offset
+        self.estimate = tuple(np.atleast_1d(estimate))
+        self.tolerance = tolerance
+        self.patience = patience
+        self.min_days = min_days
+        self.max_days = max_days
+        self.growth = growth
+        self.pipeline_kwargs = {} if pipeline_kwargs is None else dict(pipeline_kwargs)
+        self.pipeline_kwargs.setdefault('verbose', False)
+        self.estimator_kwargs = {} if estimator_kwargs is None else estimator_kwargs
+        self.longitude = None
+        self.latitude = None
+        self.data_handler = None
+        self.days_read = 0
+        self.converged = False
+        self.history = []
+        self.days_updated = 0
+        self._chunks = []
+        self._stable_updates = 0
+
+    def run(self, chunks):
+        """
+        Reads chunks until the estimates are stable, `max_days` is reached or `chunks` is exhausted. In the last case,
+        the estimates are updated with all the data read.
+        :param chunks: iterable of data frames with a datetime index, in chronological order, e.g. as returned by
+        `monthly_chunks`. The iterable is consumed lazily.
+        :return: the `SequentialEstimator` instance.
+        """
+        for chunk in chunks:
+            if self.add_chunk(chunk):
+                return self
+        if self.days_read > self.days_updated:
+            self.update()
+        return self
+
+    def add_chunk(self, chunk):
+        """
+        Adds a chunk of data. The estimates are updated if the number of days read has grown by `growth` since the last
+        update, or if `max_days` is reached.
+        :param chunk: data frame with a datetime index.
+        :return: True if reading can stop.
+        """
+        self._chunks.append(chunk)
+        self.days_read += chunk.index.normalize().nunique()
+        reached_max = self.max_days is not None and self.days_read >= self.max_days
+        if self.days_updated > 0 and self.days_read < self.growth * self.days_updated and not reached_max:
+            return False
+        self.update()
+        return self.converged or reached_max
+
+    def update(self):
+        """
+        Reruns the preprocessing pipeline on all the data read so far and updates the estimates. If the pipeline or the
+        estimation fails, e.g. because too few days have been read, the error is recorded in the history and the
+        estimates are not updated.
+        :return: None
+        """
+        t0 = time()
+        self.days_updated = self.days_read
+        previous = {parameter: getattr(self, parameter) for parameter in self.estimate}
+        error = None
+        try:
+            dh = DataHandler(pd.concat(self._chunks))
+            dh.run_pipeline(**self.pipeline_kwargs)
+            self.data_handler = dh
+            est = ConfigurationEstimator(dh, self.gmt_offset, **self.estimator_kwargs)
+            if 'longitude' in self.estimate:
+                est.estimate_longitude()
+                self.longitude = est.longitude
+            if 'latitude' in self.estimate:
+                est.estimate_latitude()
+                self.latitude = est.latitude
+        except Exception as e:
+            error = '{}: {}'.format(type(e).__name__, e)
+        changes = [np.abs(getattr(self, parameter) - previous[parameter])
+                   if error is None and previous[parameter] is not None else np.inf for parameter in self.estimate]
+        if np.all(np.array(changes) <= self.tolerance):
+            self._stable_updates += 1
+        else:
+            self._stable_updates = 0
+        self.converged = self._stable_updates >= self.patience and self.days_read >= self.min_days
+        record = {'chunk': len(self._chunks), 'days_read': self.days_read, 'longitude': self.longitude,
+                  'latitude': self.latitude, 'max_change': np.max(changes), 'run_time': time() - t0, 'error': error}
+        self.history.append(record)
+
+    @property
+    def history_table(self):
+        """
+        :return: data frame with one row per update, with the number of chunks and days read, the estimates, the largest
+        change of the estimates with respect to the previous update, the run time of the update and the error, if any.
+        """
+        return pd.DataFrame(self.history, columns=['chunk', 'days_read', 'longitude', 'latitude', 'max_change',
+                                                   'run_time', 'error'])
@@ -0,0 +1,257 @@
+""" Study Planner Module
+This module contains a class for running the longitude, latitude and tilt and azimuth studies back to back on the same
+`solar-data-tools` `DataHandler` object. The studies share several expensive intermediate results: the optimized
+sunrise/sunset estimates, the declination matrices, the hour angle, the daytime threshold fits and the cos(theta) fit.
+The planner turns the requested studies into a dependency graph of these intermediate results and of the studies
+themselves. Each node of the graph is computed once, independent nodes are computed in parallel on a thread pool, and
+intermediate results are released as soon as their last consumer has finished. A combined study therefore costs roughly
+the sum of its unique parts.
+
+Example:
+
+    planner = StudyPlanner(dh, gmt_offset=-8)
+    planner.add_longitude_study(true_value=-122.1)
+    planner.add_latitude_study(lat_true_value=37.4)
+    planner.add_tilt_azimuth_study(nrandom_init_values=1)
+    studies = planner.run()
+    studies['longitude'].results
+
+"""
+import inspect
+from time import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+from pvsystemprofiler.longitude_study import LongitudeStudy
+from pvsystemprofiler.latitude_study import LatitudeStudy
+from pvsystemprofiler.tilt_azimuth_study import TiltAzimuthStudy
+from pvsystemprofiler.utilities.hour_angle_equation import calculate_omega
+from pvsystemprofiler.utilities.declination_equation import delta_cooper, delta_spencer
+from pvsystemprofiler.utilities.equation_of_time import eot_duffie
+from pvsystemprofiler.algorithms.longitude.estimation import estimate_longitude
+from pvsystemprofiler.algorithms.performance_model_estimation import find_fit_costheta
+from pvsystemprofiler.algorithms.optimized_sunrise_sunset import get_optimized_sunrise_sunset
+from pvsystemprofiler.algorithms.optimized_sunrise_sunset import merge_optimized_sunrise_sunset
+from pvsystemprofiler.algorithms.tilt_azimuth.daytime_threshold_quantile import calculate_threshold_quantiles
+from pvsystemprofiler.algorithms.tilt_azimuth.daytime_threshold_quantile import \
+    find_daytime_threshold_quantile_seasonality
+
+
+class StudyPlanner():
+    def __init__(self, data_handler, gmt_offset=-8, max_workers=None):
+        """
+        :param data_handler: `DataHandler` class instance loaded with a solar power data set.
+        :param gmt_offset: The offset in hours between the local timezone and GMT/UTC.
+        :param max_workers: (optional) number of threads used to compute independent nodes. Defaults to the
+        `ThreadPoolExecutor` default.
+        """
+        self.data_handler = data_handler
+        if not data_handler._ran_pipeline:
+            print('Running DataHandler preprocessing pipeline with defaults')
+            self.data_handler.run_pipeline()
+        self.gmt_offset = gmt_offset
+        self.max_workers = max_workers
+        # requested studies: name -> (study instance, run keyword arguments)
+        self.studies = {}
+        # graph: node -> (function, dependencies)
+        self.graph = None
+        self.node_run_times = {}
+        # intermediate results in the order in which they were released
+        self.released_nodes = []
+
+    def add_longitude_study(self, true_value=None, **run_kwargs):
+        """
+        :param true_value: (optional) the ground truth value for the system's longitude.
+        :param run_kwargs: keyword arguments passed to `LongitudeStudy.run`.
+        """
+        run_kwargs.setdefault('verbose', False)
+        study = LongitudeStudy(self.data_handler, gmt_offset=self.gmt_offset, true_value=true_value)
+        self.studies['longitude'] = (study, run_kwargs)
+
+    def add_latitude_study(self, lat_true_value=None, **run_kwargs):
+        """
+        :param lat_true_value: (optional) the ground truth value for the system's latitude.
+        :param run_kwargs: keyword arguments passed to `LatitudeStudy.run`.
+        """
+        study = LatitudeStudy(self.data_handler, lat_true_value=lat_true_value)
+        self.studies['latitude'] = (study, run_kwargs)
+
+    def add_tilt_azimuth_study(self, delta_method=('cooper', 'spencer'), **study_kwargs):
+        """
+        If `lon_input` is not provided, the longitude is estimated with the `ConfigurationEstimator` defaults as part of
+        the plan.
+        :param delta_method: 'cooper', 'spencer'. Passed to `TiltAzimuthStudy.run`.
+        :param study_kwargs: keyword arguments passed to the `TiltAzimuthStudy` constructor.
+        """
+        study_kwargs['gmt_offset'] = self.gmt_offset
+        study = TiltAzimuthStudy(self.data_handler, **study_kwargs)
+        self.studies['tilt_azimuth'] = (study, {'delta_method': delta_method})
+
+    def build_graph(self):
+        """
+        Builds the dependency graph of the requested studies.
+        :return: dictionary with node names as keys and (function, list of dependencies) tuples as values.
+        """
+        dh = self.data_handler
+        graph = {}
+
+        def add_sunrise_sunset(matrix_ids):
+            # the optimizer runs on the raw and filled data matrices are independent nodes
+            matrix_ids = [m for m in ('raw', 'filled') if m in np.atleast_1d(matrix_ids)]
+            deps = []
+            for matrix_id in matrix_ids:
+                node = 'sunrise_sunset_' + matrix_id
+                if matrix_id == 'raw':
+                    graph[node] = (lambda values: get_optimized_sunrise_sunset(None, dh.raw_data_matrix), [])
+                elif matrix_id == 'filled':
+                    graph[node] = (lambda values: get_optimized_sunrise_sunset(dh.filled_data_matrix, None), [])
+                deps.append(node)
+            merged_node = 'optimized_sunrise_sunset_' + '_'.join(matrix_ids)
+            graph[merged_node] = (lambda values: merge_optimized_sunrise_sunset(*[values[d] for d in deps]), deps)
+            return merged_node
+
+        def add_delta(delta_ids):
+            deps = []
+            for delta_id in np.atleast_1d(delta_ids):
+                if delta_id in ('Cooper', 'cooper'):
+                    graph['delta_cooper'] = (lambda values: delta_cooper(self._day_of_year, self._daily_meas), [])
+                    deps.append('delta_cooper')
+                elif delta_id in ('Spencer', 'spencer'):
+                    graph['delta_spencer'] = (lambda values: delta_spencer(self._day_of_year, self._daily_meas), [])
+                    deps.append('delta_spencer')
+            return deps
+
+        if 'longitude' in self.studies:
+            study, run_kwargs = self.studies['longitude']
+            ss_node = add_sunrise_sunset(_run_option(LongitudeStudy.run, run_kwargs, 'data_matrix'))
+            graph['longitude'] = (self._study_runner('longitude', {'optimized_sunrise_sunset': ss_node}), [ss_node])
+
+        if 'latitude' in self.studies:
+            study, run_kwargs = self.studies['latitude']
+            ss_node = add_sunrise_sunset(_run_option(LatitudeStudy.run, run_kwargs, 'data_matrix'))
+            delta_nodes = add_delta(_run_option(LatitudeStudy.run, run_kwargs, 'delta_method'))
+            inputs = {'optimized_sunrise_sunset': ss_node}
+            inputs.update({node: node for node in delta_nodes})
+            graph['latitude'] = (self._study_runner('latitude', inputs), [ss_node] + delta_nodes)
+
+        if 'tilt_azimuth' in self.studies:
+            study, run_kwargs = self.studies['tilt_azimuth']
+            inputs = {node: node for node in add_delta(run_kwargs['delta_method'])}
+            # hour angle
+            if study.lon_input is None:
+                ss_node = add_sunrise_sunset('filled')
+                graph['longitude_estimate'] = (self._estimate_longitude, [ss_node])
+                graph['omega'] = (lambda values: self._omega(values['longitude_estimate']), ['longitude_estimate'])
+            else:
+                graph['omega'] = (lambda values: self._omega(study.lon_input), [])
+            inputs['omega'] = 'omega'
+            # cos(theta) fit
+            graph['costheta_fit'] = (lambda values: find_fit_costheta(dh.filled_data_matrix, dh.daily_flags.clear),
+                                     [])
+            inputs['costheta_fit'] = 'costheta_fit'
+            # daytime thresholds, one node per (x1, x2) pair so that the fits run in parallel
+            if study.daytime_threshold is None:
+                graph['threshold_quantiles'] = (
+                    lambda values: calculate_threshold_quantiles(dh.filled_data_matrix, study.threshold_x2), [])
+                threshold_nodes = []
+                for x1 in study.threshold_x1:
+                    for x2 in study.threshold_x2:
+                        node = ('daytime_threshold', x1, x2)
+                        graph[node] = (self._threshold_fitter(x1, x2), ['threshold_quantiles'])
+                        threshold_nodes.append(node)
+                graph['daytime_thresholds'] = (
+                    lambda values: {node[1:]: values[node] for node in threshold_nodes}, threshold_nodes)
+                inputs['daytime_thresholds'] = 'daytime_thresholds'
+            deps = list(inputs.values())
+            if study.lon_input is None:
+                deps.append('longitude_estimate')
+            graph['tilt_azimuth'] = (self._study_runner('tilt_azimuth', inputs), deps)
+
+        self.graph = graph
+        return graph
+
+    def run(self):
+        """
+        Computes every node of the dependency graph once and runs the requested studies.
+        :return: dictionary with the study names ('longitude', 'latitude', 'tilt_azimuth') as keys and the study
+        instances, with their `results` attribute set, as values.
+        """
+        graph = self.build_graph()
+        # number of nodes that still have to consume the result of each node
+        remaining = {node: 0 for node in graph}
+        for node, (func, deps) in graph.items():
+            for dep in deps:
+                remaining[dep] += 1
+        values = {}
+        done = set()
+        running = {}
+        self.node_run_times = {}
+        self.released_nodes = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while len(done) < len(graph):
+                submitted = set(running.values())
+                for node, (func, deps) in graph.items():
+                    if node not in done and node not in submitted and all(dep in done for dep in deps):
+                        dep_values = {dep: values[dep] for dep in deps}
+                        running[executor.submit(self._timed, node, func, dep_values)] = node
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    node = running.pop(future)
+                    values[node] = future.result()
+                    done.add(node)
+                    # release intermediate results that have no consumers left
+                    for dep in graph[node][1]:
+                        remaining[dep] -= 1
+                        if remaining[dep] == 0:
+                            del values[dep]
+                            self.released_nodes.append(dep)
+        return {name: values[name] for name in self.studies}
+
+    @property
+    def _day_of_year(self):
+        return self.data_handler.day_index.dayofyear
+
+    @property
+    def _daily_meas(self):
+        return self.data_handler.filled_data_matrix.shape[0]
+
+    def _timed(self, node, func, dep_values):
+        t0 = time()
+        value = func(dep_values)
+        self.node_run_times[node] = time() - t0
+        return value
+
+    def _study_runner(self, name, inputs):
+        study, run_kwargs = self.studies[name]
+
+        def run_study(values):
+            if 'longitude_estimate' in values:
+                study.lon_input = values['longitude_estimate']
+            study.intermediates = {key: values[node] for key, node in inputs.items()}
+            study.run(**run_kwargs)
+            # the study keeps its own references, drop the shared dictionary
+            study.intermediates = {}
+            return study
+        return run_study
+
+    def _threshold_fitter(self, x1, x2):
+        def fit_threshold(values):
+            return find_daytime_threshold_quantile_seasonality(self.data_handler.filled_data_matrix, x1, x2,
+                                                               values['threshold_quantiles'][x2])
+        return fit_threshold
+
+    def _estimate_longitude(self, values):
+        # same configuration as the `ConfigurationEstimator` defaults
+        opt_dict = list(values.values())[0]
+        solarnoon = np.nanmean([opt_dict['est_sr_f'], opt_dict['est_ss_f']], axis=0)
+        return estimate_longitude('fit_l1', eot_duffie(self._day_of_year), solarnoon,
+                                  self.data_handler.daily_flags.no_errors, self.gmt_offset)
+
+    def _omega(self, lon):
+        return calculate_omega(self.data_handler.data_sampling, self.data_handler.num_days, lon, self._day_of_year,
+                               self.gmt_offset)
+
+
+def _run_option(method, run_kwargs, name):
+    if name in run_kwargs:
+        return run_kwargs[name]
+    return inspect.signature(method).parameters[name].default
@@ -10,7 +10,6 @@ The following configurations can be run:
  - Declination equation: 'cooper', 'spencer'.
  """
 import numpy as np
-import pandas as pd
 from pvsystemprofiler.utilities.hour_angle_equation import calculate_omega
 from pvsystemprofiler.utilities.declination_equation import delta_spencer
 from pvsystemprofiler.utilities.declination_equation import delta_cooper
@@ -23,13 +22,19 @@ from pvsystemprofiler.algorithms.angle_of_incidence.dynamic_value_functions impo
 from pvsystemprofiler.algorithms.angle_of_incidence.dynamic_value_functions import select_init_values
 from pvsystemprofiler.utilities.tools import random_initial_values
 from pvsystemprofiler.algorithms.tilt_azimuth.daytime_threshold_quantile import filter_data
+from pvsystemprofiler.algorithms.tilt_azimuth.daytime_threshold_quantile import calculate_threshold_quantiles
+from pvsystemprofiler.utilities.results_buffer import ResultsBuffer
+from pvsystemprofiler.utilities.parallel import evaluate_configurations
+from pvsystemprofiler.utilities.time_budget import get_time_budget
+from pvsystemprofiler.utilities.data_reduction import downsample_factor, downsample_matrix, stratified_days
 
 
 class TiltAzimuthStudy():
     def __init__(self, data_handler, day_range='full_year', init_values=None, nrandom_init_values=None,
                  daytime_threshold=None, lon_input=None, lat_input=None, tilt_input=None,
                  azimuth_input=None, lat_true_value=None, tilt_true_value=None, azimuth_true_value=None,
-                 gmt_offset=-8, cvx_parameter=None, threshold_quantile=None):
+                 gmt_offset=-8, cvx_parameter=None, threshold_quantile=None, intermediates=None, fast_mode=False,
+                 fast_sampling=15, fast_days=90):
         """
         :param data_handler: `DataHandler` class instance loaded with a solar power data set.
         :param day_range: (optional) the desired day range to run the study. A list of the form
@@ -49,6 +54,13 @@ class TiltAzimuthStudy():
         :param gmt_offset: The offset in hours between the local timezone and GMT/UTC.
         :param cvx_parameter: (optional). Factor used in signal decomposition for estimation of daytime threshold.
         :param threshold_quantile: (optional). Quantile of data used in estimation of daytime threshold.
+        :param intermediates: (optional) dictionary with precomputed intermediate results, as provided by
+        `StudyPlanner`. Supported keys: 'omega', 'costheta_fit', 'delta_cooper', 'delta_spencer',
+        'threshold_quantiles' and 'daytime_thresholds'.
+        :param fast_mode: (optional) if True, the data matrix, hour angle and declination are aggregated to a
+        `fast_sampling` time grid, and only about `fast_days` clear days spread across the seasons are used in the fit.
+        :param fast_sampling: (optional) coarsest data sampling in minutes used in fast mode.
+        :param fast_days: (optional) number of clear days used in the fit in fast mode.
         """
 
         self.data_handler = data_handler
@@ -80,6 +92,7 @@ class TiltAzimuthStudy():
         self.tilt_true_value = tilt_true_value
         self.azimuth_true_value = azimuth_true_value
         self.gmt_offset = gmt_offset
+        self.intermediates = {} if intermediates is None else intermediates
         # thresholds
         self.daytime_threshold = daytime_threshold
         self.daytime_threshold_fit = None
@@ -97,18 +110,24 @@ class TiltAzimuthStudy():
         self.daily_meas = self.data_handler.filled_data_matrix.shape[0]
         self.data_sampling = self.data_handler.data_sampling
         self.clear_index = data_handler.daily_flags.clear
+        # fast mode
+        self.fast_mode = fast_mode
+        self.fast_sampling = fast_sampling
+        self.fast_days = fast_days
+        # clear days used in the fit
+        self.fit_index = self.clear_index
         # angle of incidence parameters
         self.delta_cooper = None
         self.delta_spencer = None
         self.omega = None
         self.scale_factor_costheta = None
-        self.costheta_estimated = None
-        self.costheta_ground_truth = None
+        # ground truth cos(theta) for each declination method, calculated on first request
+        self._costheta_ground_truth = {}
         self.costheta_fit = None
         # other
         self.results = None
 
-    def run(self, delta_method=('cooper', 'spencer')):
+    def run(self, delta_method=('cooper', 'spencer'), max_workers=None, time_budget=None):
         """
         Run a study with the given configuration of options. Defaults to
         running all available options. Any kwarg can be constrained by
@@ -127,18 +146,97 @@ class TiltAzimuthStudy():
         containing the results of the study.
 
         :param delta_method: 'cooper', 'spencer'.
+        :param max_workers: (optional) number of threads used to evaluate (cvx parameter, threshold quantile) cells
+        concurrently. If None, the cells are evaluated sequentially.
+        :param time_budget: (optional) time budget in seconds, or `TimeBudget` instance shared with other stages. When
+        the budget runs low, every other (cvx parameter, threshold quantile) cell is skipped and only the first initial
+        value of each remaining cell is fitted. Once the budget has expired, all remaining cells are skipped. Skipped
+        configurations are flagged in a 'skipped' column, which is only added if a budget is given.
         :return: None.
         """
+        time_budget = get_time_budget(time_budget)
+        cells = self._prepare_cells(delta_method, time_budget)
+        rows_per_cell = self._cell_size(cells[0]) if len(cells) > 0 else 0
+        results = self.create_results_table(len(cells) * rows_per_cell, time_budget)
+        for cell_ix, rows in evaluate_configurations(self.evaluate_cell, cells, max_workers):
+            for row_ix, row in enumerate(rows):
+                results.set_row(cell_ix * rows_per_cell + row_ix, row)
+        self.results = results.to_frame()
 
+        if self.lat_true_value is not None and self.lat_input is None:
+            self.results['latitude residual'] = self.lat_true_value - self.results['latitude']
+        if self.tilt_true_value is not None and self.tilt_input is None:
+            self.results['tilt residual'] = self.tilt_true_value - self.results['tilt']
+        if self.azimuth_true_value is not None and self.azimuth_input is None:
+            self.results['azimuth residual'] = self.azimuth_true_value - self.results['azimuth']
+        return
+
+    def iter_results(self, delta_method=('cooper', 'spencer'), max_workers=None, time_budget=None):
+        """
+        Streaming version of `run`. Yields the result of each configuration as soon as its (cvx parameter, threshold
+        quantile) cell is computed, instead of collecting all of them. The `results` attribute is not set. If the
+        generator is closed early, cells that have not started are not evaluated.
+        :param delta_method: 'cooper', 'spencer'.
+        :param max_workers: (optional) number of threads used to evaluate cells concurrently. If set, records are
+        yielded in order of completion.
+        :param time_budget: (optional) time budget in seconds or `TimeBudget` instance, see `run`.
+        :return: generator of dictionaries with the results columns as keys, plus the residual columns if ground truth
+        values were provided.
+        """
+        time_budget = get_time_budget(time_budget)
+        columns = self.result_columns(time_budget)
+        cells = self._prepare_cells(delta_method, time_budget)
+        for cell_ix, rows in evaluate_configurations(self.evaluate_cell, cells, max_workers):
+            for row in rows:
+                record = dict(zip(columns, row))
+                for name, true_value, input_value in (('latitude', self.lat_true_value, self.lat_input),
+                                                      ('tilt', self.tilt_true_value, self.tilt_input),
+                                                      ('azimuth', self.azimuth_true_value, self.azimuth_input)):
+                    if true_value is not None and input_value is None:
+                        record[name + ' residual'] = true_value - record[name]
+                yield record
+
+    def _prepare_cells(self, delta_method, time_budget=None):
+        """
+        Calculates the hour angle, the cos(theta) fit, the declination and the daytime threshold quantiles.
+        :return: list of argument tuples for `evaluate_cell`, one per (cvx parameter, threshold quantile) cell.
+        """
         delta_method = np.atleast_1d(delta_method)
+        intermediates = self.intermediates
+        self._costheta_ground_truth = {}
+        factor = 1
+        if self.fast_mode:
+            factor = downsample_factor(self.data_sampling, self.daily_meas, self.fast_sampling)
+            # fits on the full resolution data do not apply to the aggregated data
+            intermediates = {key: value for key, value in intermediates.items()
+                             if key in ('omega', 'delta_cooper', 'delta_spencer')}
+            self.fit_index = stratified_days(self.day_of_year, self.clear_index, self.fast_days)
+        else:
+            self.fit_index = self.clear_index
+        self.data_matrix = downsample_matrix(self.data_handler.filled_data_matrix, factor)
         # calculate hour angle
-        self.omega = calculate_omega(self.data_sampling, self.num_days, self.lon_input, self.day_of_year,
-                                     self.gmt_offset)
+        if 'omega' in intermediates:
+            self.omega = intermediates['omega']
+        else:
+            self.omega = calculate_omega(self.data_sampling, self.num_days, self.lon_input, self.day_of_year,
+                                         self.gmt_offset)
+        self.omega = downsample_matrix(self.omega, factor)
         # fit daily signal of cos theta
-        self.scale_factor_costheta, self.costheta_fit = find_fit_costheta(self.data_matrix, self.clear_index)
+        if 'costheta_fit' in intermediates:
+            self.scale_factor_costheta, self.costheta_fit = intermediates['costheta_fit']
+        else:
+            self.scale_factor_costheta, self.costheta_fit = find_fit_costheta(self.data_matrix, self.clear_index)
         # estimate declination angles
-        self.delta_cooper = delta_cooper(self.day_of_year, self.daily_meas)
-        self.delta_spencer = delta_spencer(self.day_of_year, self.daily_meas)
+        if 'delta_cooper' in intermediates:
+            self.delta_cooper = intermediates['delta_cooper']
+        else:
+            self.delta_cooper = delta_cooper(self.day_of_year, self.daily_meas)
+        if 'delta_spencer' in intermediates:
+            self.delta_spencer = intermediates['delta_spencer']
+        else:
+            self.delta_spencer = delta_spencer(self.day_of_year, self.daily_meas)
+        self.delta_cooper = downsample_matrix(self.delta_cooper, factor)
+        self.delta_spencer = downsample_matrix(self.delta_spencer, factor)
         # initialize parameters
         if self.init_values is not None:
             lat_initial = self.init_values[0]
@@ -152,83 +250,154 @@ class TiltAzimuthStudy():
             else:
                 lat_initial, tilt_initial, azim_initial = random_initial_values(self.nrandom)
 
-        counter = 0
-        self.create_results_table()
+        # quantiles of the data used in the daytime threshold fit, calculated once for all (x1, x2) pairs
+        if self.daytime_threshold is not None:
+            threshold_quantiles = {}
+        elif 'threshold_quantiles' in intermediates:
+            threshold_quantiles = intermediates['threshold_quantiles']
+        else:
+            threshold_quantiles = calculate_threshold_quantiles(self.data_matrix, self.threshold_x2)
+        # daytime thresholds fitted in advance for each (x1, x2) pair
+        daytime_thresholds = intermediates.get('daytime_thresholds', {})
+
+        # one task per (x1, x2) cell, since the daytime threshold filter is shared by all configurations of a cell. Every
+        # other cell is optional and dropped first when the time budget runs low
+        cells = []
         for x1 in self.threshold_x1:
-            # first quantile value in signal decomposition algorithm
             for x2 in self.threshold_x2:
-                # second quantile value in signal decomposition algorithm
-                filtered_data = filter_data(self.data_matrix, self.daytime_threshold, x1, x2)
-                for delta_id in delta_method:
-                    # declination angle
-                    if delta_id in ('Cooper', 'cooper'):
-                        delta = self.delta_cooper
-                    if delta_id in ('Spencer', 'spencer'):
-                        delta = self.delta_spencer
-                    for day_range_id in self.day_range_dict:
-                        # day range
-                        day_interval = self.day_range_dict[day_range_id]
-                        boolean_filter = self.get_day_range(filtered_data, day_interval)
-                        delta_f = delta[boolean_filter]
-                        omega_f = self.omega[boolean_filter]
-                        if ~np.any(boolean_filter):
-                            print('No data made it through filters')
-                        # choose function and unknowns based on provided inputs
-                        # choose range for each unknown
-                        func_customized, bounds = select_function(self.lat_input, self.tilt_input,
-                                                                  self.azimuth_input)
-                        # create dictionary keys for unknowns. If an input value for lat, tilt or azimuth is not
-                        # provided, it will be tagged as an unknown
-                        dict_keys = determine_keys(latitude=self.lat_input, tilt=self.tilt_input,
-                                                   azimuth=self.azimuth_input)
-                        nvalues = len(lat_initial)
+                optional = len(cells) % 2 == 1
+                cells.append((x1, x2, delta_method, lat_initial, tilt_initial, azim_initial, threshold_quantiles,
+                              daytime_thresholds, optional, time_budget))
+        return cells
 
-                        for init_val_ix in np.arange(nvalues):
-                            # loop over initial values
-                            init_values_dict = {'latitude': lat_initial[init_val_ix], 'tilt': tilt_initial[init_val_ix],
-                                                'azimuth': azim_initial[init_val_ix]}
-                            init_values, ivr = select_init_values(init_values_dict, dict_keys)
-                            try:
-                                # estimate latitude and/or tilt and/or azimuth. If parameter is in keys, it will be
-                                # estimated
-                                estimates = run_curve_fit(func=func_customized, keys=dict_keys, delta=delta_f,
-                                                          omega=omega_f, costheta=self.costheta_fit,
-                                                          boolean_filter=boolean_filter, init_values=init_values,
-                                                          fit_bounds=bounds)
-                            except RuntimeError:
-                                input_array = np.array([self.lat_input, self.tilt_input, self.azimuth_input])
-                                estimates = np.full(np.sum(input_array == None), np.nan)
-                            # create dictionary with dict_keys and estimates
-                            estimates_dict = dict(zip(dict_keys, estimates))
-                            # dynamic results dataFrame based on provided inputs
-                            lat = estimates_dict[
-                                'latitude_estimate'] if 'latitude_estimate' in estimates_dict else self.lat_input
-                            tilt = estimates_dict['tilt_estimate'] if 'tilt_estimate' in estimates_dict else \
-                                self.tilt_input
-                            azim = estimates_dict[
-                                'azimuth_estimate'] if 'azimuth_estimate' in estimates_dict else self.azimuth_input
+    def _cell_size(self, cell):
+        # number of configurations in a cell: declination methods x day ranges x initial values
+        return len(cell[2]) * len(self.day_range_dict) * len(cell[3])
 
-                            self.costheta_estimated = calculate_costheta(func=func_costheta, delta=delta,
-                                                                         omega=self.omega, lat=lat, tilt=tilt,
-                                                                         azim=azim)
-                            # calculate cos theta from analytical equation in case ground truth values are provided
-                            if None not in (self.lat_true_value, self.tilt_true_value, self.azimuth_true_value):
-                                self.costheta_ground_truth = calculate_costheta(func=func_costheta, delta=delta,
-                                                                                omega=self.omega,
-                                                                                lat=self.lat_true_value,
-                                                                                tilt=self.tilt_true_value,
-                                                                                azim=self.azimuth_true_value)
+    def evaluate_cell(self, x1, x2, delta_method, lat_initial, tilt_initial, azim_initial, threshold_quantiles,
+                      daytime_thresholds, optional=False, time_budget=None):
+        """
+        Runs the numerical fit for all configurations sharing the daytime threshold parameters `x1` and `x2`. Only reads
+        attributes set before the cells are evaluated, so cells can be evaluated concurrently.
+        :param x1: first quantile value in signal decomposition algorithm.
+        :param x2: second quantile value in signal decomposition algorithm.
+        :param optional: if True, the cell is skipped when `time_budget` is low.
+        :param time_budget: (optional) `TimeBudget` instance.
+        :return: list of results rows. If a time budget is given, each row ends with a flag that is True if the
+        configuration was skipped.
+        """
+        rows = []
+        dict_keys = determine_keys(latitude=self.lat_input, tilt=self.tilt_input, azimuth=self.azimuth_input)
+        if time_budget is not None and (time_budget.is_expired() or (optional and time_budget.is_low())):
+            for delta_id in delta_method:
+                for day_range_id in self.day_range_dict:
+                    for init_val_ix in np.arange(len(lat_initial)):
+                        init_values_dict = {'latitude': lat_initial[init_val_ix], 'tilt': tilt_initial[init_val_ix],
+                                            'azimuth': azim_initial[init_val_ix]}
+                        init_values, ivr = select_init_values(init_values_dict, dict_keys)
+                        rows.append([day_range_id, delta_id, x1, x2] + ivr + [np.nan] * len(dict_keys) + [True])
+            return rows
+        if self.daytime_threshold is None and (x1, x2) in daytime_thresholds:
+            filtered_data = self.data_matrix > daytime_thresholds[(x1, x2)]
+        else:
+            filtered_data = filter_data(self.data_matrix, self.daytime_threshold, x1, x2, threshold_quantiles.get(x2))
+        for delta_id in delta_method:
+            # declination angle
+            if delta_id in ('Cooper', 'cooper'):
+                delta = self.delta_cooper
+            if delta_id in ('Spencer', 'spencer'):
+                delta = self.delta_spencer
+            for day_range_id in self.day_range_dict:
+                # day range
+                day_interval = self.day_range_dict[day_range_id]
+                boolean_filter = self.get_day_range(filtered_data, day_interval)
+                delta_f = delta[boolean_filter]
+                omega_f = self.omega[boolean_filter]
+                if ~np.any(boolean_filter):
+                    print('No data made it through filters')
+                # choose function and unknowns based on provided inputs
+                # choose range for each unknown
+                func_customized, bounds = select_function(self.lat_input, self.tilt_input, self.azimuth_input)
+                nvalues = len(lat_initial)
 
-                            self.results.loc[counter] = [day_range_id, delta_id, x1, x2] + ivr + list(estimates)
-                            counter += 1
+                for init_val_ix in np.arange(nvalues):
+                    # loop over initial values
+                    init_values_dict = {'latitude': lat_initial[init_val_ix], 'tilt': tilt_initial[init_val_ix],
+                                        'azimuth': azim_initial[init_val_ix]}
+                    init_values, ivr = select_init_values(init_values_dict, dict_keys)
+                    # only the first initial value is fitted once the time budget is low
+                    skipped = time_budget is not None and init_val_ix > 0 and time_budget.is_low()
+                    if skipped:
+                        rows.append([day_range_id, delta_id, x1, x2] + ivr + [np.nan] * len(dict_keys) + [True])
+                        continue
+                    try:
+                        # estimate latitude and/or tilt and/or azimuth. If parameter is in keys, it will be estimated
+                        estimates = run_curve_fit(func=func_customized, keys=dict_keys, delta=delta_f, omega=omega_f,
+                                                  costheta=self.costheta_fit, boolean_filter=boolean_filter,
+                                                  init_values=init_values, fit_bounds=bounds)
+                    except RuntimeError:
+                        input_array = np.array([self.lat_input, self.tilt_input, self.azimuth_input])
+                        estimates = np.full(np.sum(input_array == None), np.nan)
+                    row = [day_range_id, delta_id, x1, x2] + ivr + list(estimates)
+                    rows.append(row + [False] if time_budget is not None else row)
+        return rows
 
-        if self.lat_true_value is not None and self.lat_input is None:
-            self.results['latitude residual'] = self.lat_true_value - self.results['latitude']
-        if self.tilt_true_value is not None and self.tilt_input is None:
-            self.results['tilt residual'] = self.tilt_true_value - self.results['tilt']
-        if self.azimuth_true_value is not None and self.azimuth_input is None:
-            self.results['azimuth residual'] = self.azimuth_true_value - self.results['azimuth']
-        return
+    def estimate_costheta(self, index):
+        """
+        Calculates the cos(theta) matrix of a single configuration of the study. Diagnostics are only calculated on
+        request, since each one is a full (daily measurements, days) matrix.
+        :param index: index label of the configuration in the `results` attribute.
+        :return: estimated angle of incidence array.
+        """
+        row = self.results.loc[index]
+        lat = row['latitude'] if self.lat_input is None else self.lat_input
+        tilt = row['tilt'] if self.tilt_input is None else self.tilt_input
+        azim = row['azimuth'] if self.azimuth_input is None else self.azimuth_input
+        return calculate_costheta(func=func_costheta, delta=self._delta(row['declination method']), omega=self.omega,
+                                  lat=lat, tilt=tilt, azim=azim)
+
+    def ground_truth_costheta(self, delta_method='cooper'):
+        """
+        Calculates cos(theta) from the ground truth values once per declination method.
+        :param delta_method: 'cooper', 'spencer'.
+        :return: ground truth angle of incidence array, or None if any of the latitude, tilt and azimuth ground truth
+        values was not provided.
+        """
+        if None in (self.lat_true_value, self.tilt_true_value, self.azimuth_true_value):
+            return None
+        if delta_method not in self._costheta_ground_truth:
+            self._costheta_ground_truth[delta_method] = calculate_costheta(
+                func=func_costheta, delta=self._delta(delta_method), omega=self.omega, lat=self.lat_true_value,
+                tilt=self.tilt_true_value, azim=self.azimuth_true_value)
+        return self._costheta_ground_truth[delta_method]
+
+    @property
+    def costheta_estimated(self):
+        """
+        Estimated cos(theta) of the last configuration of the study, calculated on access.
+        """
+        if self.results is None or len(self.results) == 0:
+            return None
+        return self.estimate_costheta(self.results.index[-1])
+
+    @property
+    def costheta_ground_truth(self):
+        """
+        Ground truth cos(theta) with the declination method of the last configuration of the study.
+        """
+        if self.results is None or len(self.results) == 0:
+            return None
+        return self.ground_truth_costheta(self.results['declination method'].iloc[-1])
+
+    def _delta(self, delta_id):
+        if delta_id in ('Cooper', 'cooper'):
+            if self.delta_cooper is None:
+                self.delta_cooper = delta_cooper(self.day_of_year, self.daily_meas)
+            return self.delta_cooper
+        if delta_id in ('Spencer', 'spencer'):
+            if self.delta_spencer is None:
+                self.delta_spencer = delta_spencer(self.day_of_year, self.daily_meas)
+            return self.delta_spencer
 
     def get_day_range(self, input_data, interval):
         """
@@ -243,10 +412,25 @@ class TiltAzimuthStudy():
             day_range = (self.day_of_year > interval[0]) & (self.day_of_year < interval[1])
         else:
             day_range = np.ones(self.day_of_year.shape, dtype=bool)
-        output = input_data * self.clear_index * day_range
+        output = input_data * self.fit_index * day_range
         return output
 
-    def create_results_table(self):
+    def create_results_table(self, size, time_budget=None):
+        """
+        :param size: number of configurations in the study.
+        :param time_budget: (optional) `TimeBudget` instance.
+        :return: `ResultsBuffer` with the results columns corresponding to the unknowns of the study.
+        """
+        cols = self.result_columns(time_budget)
+        return ResultsBuffer(cols, size, numeric_columns=[col for col in cols[2:] if col != 'skipped'],
+                             boolean_columns=['skipped'])
+
+    def result_columns(self, time_budget=None):
+        """
+        :param time_budget: (optional) `TimeBudget` instance.
+        :return: list with the results columns corresponding to the unknowns of the study, including 'skipped' if a
+        time budget is given.
+        """
         cols = ['day range', 'declination method', 'cvx parameter', 'threshold quantile', 'latitude initial value',
                 'tilt initial value', 'azimuth initial value']
         if self.lat_input is None:
@@ -255,4 +439,6 @@ class TiltAzimuthStudy():
             cols.append('tilt')
         if self.azimuth_input is None:
             cols.append('azimuth')
-        self.results = pd.DataFrame(columns=cols)
+        if time_budget is not None:
+            cols.append('skipped')
+        return cols
@@ -0,0 +1,211 @@
+""" Daily Features Module
+This module contains a function for extracting the per-day features used by the longitude and latitude estimation
+from a power matrix, walking the matrix in chunks of days. The scale quantiles are also computed chunk by chunk, so only
+one chunk of temporary arrays is allocated at a time, and the result is a compact table with one row per day, so that
+estimators working from the table need memory proportional to the number of days rather than the number of samples.
+The extraction itself still reads the full power matrix of the `DataHandler`, so peak memory is only bounded once the
+features are extracted and the matrix is released.
+"""
+import numpy as np
+import pandas as pd
+from solardatatools.solar_noon import energy_com
+from solardatatools.sunrise_sunset import rise_set_rough
+from solardatatools.algorithms import SunriseSunset
+from pvsystemprofiler.utilities.declination_equation import delta_cooper, delta_spencer
+
+FEATURE_COLUMNS = ['day_of_year', 'solar_noon_energy_com', 'solar_noon_rise_set_average', 'sunrise', 'sunset',
+                   'hours_daylight', 'hours_daylight_raw', 'daylight_threshold', 'daily_max', 'declination_cooper',
+                   'declination_spencer', 'no_errors', 'clear', 'cloudy']
+# features of the sunrise/sunset optimizer, see `extract_daily_features`
+OPTIMIZED_FEATURE_COLUMNS = ['sunrise_optimized_estimates', 'sunset_optimized_estimates',
+                             'sunrise_optimized_measurements', 'sunset_optimized_measurements', 'optimized_threshold']
+
+
+def extract_daily_features(data_handler, data_matrix='filled', chunk_days=30, daylight_threshold=0.001,
+                           solar_noon_threshold=0.01, optimized=False):
+    """
+    The daylight hours and the sunrise/sunset average solar noon are identical to `calculate_hours_daylight`,
+    `calculate_hours_daylight_raw` and `avg_sunrise_sunset`, which scale the whole matrix before thresholding. The
+    scales are computed once over the full matrix and then applied chunk by chunk. The full power matrix must be in
+    memory while the features are extracted, only the temporary arrays are bounded by `chunk_days`.
+    :param data_handler: `DataHandler` class instance on which the pipeline has been run.
+    :param data_matrix: 'raw' or 'filled'.
+    :param chunk_days: number of days processed at a time.
+    :param daylight_threshold: threshold on the scaled power used to detect sunrise and sunset for the daylight hours.
+    :param solar_noon_threshold: threshold on the scaled power used to detect sunrise and sunset for the sunrise/sunset
+    average solar noon.
+    :param optimized: if True, the sunrise/sunset optimizer is run on the full matrix and its outputs are added as the
+    `OPTIMIZED_FEATURE_COLUMNS`. The optimizer cannot run chunk by chunk.
+    :return: data frame indexed by day with the columns in `FEATURE_COLUMNS`. Solar noon, sunrise and sunset are in
+    hours, declination in Degrees.
+    """
+    if data_matrix == 'raw':
+        matrix = data_handler.raw_data_matrix
+    else:
+        matrix = data_handler.filled_data_matrix
+    num_days = matrix.shape[1]
+    high_val = chunked_quantile(matrix, 0.99, chunk_days)
+    chunk_minima = [np.nanmin(matrix[:, start:start + chunk_days]) for start in range(0, num_days, chunk_days)]
+    low_val = max(np.nanmin(chunk_minima), -0.005 * high_val)
+    # scale of `find_daytime`, used for the raw daylight hours
+    bottom_scale = max(chunked_quantile(matrix, 0.05, chunk_days, nan_to_zero=True), 0)
+    top_scale = chunked_quantile(matrix, 0.95, chunk_days, nan_to_zero=True)
+    features = {column: np.full(num_days, np.nan) for column in ['solar_noon_energy_com',
+                                                                 'solar_noon_rise_set_average', 'sunrise', 'sunset',
+                                                                 'hours_daylight_raw', 'daily_max']}
+    for start in range(0, num_days, chunk_days):
+        chunk = slice(start, min(start + chunk_days, num_days))
+        data = matrix[:, chunk]
+        scaled = (data - low_val) / high_val
+        features['solar_noon_energy_com'][chunk] = energy_com(data)
+        rise_set = rise_set_rough(_above(scaled, solar_noon_threshold))
+        features['solar_noon_rise_set_average'][chunk] = np.average(np.c_[rise_set['sunrises'],
+                                                                          rise_set['sunsets']], axis=1)
+        rise_set = rise_set_rough(_above(scaled, daylight_threshold))
+        features['sunrise'][chunk] = rise_set['sunrises']
+        features['sunset'][chunk] = rise_set['sunsets']
+        daytime = (np.nan_to_num(data, nan=0.0) - bottom_scale) / (top_scale - bottom_scale) >= daylight_threshold
+        features['hours_daylight_raw'][chunk] = np.sum(daytime, axis=0) * data_handler.data_sampling / 60
+        features['daily_max'][chunk] = np.max(np.where(np.isnan(data), -np.inf, data), axis=0)
+    features['daily_max'][~np.isfinite(features['daily_max'])] = np.nan
+    features['hours_daylight'] = features['sunset'] - features['sunrise']
+    features['daylight_threshold'] = np.full(num_days, daylight_threshold)
+    day_of_year = np.asarray(data_handler.day_index.dayofyear)
+    features['day_of_year'] = day_of_year
+    features['declination_cooper'] = delta_cooper(day_of_year, 1)[0]
+    features['declination_spencer'] = delta_spencer(day_of_year, 1)[0]
+    flags = data_handler.daily_flags
+    features['no_errors'] = np.asarray(flags.no_errors, dtype=bool)
+    features['clear'] = np.asarray(flags.clear, dtype=bool)
+    features['cloudy'] = np.asarray(flags.cloudy, dtype=bool)
+    columns = list(FEATURE_COLUMNS)
+    if optimized:
+        ss = SunriseSunset()
+        ss.run_optimizer(data=matrix)
+        features['sunrise_optimized_estimates'] = ss.sunrise_estimates
+        features['sunset_optimized_estimates'] = ss.sunset_estimates
+        features['sunrise_optimized_measurements'] = ss.sunrise_measurements
+        features['sunset_optimized_measurements'] = ss.sunset_measurements
+        features['optimized_threshold'] = np.full(num_days, ss.threshold)
+        columns += OPTIMIZED_FEATURE_COLUMNS
+    return pd.DataFrame(features, index=data_handler.day_index, columns=columns)
+
+
+def chunked_quantile(matrix, q, chunk_days=30, nan_to_zero=False, max_collect=65536):
+    """
+    Calculates a quantile of a matrix, equal to `np.nanquantile` with linear interpolation, walking the matrix in chunks
+    of days. The order statistics are located with histograms accumulated over the chunks, and only the values of the
+    histogram bin that holds them are collected and sorted, so that no full matrix copy is made.
+    :param matrix: (daily measurements, days) array.
+    :param q: quantile, between 0 and 1.
+    :param chunk_days: number of days processed at a time.
+    :param nan_to_zero: if True, NaN values are counted as zeros, as in `np.quantile(np.nan_to_num(matrix))`.
+    Otherwise they are ignored.
+    :param max_collect: largest number of values collected and sorted at once.
+    :return: quantile value, NaN if the matrix has no values.
+    """
+    def chunks():
+        for start in range(0, matrix.shape[1], chunk_days):
+            data = matrix[:, start:start + chunk_days]
+            if nan_to_zero:
+                yield np.nan_to_num(data, nan=0.0).ravel()
+            else:
+                yield data[~np.isnan(data)]
+
+    n = sum(len(values) for values in chunks())
+    if n == 0:
+        return np.nan
+    position = q * (n - 1)
+    k = int(np.floor(position))
+    a = _order_statistic(chunks, k, max_collect)
+    if k + 1 >= n:
+        return a
+    b = _order_statistic(chunks, k + 1, max_collect)
+    # same interpolation as numpy
+    t = position - k
+    if a == b:
+        return a
+    if t >= 0.5:
+        return b - (b - a) * (1 - t)
+    return a + (b - a) * t
+
+
+def _order_statistic(chunks, k, max_collect, n_bins=1024):
+    # k-th smallest value, 0-based, of the values yielded by `chunks`
+    lo = min(np.min(values) for values in chunks() if len(values) > 0)
+    hi = max(np.max(values) for values in chunks() if len(values) > 0)
+    below = 0
+    while lo < hi:
+        edges = np.linspace(lo, hi, n_bins + 1)
+        counts = sum(np.histogram(values[(values >= lo) & (values <= hi)], bins=edges)[0] for values in chunks())
+        cumulative = np.cumsum(counts)
+        b = np.searchsorted(cumulative, k - below, side='right')
+        below += cumulative[b - 1] if b > 0 else 0
+
+        def in_bin(values):
+            # bins are half open, except the last one
+            upper = values <= edges[b + 1] if b == n_bins - 1 else values < edges[b + 1]
+            return (values >= edges[b]) & upper
+        if counts[b] <= max_collect:
+            collected = np.sort(np.concatenate([values[in_bin(values)] for values in chunks()]))
+            return collected[k - below]
+        selected = [values[in_bin(values)] for values in chunks()]
+        lo = min(np.min(values) for values in selected if len(values) > 0)
+        hi = max(np.max(values) for values in selected if len(values) > 0)
+    return lo
+
+
+def build_feature_table(data_handler, data_matrix=('raw', 'filled'), chunk_days=30, optimized=True):
+    """
+    Extracts the daily features of several data matrices of a system into one long table, as used by the feature
+    store and by `LongitudeStudy` and `LatitudeStudy` when created with `features`.
+    :param data_handler: `DataHandler` class instance on which the pipeline has been run.
+    :param data_matrix: 'raw', 'filled' or both.
+    :param chunk_days: number of days processed at a time.
+    :param optimized: if True, the outputs of the sunrise/sunset optimizer are included.
+    :return: data frame with a 'date' column, a 'data_matrix' column and the feature columns, one row per day and data
+    matrix.
+    """
+    frames = []
+    for dm in np.atleast_1d(data_matrix):
+        features = extract_daily_features(data_handler, dm, chunk_days, optimized=optimized)
+        features.insert(0, 'data_matrix', dm)
+        frames.append(features.rename_axis('date').reset_index())
+    return pd.concat(frames, ignore_index=True)
+
+
+def matrix_features(features, data_matrix):
+    """
+    :param features: feature table as returned by `build_feature_table`.
+    :param data_matrix: 'raw' or 'filled'.
+    :return: rows of `features` for `data_matrix`, sorted by date.
+    """
+    selected = features[features['data_matrix'] == data_matrix]
+    if len(selected) == 0:
+        raise ValueError('no features stored for the {} data matrix'.format(data_matrix))
+    return selected.sort_values('date')
+
+
+def _above(scaled, threshold):
+    bool_msk = np.zeros(scaled.shape, dtype=bool)
+    slct = ~np.isnan(scaled)
+    bool_msk[slct] = scaled[slct] > threshold
+    return bool_msk
+
+
+def optimized_sunrise_sunset_features(features):
+    """
+    :param features: feature table as returned by `build_feature_table`.
+    :return: dictionary with the same keys as `get_optimized_sunrise_sunset`, filled from the stored outputs of the
+    sunrise/sunset optimizer. Values are None for data matrices without stored optimizer outputs.
+    """
+    optimized_dict = {}
+    for dm, suffix in (('raw', 'raw'), ('filled', 'f')):
+        selected = features[features['data_matrix'] == dm].sort_values('date')
+        stored = len(selected) > 0 and 'sunrise_optimized_estimates' in selected.columns
+        optimized_dict['est_sr_' + suffix] = selected['sunrise_optimized_estimates'].values if stored else None
+        optimized_dict['est_ss_' + suffix] = selected['sunset_optimized_estimates'].values if stored else None
+        optimized_dict['meas_sr_' + suffix] = selected['sunrise_optimized_measurements'].values if stored else None
+        optimized_dict['meas_ss_' + suffix] = selected['sunset_optimized_measurements'].values if stored else None
+        optimized_dict['thres_' + suffix] = selected['optimized_threshold'].iloc[0] if stored else None
+    return optimized_dict
@@ -0,0 +1,59 @@
+""" Data Reduction Module
+This module contains functions used by the fast mode of `ConfigurationEstimator` and `TiltAzimuthStudy` to reduce the
+amount of data entering the orientation fit. The power matrix is aggregated to a coarser time grid, and every other
+matrix used in the fit (hour angle, declination) is aggregated in exactly the same way, so that each coarse sample keeps
+consistent values. A subset of clear days, spread evenly across the seasons, is then selected for the fit.
+"""
+import numpy as np
+
+
+def downsample_factor(data_sampling, daily_meas, target_sampling=15):
+    """
+    :param data_sampling: data sampling in minutes.
+    :param daily_meas: number of measurements per day, i.e. rows of the data matrix.
+    :param target_sampling: coarsest sampling allowed after aggregation, in minutes.
+    :return: largest number of consecutive samples that can be aggregated without exceeding `target_sampling` and
+    that divides `daily_meas`. 1 if the data is already at or above `target_sampling`.
+    """
+    factor = max(int(target_sampling // data_sampling), 1)
+    while daily_meas % factor != 0:
+        factor -= 1
+    return factor
+
+
+def downsample_matrix(matrix, factor):
+    """
+    Averages blocks of `factor` consecutive rows (samples of the same day).
+    :param matrix: array with one row per sample of the day and one column per day.
+    :param factor: number of consecutive samples to aggregate, as returned by `downsample_factor`.
+    :return: array with `matrix.shape[0] // factor` rows.
+    """
+    if factor <= 1:
+        return matrix
+    matrix = np.asarray(matrix)
+    n_rows, n_days = matrix.shape
+    return matrix.reshape(n_rows // factor, factor, n_days).mean(axis=1)
+
+
+def stratified_days(day_of_year, days, n_days, n_strata=12):
+    """
+    Selects about `n_days` of the days flagged in `days`, with the same number of days from each part of the year, so
+    that the selection covers the seasonal variation of the sun position. Days are evenly spaced within each part.
+    :param day_of_year: day of year of each day.
+    :param days: boolean array with the candidate days, e.g. clear days.
+    :param n_days: number of days to select. If None or larger than the number of candidates, all candidates are kept.
+    :param n_strata: number of equal parts of the year.
+    :return: boolean array with the selected days.
+    """
+    days = np.asarray(days, dtype=bool)
+    candidates = np.flatnonzero(days)
+    if n_days is None or len(candidates) <= n_days:
+        return days.copy()
+    strata = (np.asarray(day_of_year)[candidates] - 1) * n_strata // 366
+    groups = [candidates[strata == stratum] for stratum in np.unique(strata)]
+    quota = int(np.ceil(n_days / len(groups)))
+    selected = np.zeros(len(days), dtype=bool)
+    for group in groups:
+        picks = np.unique(np.linspace(0, len(group) - 1, min(quota, len(group))).round().astype(int))
+        selected[group[picks]] = True
+    return selected
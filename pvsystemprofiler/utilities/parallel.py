@@ -0,0 +1,134 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+
+
+def evaluate_configurations(func, configurations, max_workers=None, max_pending=None):
+    """
+    Evaluates `func` for every configuration of a study grid, either sequentially or on a thread pool. `func` must not
+    modify shared state, since several configurations may be evaluated at the same time.
+    :param func: function called as `func(*configuration)`.
+    :param configurations: iterable of tuples with the arguments of `func` for each configuration.
+    :param max_workers: (optional) number of threads. If None or 1, configurations are evaluated sequentially.
+    :param max_pending: (optional) maximum number of configurations submitted and not yet yielded. Defaults to twice
+    `max_workers`, so that only a bounded number of results is held in memory.
+    :return: generator of (configuration index, result) tuples, yielded as soon as each configuration is evaluated.
+    """
+    if max_workers is None or max_workers <= 1:
+        for ix, configuration in enumerate(configurations):
+            yield ix, func(*configuration)
+        return
+    if max_pending is None:
+        max_pending = 2 * max_workers
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    pending = {}
+    try:
+        for ix, configuration in enumerate(configurations):
+            pending[executor.submit(func, *configuration)] = ix
+            while len(pending) >= max_pending:
+                for item in _collect_finished(pending):
+                    yield item
+        while pending:
+            for item in _collect_finished(pending):
+                yield item
+    finally:
+        # if the caller stops early, configurations that have not started yet are not evaluated
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+
+def _collect_finished(pending):
+    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+    for future in finished:
+        yield pending.pop(future), future.result()
+
+
+def run_in_process_pool(func, tasks, workers, initializer=None, initargs=(), max_pending=None, max_attempts=2):
+    """
+    Runs `func` for every task on a pool of worker processes and yields the results in submission order. Only a bounded
+    number of tasks is submitted and not yet yielded at any time. If a worker process dies, e.g. killed for running out
+    of memory, the pool is restarted and the tasks that were lost are run again one at a time, so that the task that
+    kills its worker is identified and the other tasks are not affected. A task that was lost in `max_attempts` pool
+    failures is given up.
+    :param func: picklable function called as `func(*task)` in a worker process.
+    :param tasks: iterable of argument tuples. The iterable is consumed lazily.
+    :param workers: number of worker processes.
+    :param initializer: (optional) function called at the start of each worker process.
+    :param initargs: arguments of `initializer`.
+    :param max_pending: maximum number of tasks submitted and not yet yielded. Defaults to twice `workers`.
+    :param max_attempts: number of pool failures a task can be lost in before it is given up.
+    :return: generator of (task, result, error) tuples. `error` is None if `func` returned, otherwise a string
+    describing the exception, in which case `result` is None.
+    """
+    if max_pending is None:
+        max_pending = 2 * workers
+    tasks = iter(tasks)
+    pending = deque()
+    pool = {'executor': ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs)}
+
+    def restart():
+        # every unfinished task of the broken pool is lost and is queued to run again on its own
+        _shutdown(pool['executor'], [entry['future'] for entry in pending])
+        pool['executor'] = ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs)
+        for entry in pending:
+            if 'error' in entry or entry['future'] is None or not _lost(entry['future']):
+                continue
+            if entry['attempts'] >= max_attempts:
+                entry['error'] = 'BrokenProcessPool: worker process died {} times'.format(entry['attempts'])
+            else:
+                entry['attempts'] += 1
+                entry['future'] = None
+
+    try:
+        exhausted = False
+        while True:
+            # no new tasks are submitted while lost tasks wait to be run again on their own
+            while not exhausted and len(pending) < max_pending and \
+                    all(entry['future'] is not None for entry in pending):
+                task = next(tasks, None)
+                if task is None:
+                    exhausted = True
+                    continue
+                entry = {'task': task, 'future': None, 'attempts': 1}
+                pending.append(entry)
+                try:
+                    entry['future'] = pool['executor'].submit(func, *task)
+                except BrokenProcessPool:
+                    restart()
+            if len(pending) == 0:
+                break
+            entry = pending[0]
+            if 'error' in entry:
+                pending.popleft()
+                yield entry['task'], None, entry['error']
+                continue
+            try:
+                if entry['future'] is None:
+                    entry['future'] = pool['executor'].submit(func, *entry['task'])
+                result = entry['future'].result()
+            except BrokenProcessPool:
+                restart()
+                continue
+            except Exception as e:
+                pending.popleft()
+                yield entry['task'], None, '{}: {}'.format(type(e).__name__, e)
+                continue
+            pending.popleft()
+            yield entry['task'], result, None
+    finally:
+        _shutdown(pool['executor'], [entry['future'] for entry in pending])
+
+
+def _shutdown(executor, futures):
+    # `shutdown(cancel_futures=True)` requires Python 3.9
+    for future in futures:
+        if future is not None:
+            future.cancel()
+    executor.shutdown(wait=True)
+
+
+def _lost(future):
+    if not future.done() or future.cancelled():
+        return True
+    return isinstance(future.exception(), BrokenProcessPool)
@@ -0,0 +1,92 @@
+""" Prefetch Module
+This module contains a class for loading the inputs of upcoming tasks on background threads while the current task is
+processed, so that downloading and parsing input files overlaps with the estimation. At most `depth` inputs are loaded
+ahead of the consumer, which bounds the memory held by the prefetched inputs. The queue depth seen by the consumer and
+the time it spent waiting for an input are recorded, to tell whether a run is bound by input loading or by the
+estimation.
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
+
+
+class Prefetcher():
+    def __init__(self, load, tasks, depth=1, workers=None):
+        """
+        :param load: function called as `load(*task)` on a background thread. It must not modify shared state.
+        :param tasks: iterable of argument tuples of `load`. The iterable is consumed lazily.
+        :param depth: maximum number of inputs loaded ahead of the consumer. If 0, inputs are loaded in the consumer's
+        thread when requested.
+        :param workers: (optional) number of loading threads. Defaults to `depth`.
+        """
+        self.load = load
+        self.tasks = tasks
+        self.depth = depth
+        self.workers = depth if workers is None else workers
+        # number of inputs already loaded each time the consumer requested one
+        self.ready_counts = []
+        self.stall_time = 0.
+        self.stalls = 0
+
+    def __iter__(self):
+        """
+        :return: generator of (task, input, error) tuples, in task order. `error` is None if `load` returned,
+        otherwise a string describing the exception, in which case `input` is None.
+        """
+        if self.depth <= 0:
+            for task in self.tasks:
+                t0 = monotonic()
+                result, error = _call(self.load, task)
+                self._record(0, monotonic() - t0)
+                yield task, result, error
+            return
+        tasks = iter(self.tasks)
+        pending = deque()
+        executor = ThreadPoolExecutor(max_workers=max(self.workers, 1))
+        try:
+            exhausted = False
+            while True:
+                while not exhausted and len(pending) <= self.depth:
+                    task = next(tasks, None)
+                    if task is None:
+                        exhausted = True
+                    else:
+                        pending.append((task, executor.submit(_call, self.load, task)))
+                if len(pending) == 0:
+                    break
+                task, future = pending.popleft()
+                was_ready = future.done()
+                ready = int(was_ready) + sum(f.done() for _, f in pending)
+                t0 = monotonic()
+                result, error = future.result()
+                self._record(ready, 0. if was_ready else monotonic() - t0)
+                yield task, result, error
+        finally:
+            # if the consumer stops early, inputs that have not started loading are not loaded
+            for _, future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    def metrics(self):
+        """
+        :return: dictionary with the number of inputs requested, the mean number of inputs already loaded when one was
+        requested, the number of requests that had to wait for an input and the total waiting time in seconds.
+        """
+        n = len(self.ready_counts)
+        return {'requests': n,
+                'mean_queue_depth': sum(self.ready_counts) / n if n > 0 else 0.,
+                'stalls': self.stalls,
+                'stall_time': self.stall_time}
+
+    def _record(self, ready, waited):
+        self.ready_counts.append(ready)
+        if waited > 0:
+            self.stalls += 1
+            self.stall_time += waited
+
+
+def _call(load, task):
+    try:
+        return load(*task), None
+    except Exception as e:
+        return None, '{}: {}'.format(type(e).__name__, e)
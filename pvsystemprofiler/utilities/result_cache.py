@@ -0,0 +1,125 @@
+""" Result Cache Module
+This module contains a bounded in-process cache for the results of fits that only depend on their input arrays, such as
+`find_fit_costheta` and the daytime threshold fit used by `filter_data`. Results are keyed by a content hash of the
+input arrays, so estimator and study instances created for the same `DataHandler` solve each problem only once. An
+optional on-disk tier keeps results across processes and runs.
+"""
+import os
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+def array_hash(*arrays):
+    """
+    Calculates a fast content hash of one or more arrays.
+    :param arrays: numpy arrays (or array-like) to be hashed. `None` values are allowed.
+    :return: String. Hexadecimal digest of the content, shape and dtype of `arrays`.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for array in arrays:
+        if array is None:
+            h.update(b'none')
+            continue
+        array = np.ascontiguousarray(array)
+        h.update(str(array.dtype).encode('utf-8'))
+        h.update(str(array.shape).encode('utf-8'))
+        h.update(array.reshape(-1).view(np.uint8))
+    return h.hexdigest()
+
+
+class ResultCache():
+    def __init__(self, maxsize=16, cache_dir=None):
+        """
+        :param maxsize: maximum number of results kept in memory. Least recently used results are discarded first.
+        :param cache_dir: (optional) folder used as on-disk tier. If None, results are only kept in memory.
+        """
+        self.maxsize = maxsize
+        self.cache_dir = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if cache_dir is not None:
+            self.set_cache_dir(cache_dir)
+
+    def set_cache_dir(self, cache_dir):
+        """
+        Enables the on-disk tier of the cache. `None` disables it.
+        :param cache_dir: folder where results are stored.
+        """
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+
+    def get(self, key):
+        """
+        :param key: hashable key, usually built with `array_hash`.
+        :return: cached value, None if `key` is not in the cache.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        if self.cache_dir is not None:
+            file_name = self._file_name(key)
+            if os.path.isfile(file_name):
+                try:
+                    with open(file_name, 'rb') as f:
+                        value = pickle.load(f)
+                except (OSError, EOFError, pickle.UnpicklingError):
+                    value = None
+                if value is not None:
+                    with self._lock:
+                        self.disk_hits += 1
+                    self._store(key, value)
+                    return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, value):
+        """
+        :param key: hashable key, usually built with `array_hash`.
+        :param value: value to be cached. `None` values are not cached.
+        """
+        if value is None:
+            return
+        self._store(key, value)
+        if self.cache_dir is not None:
+            file_name = self._file_name(key)
+            tmp_file_name = file_name + '.tmp' + str(os.getpid())
+            with open(tmp_file_name, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file_name, file_name)
+
+    def clear(self):
+        """
+        Empties the in-memory tier and resets the counters. Files in the on-disk tier are kept.
+        """
+        with self._lock:
+            self._entries.clear()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def stats(self):
+        """
+        :return: dictionary with hit and miss counters and the number of results held in memory.
+        """
+        return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses, 'size': len(self._entries)}
+
+    def _store(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def _file_name(self, key):
+        digest = hashlib.blake2b(repr(key).encode('utf-8'), digest_size=16).hexdigest()
+        return os.path.join(self.cache_dir, digest + '.pkl')
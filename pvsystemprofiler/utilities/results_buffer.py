@@ -0,0 +1,69 @@
+""" Results Buffer Module
+This module contains a class for collecting study results row by row into preallocated, typed numpy column buffers. The
+results data frame is built once at the end, instead of being grown one `DataFrame.loc` insertion at a time.
+"""
+import numpy as np
+import pandas as pd
+
+
+class ResultsBuffer():
+    def __init__(self, columns, size, numeric_columns=(), boolean_columns=()):
+        """
+        :param columns: list with the column names, in order.
+        :param size: number of rows to allocate, usually the cardinality of the configuration grid. Buffers are grown if
+        more rows are set.
+        :param numeric_columns: columns stored as floats. All other columns hold configuration labels and become
+        categorical columns in the output data frame.
+        :param boolean_columns: columns stored as booleans, e.g. flags.
+        """
+        self.columns = list(columns)
+        self.size = size
+        self.numeric_columns = [col for col in self.columns if col in numeric_columns]
+        self.boolean_columns = [col for col in self.columns if col in boolean_columns]
+        self.buffers = {}
+        for col in self.columns:
+            if col in self.numeric_columns:
+                self.buffers[col] = np.full(size, np.nan)
+            elif col in self.boolean_columns:
+                self.buffers[col] = np.zeros(size, dtype=bool)
+            else:
+                self.buffers[col] = np.empty(size, dtype=object)
+        self.n_rows = 0
+
+    def set_row(self, index, values):
+        """
+        :param index: row index. Buffers are grown if `index` is larger than `size` - 1.
+        :param values: list with one value per column, in column order. None is stored as NaN in numeric columns.
+        """
+        if index >= self.size:
+            self._grow(max(index + 1, 2 * self.size))
+        for col, value in zip(self.columns, values):
+            if value is None and col in self.numeric_columns:
+                value = np.nan
+            self.buffers[col][index] = value
+        self.n_rows = max(self.n_rows, index + 1)
+
+    def to_frame(self):
+        """
+        :return: pandas DataFrame with the rows set so far and categorical configuration columns.
+        """
+        data = {}
+        for col in self.columns:
+            values = self.buffers[col][:self.n_rows]
+            if col in self.numeric_columns or col in self.boolean_columns:
+                data[col] = values
+            else:
+                data[col] = pd.Categorical(values)
+        return pd.DataFrame(data, columns=self.columns)
+
+    def _grow(self, size):
+        for col in self.columns:
+            if col in self.numeric_columns:
+                buffer = np.full(size, np.nan)
+            elif col in self.boolean_columns:
+                buffer = np.zeros(size, dtype=bool)
+            else:
+                buffer = np.empty(size, dtype=object)
+            buffer[:self.size] = self.buffers[col]
+            self.buffers[col] = buffer
+        self.size = size
@@ -0,0 +1,56 @@
+""" Time Budget Module
+This module contains a class for tracking the wall-clock time budget of the estimation of a single system. The same
+`TimeBudget` object can be shared by the `ConfigurationEstimator` and the studies, so that all estimation stages draw
+from one budget. Stages check `is_low` to switch to cheaper methods and `is_expired` to skip work altogether.
+"""
+from time import monotonic
+
+
+class TimeBudget():
+    def __init__(self, seconds=None, low_fraction=0.5):
+        """
+        The budget starts counting when the object is created.
+        :param seconds: (optional) total time budget in seconds. If None, the budget never runs low.
+        :param low_fraction: fraction of the budget remaining below which the budget is considered low.
+        """
+        self.seconds = seconds
+        self.low_fraction = low_fraction
+        self.start_time = monotonic()
+
+    def elapsed(self):
+        """
+        :return: seconds since the budget was created.
+        """
+        return monotonic() - self.start_time
+
+    def remaining(self):
+        """
+        :return: seconds left in the budget, or infinity if no budget was set.
+        """
+        if self.seconds is None:
+            return float('inf')
+        return self.seconds - self.elapsed()
+
+    def is_low(self):
+        """
+        :return: True if less than `low_fraction` of the budget is left.
+        """
+        if self.seconds is None:
+            return False
+        return self.remaining() < self.low_fraction * self.seconds
+
+    def is_expired(self):
+        """
+        :return: True if no time is left in the budget.
+        """
+        return self.remaining() <= 0
+
+
+def get_time_budget(time_budget):
+    """
+    :param time_budget: None, number of seconds or `TimeBudget` instance.
+    :return: `TimeBudget` instance, or None if `time_budget` is None.
+    """
+    if time_budget is None or isinstance(time_budget, TimeBudget):
+        return time_budget
+    return TimeBudget(time_budget)
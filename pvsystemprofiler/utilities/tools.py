@@ -1,6 +1,24 @@
 import numpy as np
 import pandas as pd
 
+try:
+    from functools import cached_property
+except ImportError:
+    # functools.cached_property is only available in Python >= 3.8
+    class cached_property():
+        def __init__(self, func):
+            self.func = func
+            self.__doc__ = func.__doc__
+
+        def __set_name__(self, owner, name):
+            self.name = name
+
+        def __get__(self, instance, owner=None):
+            if instance is None:
+                return self
+            value = instance.__dict__[self.name] = self.func(instance)
+            return value
+
 
 def random_initial_values(nrandom):
     lat_initial_value = np.random.uniform(low=-90, high=90, size=nrandom)
@@ -0,0 +1,40 @@
+""" Synthetic Data Module
+This module contains functions for building fake `DataHandler` objects from synthetic clear sky power signals, so that
+estimators and studies can be tested without loading a data set or running the pipeline.
+"""
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
+
+
+def seasonal_day_length(num_days, amplitude=3.):
+    """
+    :param num_days: number of days, starting on January 1st.
+    :param amplitude: difference in hours between the longest day and the mean day length of 12 hours.
+    :return: array with the day length in hours of each day.
+    """
+    return 12 + amplitude * np.sin(2 * np.pi * (np.arange(num_days) - 80) / 365)
+
+
+def make_data_handler(num_days, day_length=12., noon=12., start='2020-01-01', flags=None):
+    """
+    Builds a fake `DataHandler` whose power signal is a half sine wave between sunrise and sunset of each day, sampled
+    every 15 minutes.
+    :param num_days: number of days.
+    :param day_length: day length in hours, either a single value or an array with one value per day.
+    :param noon: solar noon in hours.
+    :param start: first day.
+    :param flags: (optional) boolean array with the days flagged as clear and without errors. All days if None.
+    :return: `SimpleNamespace` with the attributes of a `DataHandler` on which the pipeline has been run.
+    """
+    hours = np.arange(0, 24, 0.25)
+    day_length = np.ones(num_days) * day_length
+    sunrise = noon - day_length / 2
+    data_matrix = np.clip(np.sin(np.pi * (hours[:, np.newaxis] - sunrise) / day_length), 0, None)
+    data_matrix[hours[:, np.newaxis] > sunrise + day_length] = 0
+    if flags is None:
+        flags = np.ones(num_days, dtype=bool)
+    return SimpleNamespace(_ran_pipeline=True, raw_data_matrix=data_matrix, filled_data_matrix=data_matrix,
+                           data_sampling=15, num_days=num_days,
+                           day_index=pd.date_range(start, periods=num_days, freq='D'),
+                           daily_flags=SimpleNamespace(no_errors=flags, clear=flags, cloudy=~flags))
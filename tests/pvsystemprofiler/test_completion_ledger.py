@@ -0,0 +1,90 @@
+import unittest
+import os
+import tempfile
+from pathlib import Path
+import pandas as pd
+path = Path.cwd().parent.parent
+os.chdir(path)
+from pvsystemprofiler.scripts.modules.completion_ledger import CompletionLedger
+
+
+class TestCompletionLedger(unittest.TestCase):
+
+    def test_status(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            # INPUTS
+            ledger = CompletionLedger(os.path.join(output_dir, 'results.db'))
+
+            # Expected Output
+            expected_completed = ['A', 'C']
+            expected_incomplete = ['B', 'D']
+
+            # Output
+            self.assertTrue(ledger.is_empty())
+            for site in ['A', 'B', 'C', 'D']:
+                ledger.start(site, 'longitude')
+            ledger.complete('A', 'longitude', systems=['a1', 'a2'], output='part-000000-A.csv', run_time=1.5)
+            ledger.complete('C', 'longitude', systems=[3])
+            ledger.fail('B', 'longitude', 'ValueError: no data')
+            actual_completed = ledger.completed_sites('longitude')
+            actual_incomplete = ledger.incomplete_sites('longitude')
+            status = dict(ledger.connection.execute("SELECT site, status FROM ledger WHERE system = '*'"))
+            systems = [row[0] for row in ledger.connection.execute("SELECT system FROM ledger WHERE system != '*' "
+                                                                   'ORDER BY system')]
+
+            self.assertFalse(ledger.is_empty())
+            self.assertDictEqual({'A': 'done', 'B': 'failed', 'C': 'done', 'D': 'running'}, status)
+            self.assertListEqual(['3', 'a1', 'a2'], systems)
+            self.assertListEqual([], ledger.completed_sites('latitude'))
+            self.assertListEqual(expected_completed, actual_completed)
+            self.assertListEqual(expected_incomplete, actual_incomplete)
+            ledger.close()
+
+    def test_restart(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            # INPUTS
+            db_file = os.path.join(output_dir, 'results.db')
+            ledger = CompletionLedger(db_file)
+            ledger.start('A', 'longitude')
+            ledger.fail('A', 'longitude', 'BrokenProcessPool: worker process died 2 times')
+            ledger.start('B', 'longitude')
+            ledger.close()
+
+            # Expected Output
+            expected_output = (2, 'done', None)
+
+            # Output
+            # a resumed run reopens the ledger and redoes the site that failed
+            resumed = CompletionLedger(db_file)
+            incomplete = resumed.incomplete_sites('longitude')
+            resumed.start('A', 'longitude')
+            resumed.complete('A', 'longitude')
+            actual_output = resumed.connection.execute("SELECT attempts, status, error FROM ledger WHERE site = 'A'"
+                                                       ).fetchone()
+
+            self.assertListEqual(['A', 'B'], incomplete)
+            self.assertListEqual(['B'], resumed.incomplete_sites('longitude'))
+            self.assertTupleEqual(expected_output, actual_output)
+            resumed.close()
+
+    def test_record_completed(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            # INPUTS
+            ledger = CompletionLedger(os.path.join(output_dir, 'results.db'))
+            df = pd.DataFrame({'site': [10, 10, 11], 'system': ['s1', 's2', 's3']})
+
+            # Expected Output
+            expected_output = ['10', '11']
+
+            # Output
+            ledger.record_completed(df, 'latitude')
+            actual_output = ledger.completed_sites('latitude')
+            n_systems = ledger.connection.execute("SELECT COUNT(*) FROM ledger WHERE system != '*'").fetchone()[0]
+
+            self.assertEqual(3, n_systems)
+            self.assertListEqual(expected_output, actual_output)
+            ledger.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+import os
+from pathlib import Path
+import numpy as np
+path = Path.cwd().parent.parent
+os.chdir(path)
+from solardatatools.solar_noon import energy_com
+from pvsystemprofiler.algorithms.latitude.hours_daylight import calculate_hours_daylight
+from pvsystemprofiler.utilities.daily_features import extract_daily_features, chunked_quantile
+from tests.pvsystemprofiler.synthetic_data import make_data_handler
+
+
+class TestDailyFeatures(unittest.TestCase):
+
+    def test_extract_daily_features(self):
+        # INPUTS
+        data_handler = make_data_handler(50, np.linspace(9, 15, 50))
+        data_matrix = data_handler.filled_data_matrix
+
+        # Expected Output
+        expected_solar_noon = energy_com(data_matrix)
+        expected_hours_daylight = calculate_hours_daylight(data_matrix)
+
+        # Output
+        features = extract_daily_features(data_handler, chunk_days=7)
+
+        np.testing.assert_array_almost_equal(expected_solar_noon, features['solar_noon_energy_com'].values)
+        np.testing.assert_array_almost_equal(expected_hours_daylight, features['hours_daylight'].values)
+
+
+    def test_chunked_quantile(self):
+        # INPUTS
+        rng = np.random.default_rng(0)
+        data_matrix = rng.random((96, 100)) * 1000
+        # many repeated values at night and missing values
+        data_matrix[data_matrix < 400] = 0
+        data_matrix[rng.random(data_matrix.shape) < 0.1] = np.nan
+
+        # Expected Output
+        expected_output = [np.nanquantile(data_matrix, 0.99),
+                           np.quantile(np.nan_to_num(data_matrix, nan=0.0), 0.05),
+                           np.quantile(np.nan_to_num(data_matrix, nan=0.0), 0.95)]
+
+        # Output
+        # a small `max_collect` exercises the refinement of the histogram bins
+        actual_output = [chunked_quantile(data_matrix, 0.99, chunk_days=7, max_collect=50),
+                         chunked_quantile(data_matrix, 0.05, chunk_days=7, nan_to_zero=True, max_collect=50),
+                         chunked_quantile(data_matrix, 0.95, chunk_days=7, nan_to_zero=True, max_collect=50)]
+
+        np.testing.assert_array_equal(expected_output, actual_output)
+
+if __name__ == '__main__':
+    unittest.main()
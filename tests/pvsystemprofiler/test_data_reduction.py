@@ -0,0 +1,42 @@
+import unittest
+import os
+from pathlib import Path
+import numpy as np
+path = Path.cwd().parent.parent
+os.chdir(path)
+from pvsystemprofiler.utilities.data_reduction import downsample_factor, downsample_matrix, stratified_days
+
+
+class TestDataReduction(unittest.TestCase):
+
+    def test_downsample_matrix(self):
+        # INPUTS
+        matrix = np.arange(24 * 3).reshape(24, 3)
+        factor = downsample_factor(5, 24, 15)
+
+        # Expected Output
+        expected_output = matrix.reshape(8, 3, 3).mean(axis=1)
+
+        # Output
+        actual_output = downsample_matrix(matrix, factor)
+
+        self.assertEqual(3, factor)
+        np.testing.assert_array_almost_equal(expected_output, actual_output)
+
+    def test_stratified_days(self):
+        # INPUTS
+        day_of_year = np.arange(1, 366)
+        days = np.ones(365, dtype=bool)
+
+        # Expected Output
+        expected_output = np.full(12, 2)
+
+        # Output
+        selected = stratified_days(day_of_year, days, 24)
+        actual_output = np.bincount((day_of_year[selected] - 1) * 12 // 366)
+
+        np.testing.assert_array_equal(expected_output, actual_output)
+
+
+if __name__ == '__main__':
+    unittest.main()
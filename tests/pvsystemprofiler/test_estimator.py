@@ -0,0 +1,68 @@
+import unittest
+import os
+from pathlib import Path
+import numpy as np
+path = Path.cwd().parent.parent
+os.chdir(path)
+from solardatatools.solar_noon import energy_com
+from pvsystemprofiler.estimator import ConfigurationEstimator
+from pvsystemprofiler.algorithms.longitude.estimation import estimate_longitude
+from pvsystemprofiler.utilities.equation_of_time import eot_duffie
+from pvsystemprofiler.utilities.time_budget import TimeBudget
+from tests.pvsystemprofiler.synthetic_data import make_data_handler, seasonal_day_length
+
+
+class TestConfigurationEstimator(unittest.TestCase):
+
+    def test_estimate_all_twice(self):
+        # INPUTS
+        data_handler = make_data_handler(365, seasonal_day_length(365), noon=12.3)
+        # clear days differ from the days without errors used for longitude and latitude
+        data_handler.daily_flags.clear = np.arange(365) % 3 != 0
+        estimator = ConfigurationEstimator(data_handler, -8, solar_noon_method='energy_com',
+                                           daylight_method='sunrise-sunset')
+
+        # Expected Output
+        np.random.seed(0)
+        estimator.estimate_all()
+        expected_output = [estimator.longitude, estimator.latitude, estimator.tilt, estimator.azimuth]
+
+        # Output
+        np.random.seed(0)
+        estimator.estimate_all()
+        actual_output = [estimator.longitude, estimator.latitude, estimator.tilt, estimator.azimuth]
+        estimator.estimate_longitude()
+
+        np.testing.assert_array_equal(data_handler.daily_flags.no_errors, estimator.days)
+        self.assertEqual(expected_output[0], estimator.longitude)
+        np.testing.assert_array_almost_equal(expected_output, actual_output)
+
+    def test_degraded_methods(self):
+        # INPUTS
+        data_handler = make_data_handler(365, seasonal_day_length(365), noon=12.3)
+        budget = TimeBudget(10)
+        budget.start_time -= 6
+        estimator = ConfigurationEstimator(data_handler, -8, time_budget=budget)
+
+        # Expected Output
+        expected_output = estimate_longitude('calculated', eot_duffie(estimator.day_of_year),
+                                             energy_com(data_handler.filled_data_matrix), estimator.days, -8)
+
+        # Output
+        estimator.estimate_longitude()
+        estimator.estimate_latitude()
+        actual_output = estimator.longitude
+
+        # the cheaper methods are used for this call only, the configuration of the instance is unchanged
+        self.assertEqual('optimized_estimates', estimator.solar_noon_method)
+        self.assertEqual('optimized_estimates', estimator.daylight_method)
+        self.assertNotIn('solarnoon', estimator.__dict__)
+        self.assertNotIn('hours_daylight', estimator.__dict__)
+        self.assertListEqual(['longitude: energy_com solar noon', 'longitude: calculated estimator',
+                              'latitude: sunrise-sunset daylight hours'], estimator.degraded)
+        self.assertFalse(np.isnan(estimator.latitude))
+        self.assertAlmostEqual(expected_output, actual_output)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+import os
+from pathlib import Path
+import numpy as np
+path = Path.cwd().parent.parent
+os.chdir(path)
+from pvsystemprofiler.estimator import ConfigurationEstimator
+from pvsystemprofiler.feature_estimator import FeatureEstimator
+from pvsystemprofiler.utilities.daily_features import extract_daily_features
+from tests.pvsystemprofiler.synthetic_data import make_data_handler, seasonal_day_length
+
+
+class TestFeatureEstimator(unittest.TestCase):
+
+    def test_estimates(self):
+        # INPUTS
+        data_handler = make_data_handler(365, seasonal_day_length(365), noon=12.3,
+                                         flags=np.arange(365) % 5 != 0)
+        features = extract_daily_features(data_handler, chunk_days=30)
+
+        for estimator in ['calculated', 'fit_l2']:
+            # Expected Output
+            matrix_estimator = ConfigurationEstimator(data_handler, -8, solar_noon_method='energy_com',
+                                                      daylight_method='sunrise-sunset')
+            matrix_estimator.estimate_longitude(estimator=estimator)
+            matrix_estimator.estimate_latitude()
+            expected_output = [matrix_estimator.longitude, matrix_estimator.latitude]
+
+            # Output
+            feature_estimator = FeatureEstimator(features, -8)
+            feature_estimator.estimate_longitude(estimator=estimator)
+            feature_estimator.estimate_latitude()
+            actual_output = [feature_estimator.longitude, feature_estimator.latitude]
+
+            np.testing.assert_array_almost_equal(expected_output, actual_output)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import unittest
+import os
+import tempfile
+from pathlib import Path
+import numpy as np
+import pandas as pd
+path = Path.cwd().parent.parent
+os.chdir(path)
+from pvsystemprofiler.feature_store import FeatureStore
+from pvsystemprofiler.utilities.daily_features import build_feature_table
+from tests.pvsystemprofiler.synthetic_data import make_data_handler
+
+
+class TestFeatureStore(unittest.TestCase):
+
+    def test_write_read(self):
+        # INPUTS
+        data_handler = make_data_handler(20, flags=np.arange(20) % 2 == 0)
+        features = build_feature_table(data_handler, optimized=False)
+        store = FeatureStore(tempfile.mkdtemp(), file_format='csv')
+
+        # Expected Output
+        expected_output = features[['date', 'data_matrix', 'hours_daylight', 'clear']]
+
+        # Output
+        store.write('site_01', 'ac_power_01', features)
+        actual_output = store.read('site_01', 'ac_power_01', columns=['hours_daylight', 'clear'])
+
+        self.assertListEqual([('site_01', 'ac_power_01')], store.systems())
+        pd.testing.assert_frame_equal(expected_output, actual_output, check_dtype=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
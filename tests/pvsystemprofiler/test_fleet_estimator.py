@@ -0,0 +1,43 @@
+import unittest
+import os
+from pathlib import Path
+from functools import partial
+import numpy as np
+path = Path.cwd().parent.parent
+os.chdir(path)
+from pvsystemprofiler.fleet_estimator import estimate_fleet
+from tests.pvsystemprofiler.synthetic_data import make_data_handler
+
+
+def load_system(day_length_change, crash=False):
+    if crash:
+        # the worker process dies without raising an exception
+        os._exit(1)
+    return make_data_handler(100, np.linspace(12 - day_length_change, 12 + day_length_change, 100),
+                             start='2020-03-01')
+
+
+class TestFleetEstimator(unittest.TestCase):
+
+    def test_estimate_fleet_worker_crash(self):
+        # INPUTS
+        systems = [('system_{}'.format(ix), partial(load_system, 2, crash=ix == 2), -8) for ix in range(5)]
+        estimator_kwargs = {'solar_noon_method': 'energy_com'}
+
+        # Expected Output
+        expected_systems = ['system_{}'.format(ix) for ix in range(5)]
+
+        # Output
+        records = list(estimate_fleet(systems, estimation='longitude', max_workers=2,
+                                      estimator_kwargs=estimator_kwargs))
+        actual_systems = [record['system'] for record in records]
+
+        self.assertListEqual(expected_systems, actual_systems)
+        self.assertTrue(records[2]['error'].startswith('BrokenProcessPool'))
+        for ix in [0, 1, 3, 4]:
+            self.assertIsNone(records[ix]['error'])
+            self.assertFalse(np.isnan(records[ix]['longitude']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import unittest
+import os
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+import numpy as np
+import pandas as pd
+path = Path.cwd().parent.parent
+os.chdir(path)
+from pvsystemprofiler.scripts.modules import input_cache
+from pvsystemprofiler.scripts.modules.input_cache import InputCache
+
+try:
+    import pyarrow
+    has_parquet = True
+except ImportError:
+    try:
+        import fastparquet
+        has_parquet = True
+    except ImportError:
+        has_parquet = False
+
+
+def write_site(location, site_id, values, mtime):
+    df = pd.DataFrame({'ac_power_01': values, 'ac_power_02': values[::-1]},
+                      index=pd.date_range('2020-01-01', periods=len(values), freq='15min', name='ts'))
+    os.makedirs(location, exist_ok=True)
+    file_name = os.path.join(location, site_id + '.csv')
+    df.to_csv(file_name)
+    os.utime(file_name, (mtime, mtime))
+    return df
+
+
+@unittest.skipUnless(has_parquet, 'parquet files require pyarrow or fastparquet')
+class TestInputCache(unittest.TestCase):
+
+    def test_load(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # INPUTS
+            location = os.path.join(tmp_dir, 'data') + '/'
+            cache = InputCache(os.path.join(tmp_dir, 'cache'))
+            source_df = write_site(location, 'SITE01', np.arange(8.), 1.6e9)
+
+            # Expected Output
+            expected_output = source_df[['ac_power_02']]
+
+            # Output
+            with patch.object(input_cache, 'load_generic_data', wraps=input_cache.load_generic_data) as load:
+                cache.load(location, None, 'SITE01')
+                actual_output = cache.load(location, None, 'SITE01', columns=['ac_power_02', 'ac_power_03'])
+                n_reads = load.call_count
+
+            self.assertEqual(1, n_reads)
+            pd.testing.assert_frame_equal(expected_output, actual_output, check_freq=False)
+
+    def test_source_changed(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # INPUTS
+            location = os.path.join(tmp_dir, 'data') + '/'
+            cache = InputCache(os.path.join(tmp_dir, 'cache'))
+            write_site(location, 'SITE01', np.arange(8.), 1.6e9)
+            cache.load(location, None, 'SITE01')
+            source_df = write_site(location, 'SITE01', np.arange(8.) + 100, 1.7e9)
+
+            # Expected Output
+            expected_output = source_df
+
+            # Output
+            with patch.object(input_cache, 'load_generic_data', wraps=input_cache.load_generic_data) as load:
+                actual_output = cache.load(location, None, 'SITE01')
+                cache.load(location, None, 'SITE01')
+                n_reads = load.call_count
+
+            self.assertEqual(1, n_reads)
+            self.assertEqual(1, len(cache._cached_files()))
+            pd.testing.assert_frame_equal(expected_output, actual_output, check_freq=False)
+
+    def test_locations(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # INPUTS
+            location_1 = os.path.join(tmp_dir, 'data_1') + '/'
+            location_2 = os.path.join(tmp_dir, 'data_2') + '/'
+            cache = InputCache(os.path.join(tmp_dir, 'cache'))
+            source_1 = write_site(location_1, 'SITE01', np.arange(8.), 1.6e9)
+            source_2 = write_site(location_2, 'SITE01', np.arange(8.) * 2, 1.6e9)
+
+            # Expected Output
+            expected_output = [source_1, source_2, source_1]
+
+            # Output
+            actual_output = [cache.load(location, None, 'SITE01') for location in [location_1, location_2, location_1]]
+
+            self.assertEqual(2, len(cache._cached_files()))
+            for expected_df, actual_df in zip(expected_output, actual_output):
+                pd.testing.assert_frame_equal(expected_df, actual_df, check_freq=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
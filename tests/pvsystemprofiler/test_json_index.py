@@ -0,0 +1,79 @@
+import unittest
+import os
+import json
+import tempfile
+from pathlib import Path
+import numpy as np
+path = Path.cwd().parent.parent
+os.chdir(path)
+from pvsystemprofiler.scripts.modules.json_index import JsonIndex
+
+
+def site_json(inverter_ids, tilts, location='1 Main St, Palo Alto, CA 94305'):
+    return {'Site': {'location': location, 'longitude': '-122.14', 'latitude': '37.44'},
+            'Inverters': {'Inverter {}'.format(ix + 1): {'inverter_id': inv_id}
+                          for ix, inv_id in enumerate(inverter_ids)},
+            'Mount': {'Mount {}'.format(ix + 1): {'tilt': tilt, 'azimuth': 180} for ix, tilt in enumerate(tilts)}}
+
+
+def write_json(location, file_name, content):
+    with open(os.path.join(location, file_name), 'w') as f:
+        f.write(json.dumps(content) + '\n')
+
+
+class TestJsonIndex(unittest.TestCase):
+
+    def test_update(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # INPUTS
+            location = tmp_dir + '/'
+            index_file = os.path.join(tmp_dir, 'index.csv')
+            write_json(tmp_dir, 'a.json', site_json([1001, 1002], [20, '']))
+            write_json(tmp_dir, 'b.json', site_json([2001], [30]))
+            write_json(tmp_dir, 'c.json', {'Site': {}, 'Inverters': {}})
+            JsonIndex(index_file).update(location, ['a.json', 'b.json', 'c.json'], ['e1', 'e1', 'e1'])
+
+            # Expected Output
+            expected_output = {'1001': ['94305', -122.14, 37.44, 25., 180.],
+                               '1003': ['94305', -122.14, 37.44, 35., 180.]}
+
+            # Output
+            write_json(tmp_dir, 'a.json', site_json([1001, 1003], [25, 35]))
+            index = JsonIndex(index_file)
+            # unchanged files are not parsed again, changed files are and removed files are dropped
+            n_unchanged = index.update(location, ['a.json', 'b.json', 'c.json'], ['e1', 'e1', 'e1'])
+            n_changed = index.update(location, ['a.json', 'c.json'], ['e2', 'e1'])
+            actual_output = JsonIndex(index_file).systems()
+
+            self.assertEqual(0, n_unchanged)
+            self.assertEqual(1, n_changed)
+            self.assertListEqual(['a.json', 'a.json', 'c.json'], sorted(JsonIndex(index_file).table['file']))
+            self.assertDictEqual(expected_output, actual_output)
+
+    def test_systems(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # INPUTS
+            location = tmp_dir + '/'
+            index_file = os.path.join(tmp_dir, 'index.csv')
+            write_json(tmp_dir, 'a.json', site_json([1001, 1002], [20, ''], location='unknown'))
+            # system ids are read from the csv files as strings
+            system_id = 'ac_power_1002'[len('ac_power_'):]
+
+            # Expected Output
+            expected_output = ['00000', -122.14, 37.44, np.nan, 180.]
+
+            # Output
+            in_memory = JsonIndex().update(location, ['a.json'])
+            JsonIndex(index_file).update(location, ['a.json'])
+            systems = JsonIndex(index_file).systems()
+            actual_output = systems[system_id]
+
+            self.assertEqual(1, in_memory)
+            self.assertListEqual(['1001', '1002'], sorted(systems))
+            self.assertEqual(expected_output[:3], actual_output[:3])
+            self.assertTrue(np.isnan(actual_output[3]))
+            self.assertEqual(expected_output[4], actual_output[4])
+
+
+if __name__ == '__main__':
+    unittest.main()
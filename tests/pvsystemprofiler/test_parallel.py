@@ -0,0 +1,91 @@
+import unittest
+import os
+import tempfile
+from pathlib import Path
+import numpy as np
+path = Path.cwd().parent.parent
+os.chdir(path)
+from pvsystemprofiler.utilities.parallel import evaluate_configurations
+from pvsystemprofiler.utilities.parallel import run_in_process_pool
+
+
+def square(x, crash_dir=None, crashes=0):
+    # the worker process dies the first `crashes` times it runs the task, counted with marker files in `crash_dir`
+    if crash_dir is not None:
+        crashed = len([f for f in os.listdir(crash_dir) if f.startswith('task_{}_'.format(x))])
+        if crashed < crashes:
+            open(os.path.join(crash_dir, 'task_{}_{}'.format(x, crashed)), 'w').close()
+            os._exit(1)
+    if x < 0:
+        raise ValueError('negative input')
+    return x * x
+
+
+class TestParallel(unittest.TestCase):
+
+    def test_evaluate_configurations(self):
+        # INPUTS
+        configurations = [(x, y) for x in np.arange(5) for y in np.arange(4)]
+
+        # Expected Output
+        expected_output = [x * y for x, y in configurations]
+
+        # Output
+        sequential = dict(evaluate_configurations(lambda x, y: x * y, configurations))
+        threaded = dict(evaluate_configurations(lambda x, y: x * y, configurations, max_workers=4))
+        actual_output = [threaded[ix] for ix in range(len(configurations))]
+
+        self.assertListEqual(sorted(sequential), list(range(len(configurations))))
+        self.assertListEqual(expected_output, actual_output)
+
+    def test_run_in_process_pool(self):
+        # INPUTS
+        tasks = [(x,) for x in [1, 2, -3, 4]]
+
+        # Expected Output
+        expected_output = [((1,), 1, None), ((2,), 4, None), ((-3,), None, 'ValueError: negative input'),
+                           ((4,), 16, None)]
+
+        # Output
+        actual_output = list(run_in_process_pool(square, tasks, 2))
+
+        self.assertListEqual(expected_output, actual_output)
+
+    def test_crash_is_retried(self):
+        with tempfile.TemporaryDirectory() as crash_dir:
+            # INPUTS
+            tasks = [(x, crash_dir, 1 if x == 2 else 0) for x in range(5)]
+
+            # Expected Output
+            expected_output = [x * x for x in range(5)]
+
+            # Output
+            output = list(run_in_process_pool(square, tasks, 2))
+            actual_output = [result for _, result, _ in output]
+
+            self.assertListEqual([task for task, _, _ in output], tasks)
+            self.assertListEqual([None] * 5, [error for _, _, error in output])
+            self.assertListEqual(expected_output, actual_output)
+
+    def test_max_attempts(self):
+        for max_attempts in [1, 2, 3]:
+            with tempfile.TemporaryDirectory() as crash_dir:
+                # INPUTS
+                tasks = [(x, crash_dir, 10 if x == 2 else 0) for x in range(5)]
+
+                # Expected Output
+                expected_errors = [None, None, 'BrokenProcessPool: worker process died {} times'.format(max_attempts),
+                                   None, None]
+
+                # Output
+                output = list(run_in_process_pool(square, tasks, 2, max_attempts=max_attempts))
+                actual_errors = [error for _, _, error in output]
+                crashes = len(os.listdir(crash_dir))
+
+                self.assertListEqual(expected_errors, actual_errors)
+                self.assertListEqual([0, 1, None, 9, 16], [result for _, result, _ in output])
+                self.assertEqual(max_attempts, crashes)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+import os
+import tempfile
+from pathlib import Path
+import numpy as np
+import pandas as pd
+path = Path.cwd().parent.parent
+os.chdir(path)
+from pvsystemprofiler.utilities.prefetch import Prefetcher
+
+
+class TestPrefetch(unittest.TestCase):
+
+    def test_prefetcher(self):
+        # INPUTS
+        location = tempfile.mkdtemp()
+        site_ids = ['site_{:02d}'.format(ix) for ix in range(6)]
+        for ix, site_id in enumerate(site_ids):
+            pd.DataFrame({'ac_power_01': np.arange(10) * ix}).to_csv(os.path.join(location, site_id + '.csv'))
+        tasks = [(os.path.join(location, site_id + '.csv'),) for site_id in site_ids] + [('missing.csv',)]
+
+        # Expected Output
+        expected_output = [45 * ix for ix in range(6)]
+
+        # Output
+        prefetcher = Prefetcher(lambda file_name: pd.read_csv(file_name, index_col=0), tasks, depth=2)
+        results = list(prefetcher)
+        actual_output = [df['ac_power_01'].sum() for _, df, _ in results[:-1]]
+        metrics = prefetcher.metrics()
+
+        self.assertListEqual(expected_output, actual_output)
+        self.assertListEqual(tasks, [task for task, _, _ in results])
+        self.assertIsNotNone(results[-1][2])
+        self.assertEqual(len(tasks), metrics['requests'])
+        self.assertLessEqual(metrics['mean_queue_depth'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+import os
+from pathlib import Path
+import numpy as np
+import pandas as pd
+path = Path.cwd().parent.parent
+os.chdir(path)
+from pvsystemprofiler.production_profile import build_production_profile, profile_configurations, profile_tradeoff
+
+
+class TestProductionProfile(unittest.TestCase):
+
+    def test_build_production_profile(self):
+        # INPUTS
+        frames = []
+        for site, residuals in [('a', [0.1, 2.0, 0.3]), ('b', [0.2, 3.0, 1.5]), ('c', [1.0, 2.5, 0.1])]:
+            df = pd.DataFrame({'estimator': ['fit_l1', 'calculated', 'fit_l2'], 'eot_calculation': 'duffie',
+                               'solar_noon_method': 'energy_com', 'day_selection_method': 'all',
+                               'data_matrix': 'filled', 'residual': residuals})
+            df['site'] = site
+            df['system'] = '1'
+            frames.append(df)
+        results = pd.concat(frames)
+
+        # Expected Output
+        expected_order = ['fit_l1', 'fit_l2', 'calculated']
+
+        # Output
+        profile = build_production_profile(results, study='longitude')
+        top_2 = profile_configurations(profile, 'longitude', top_k=2)
+        tradeoff = profile_tradeoff(results, profile, top_k=(1, 3))
+
+        self.assertListEqual(expected_order, profile['estimator'].tolist())
+        self.assertListEqual([1, 2, 3], profile['rank'].tolist())
+        self.assertListEqual(['fit_l1', 'fit_l2'], [config[0] for config in top_2])
+        np.testing.assert_almost_equal(tradeoff['median_best_abs_residual'].values, [0.2, 0.1])
+
+
+if __name__ == '__main__':
+    unittest.main()
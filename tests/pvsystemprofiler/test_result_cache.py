@@ -0,0 +1,32 @@
+import unittest
+import os
+from pathlib import Path
+import numpy as np
+path = Path.cwd().parent.parent
+os.chdir(path)
+from pvsystemprofiler.utilities.result_cache import ResultCache, array_hash
+
+
+class TestResultCache(unittest.TestCase):
+
+    def test_result_cache(self):
+        # INPUTS
+        data_matrix = np.arange(288 * 10, dtype=float).reshape(288, 10)
+        clear_index = np.arange(10) % 2 == 0
+
+        cache = ResultCache(maxsize=2)
+        key = array_hash(data_matrix, clear_index)
+        self.assertIsNone(cache.get(key))
+        cache.put(key, np.ones(10))
+        # identical content in a different array object hits the cache
+        np.testing.assert_array_equal(cache.get(array_hash(data_matrix.copy(), clear_index.copy())), np.ones(10))
+        self.assertNotEqual(key, array_hash(data_matrix, ~clear_index))
+
+        cache.put('b', 2)
+        cache.put('c', 3)
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(cache.stats(), {'hits': 1, 'disk_hits': 0, 'misses': 2, 'size': 2})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+import os
+import tempfile
+from pathlib import Path
+import pandas as pd
+path = Path.cwd().parent.parent
+os.chdir(path)
+from pvsystemprofiler.scripts.modules.result_sink import ResultSink
+
+
+def site_results(site_id, n_systems):
+    return pd.DataFrame({'site': [site_id] * n_systems,
+                         'system': ['{}_{}'.format(site_id, ix) for ix in range(n_systems)],
+                         'longitude': [-120. - ix for ix in range(n_systems)]})
+
+
+class TestResultSink(unittest.TestCase):
+
+    def test_write_finalize(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            # INPUTS
+            output_file = os.path.join(output_dir, 'results.csv')
+            sink = ResultSink(output_file)
+
+            # Expected Output
+            expected_output = pd.concat([site_results('A', 2), site_results('B', 1), site_results('C', 3)],
+                                        ignore_index=True)
+
+            # Output
+            self.assertIsNone(sink.read())
+            sink.write('A', site_results('A', 2))
+            sink.write('B', site_results('B', 1))
+            pd.testing.assert_frame_equal(expected_output[:3], sink.read())
+            sink.finalize()
+            # parts written after finalize are merged with the consolidated results
+            sink.write('C', site_results('C', 3))
+            self.assertEqual(1, len(os.listdir(sink.parts_dir)))
+            sink.finalize()
+            actual_output = ResultSink(output_file).read()
+
+            self.assertFalse(os.path.isdir(sink.parts_dir))
+            self.assertListEqual(list(range(6)), pd.read_csv(output_file, index_col=0).index.tolist())
+            pd.testing.assert_frame_equal(expected_output, actual_output)
+
+    def test_discard(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            # INPUTS
+            output_file = os.path.join(output_dir, 'results.csv')
+            sink = ResultSink(output_file)
+            sink.write('A', site_results('A', 2))
+            sink.write('B', site_results('B', 2))
+            sink.write('AB', site_results('AB', 1))
+
+            # Expected Output
+            expected_output = pd.concat([site_results('A', 2), site_results('AB', 1)], ignore_index=True)
+
+            # Output
+            # a resumed run discards the results of the site that was not recorded as completed
+            resumed = ResultSink(output_file)
+            resumed.discard('B')
+            actual_output = resumed.read()
+
+            pd.testing.assert_frame_equal(expected_output, actual_output)
+
+    def test_resume_after_crash(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            # INPUTS
+            output_file = os.path.join(output_dir, 'results.csv')
+            sink = ResultSink(output_file)
+            sink.write('A', site_results('A', 1))
+            sink.write('B', site_results('B', 1))
+            sink.discard('A')
+            # a crash while writing a part leaves its temporary file behind
+            with open(os.path.join(sink.parts_dir, 'part-000002-C.csv.tmp'), 'w') as f:
+                f.write('site,sys')
+
+            # Expected Output
+            expected_output = pd.concat([site_results('B', 1), site_results('C', 1)], ignore_index=True)
+
+            # Output
+            resumed = ResultSink(output_file)
+            n_parts = resumed.n_parts
+            file_name = resumed.write('C', site_results('C', 1))
+            actual_output = resumed.read()
+
+            # part numbers are not reused after parts are discarded
+            self.assertEqual(2, n_parts)
+            self.assertEqual('part-000002-C.csv', os.path.basename(file_name))
+            pd.testing.assert_frame_equal(expected_output, actual_output)
+
+
+if __name__ == '__main__':
+    unittest.main()
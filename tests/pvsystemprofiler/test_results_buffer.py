@@ -0,0 +1,41 @@
+import unittest
+import os
+from pathlib import Path
+import numpy as np
+import pandas as pd
+path = Path.cwd().parent.parent
+os.chdir(path)
+from pvsystemprofiler.utilities.results_buffer import ResultsBuffer
+
+
+class TestResultsBuffer(unittest.TestCase):
+
+    def test_results_buffer(self):
+        # INPUTS
+        columns = ['longitude', 'estimator', 'data_matrix', 'passes']
+        rows = [[-122.1 + ix, est, dm, ix % 2 == 0]
+                for ix, (est, dm) in enumerate([(e, d) for e in ['calculated', 'fit_l1', 'fit_huber']
+                                                 for d in ['raw', 'filled']])]
+        rows[3][0] = None
+
+        # Expected Output
+        expected_output = pd.DataFrame([dict(zip(columns, row)) for row in rows], columns=columns)
+        expected_output['longitude'] = expected_output['longitude'].astype(float)
+
+        # Output
+        # the buffer is allocated for fewer rows than are set, and grows
+        buffer = ResultsBuffer(columns, 2, numeric_columns=['longitude'], boolean_columns=['passes'])
+        for ix, row in enumerate(rows):
+            buffer.set_row(ix, row)
+        actual_output = buffer.to_frame()
+
+        self.assertIsInstance(actual_output['estimator'].dtype, pd.CategoricalDtype)
+        self.assertIsInstance(actual_output['data_matrix'].dtype, pd.CategoricalDtype)
+        self.assertEqual(np.float64, actual_output['longitude'].dtype)
+        self.assertEqual(np.bool_, actual_output['passes'].dtype)
+        actual_output = actual_output.astype({'estimator': object, 'data_matrix': object})
+        pd.testing.assert_frame_equal(expected_output, actual_output, check_dtype=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
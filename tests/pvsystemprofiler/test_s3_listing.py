@@ -0,0 +1,214 @@
+import unittest
+import os
+import io
+import hashlib
+import tempfile
+from pathlib import Path
+from time import time
+from botocore.exceptions import ClientError
+import numpy as np
+import pandas as pd
+path = Path.cwd().parent.parent
+os.chdir(path)
+from pvsystemprofiler.scripts.modules.s3_listing import list_objects
+from pvsystemprofiler.scripts.modules.s3_listing import read_header
+from pvsystemprofiler.scripts.modules.s3_listing import S3Manifest
+from pvsystemprofiler.scripts.modules.script_functions import create_system_list
+
+
+class StubPaginator():
+    def __init__(self, client):
+        self.client = client
+
+    def paginate(self, Bucket, Prefix, Delimiter=None):
+        self.client.listed.append(Prefix)
+        keys = sorted(k for k in self.client.objects if k.startswith(Prefix))
+        contents, prefixes = [], []
+        for key in keys:
+            ix = -1 if Delimiter is None else key.find(Delimiter, len(Prefix))
+            if ix == -1:
+                contents.append({'Key': key, 'Size': len(self.client.objects[key]),
+                                 'ETag': '"{}"'.format(hashlib.md5(self.client.objects[key]).hexdigest()),
+                                 'LastModified': '2021-01-01'})
+            elif key[:ix + 1] not in prefixes:
+                prefixes.append(key[:ix + 1])
+        # pages hold at most `page_size` objects, as the 1000 objects of list_objects_v2
+        size = self.client.page_size
+        for ix in range(0, max(len(contents), 1), size):
+            page = {'Contents': contents[ix:ix + size]}
+            if ix == 0 and len(prefixes) > 0:
+                page['CommonPrefixes'] = [{'Prefix': p} for p in prefixes]
+            yield page
+
+
+class StubClient():
+    def __init__(self, objects, page_size=2):
+        self.objects = objects
+        self.page_size = page_size
+        self.listed = []
+        self.requests = []
+
+    def get_paginator(self, operation):
+        return StubPaginator(self)
+
+    def get_object(self, Bucket, Key, Range):
+        self.requests.append(Key)
+        content = self.objects[Key]
+        first, last = [int(v) for v in Range[len('bytes='):].split('-')]
+        if first >= len(content):
+            raise ClientError({'Error': {'Code': 'InvalidRange'}}, 'GetObject')
+        return {'Body': io.BytesIO(content[first:last + 1])}
+
+
+def stub_objects():
+    return {'data/1_signal.csv': b'ts,ac_power_01,ac_power_02\n2020-01-01,1,2\n',
+            'data/2_signal.csv': b'ts,dc_current_01\r\n2020-01-01,1\r\n',
+            'data/3_signal.csv': b'ts\n2020-01-01\n',
+            'data/4_signal.csv': b'',
+            'data/1_signal.json': b'{}',
+            'data/sub_a/5_signal.csv': b'ts,ac_power_03\n',
+            'data/sub_a/6_signal.csv': b'ts,ac_power_04\n',
+            'data/sub_a/7_signal.csv': b'ts,ac_power_05\n',
+            'data/sub_b/8_signal.csv': b'ts,ac_power_06\n',
+            'other/9_signal.csv': b'ts,ac_power_07\n'}
+
+
+class TestS3Listing(unittest.TestCase):
+
+    def test_list_objects(self):
+        # INPUTS
+        client = StubClient(stub_objects())
+
+        # Expected Output
+        expected_output = sorted(k for k in stub_objects() if k.startswith('data/'))
+
+        # Output
+        df = list_objects('s3://bucket/data', client=client)
+        actual_output = df['key'].tolist()
+
+        self.assertListEqual(['data/', 'data/sub_a/', 'data/sub_b/'], sorted(client.listed))
+        self.assertListEqual([0, 15], df.loc[df['key'].isin(['data/4_signal.csv', 'data/sub_a/5_signal.csv']),
+                                             'size'].tolist())
+        self.assertListEqual(expected_output, actual_output)
+
+    def test_read_header(self):
+        # INPUTS
+        client = StubClient(stub_objects())
+
+        # Expected Output
+        expected_output = ['ts,ac_power_01,ac_power_02', 'ts,dc_current_01', 'ts', '']
+
+        # Output
+        actual_output = [read_header(client, 'bucket', 'data/{}_signal.csv'.format(ix), nbytes=8)
+                         for ix in range(1, 5)]
+
+        self.assertListEqual(expected_output, actual_output)
+
+    def test_manifest(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # INPUTS
+            manifest_file = os.path.join(tmp_dir, 'manifest.csv')
+            client = StubClient(stub_objects())
+
+            # Expected Output
+            expected_output = S3Manifest('s3://bucket/data', client=client).objects()
+
+            # Output
+            client.listed = []
+            S3Manifest('s3://bucket/data', manifest_file, client=client).objects()
+            n_listed = len(client.listed)
+            actual_output = S3Manifest('s3://bucket/data', manifest_file, client=client).objects()
+            n_reused = len(client.listed) - n_listed
+
+            self.assertEqual(3, n_listed)
+            self.assertEqual(0, n_reused)
+            pd.testing.assert_frame_equal(expected_output, actual_output, check_dtype=False)
+
+    def test_manifest_invalidation(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # INPUTS
+            manifest_file = os.path.join(tmp_dir, 'manifest.csv')
+            client = StubClient(stub_objects())
+            S3Manifest('s3://bucket/data', manifest_file, client=client).objects()
+
+            # Expected Output
+            expected_output = [['other/9_signal.csv'], ['other/9_signal.csv'],
+                               ['other/10_signal.csv', 'other/9_signal.csv']]
+
+            # Output
+            # a manifest of another location is not reused
+            other = S3Manifest('s3://bucket/other', manifest_file, client=client).objects()
+            client.objects['other/10_signal.csv'] = b'ts\n'
+            # a manifest is reused until it expires
+            fresh = S3Manifest('s3://bucket/other', manifest_file, max_age=3600, client=client).objects()
+            os.utime(manifest_file, (time() - 7200, time() - 7200))
+            expired = S3Manifest('s3://bucket/other', manifest_file, max_age=3600, client=client).objects()
+            actual_output = [df['key'].tolist() for df in [other, fresh, expired]]
+
+            self.assertListEqual(expected_output, actual_output)
+
+    def test_headers(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # INPUTS
+            manifest_file = os.path.join(tmp_dir, 'manifest.csv')
+            client = StubClient(stub_objects())
+
+            # Expected Output
+            expected_output = [['ts', 'ac_power_01', 'ac_power_02'], ['ts', 'dc_current_01'], ['ts', 'ac_power_08'],
+                               [], ['ts', 'ac_power_03'], ['ts', 'ac_power_04'], ['ts', 'ac_power_05'],
+                               ['ts', 'ac_power_06']]
+
+            # Output
+            S3Manifest('s3://bucket/data', manifest_file, client=client).headers()
+            first_requests = sorted(client.requests)
+            client.requests = []
+            # only the headers of the files that changed are read again
+            client.objects['data/3_signal.csv'] = b'ts,ac_power_08\n'
+            manifest = S3Manifest('s3://bucket/data', manifest_file, client=client)
+            manifest.invalidate()
+            headers = manifest.headers()
+            actual_output = headers['columns'].tolist()
+
+            self.assertEqual(7, len(first_requests))
+            self.assertNotIn('data/4_signal.csv', first_requests)
+            self.assertListEqual(['data/3_signal.csv'], client.requests)
+            self.assertListEqual(['1_signal.csv', '2_signal.csv', '3_signal.csv', '4_signal.csv', '5_signal.csv',
+                                  '6_signal.csv', '7_signal.csv', '8_signal.csv'], headers['file'].tolist())
+            self.assertListEqual(expected_output, actual_output)
+
+    def test_create_system_list(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # INPUTS
+            index = pd.date_range('2020-01-01', periods=4, freq='15min', name='ts')
+            sites = {'1': pd.DataFrame({'ac_power_01': np.arange(4.), 'ac_power_02': np.arange(4.)}, index=index),
+                     '2': pd.DataFrame({'dc_current_01': np.arange(4.), 'ac_power_10': np.arange(4.)}, index=index),
+                     # files with no data columns have no systems
+                     '3': pd.DataFrame(index=index),
+                     '4': pd.DataFrame({'temperature': np.arange(4.)}, index=index)}
+            objects = {'data/1_signal.json': b'{}'}
+            for site_id, df in sites.items():
+                df.to_csv(os.path.join(tmp_dir, site_id + '_signal.csv'))
+                with open(os.path.join(tmp_dir, site_id + '_signal.csv'), 'rb') as f:
+                    objects['data/{}_signal.csv'.format(site_id)] = f.read()
+            objects['data/5_signal.csv'] = b''
+            client = StubClient(objects)
+
+            # Expected Output
+            # systems found by reading the first rows of every file
+            rows = []
+            for site_id in sites:
+                columns = pd.read_csv(os.path.join(tmp_dir, site_id + '_signal.csv'), index_col=0, nrows=2).columns
+                rows.extend((site_id, c[len('ac_power_'):]) for c in columns if c.find('ac_power_') != -1)
+            expected_output = pd.DataFrame(rows, columns=['site', 'system'])
+
+            # Output
+            actual_output = create_system_list('_signal', 'ac_power_', 's3://bucket/data', client=client)
+
+            self.assertNotIn('data/5_signal.csv', client.requests)
+            self.assertListEqual([('1', '01'), ('1', '02'), ('2', '10')], list(expected_output.itertuples(index=False,
+                                                                                                          name=None)))
+            pd.testing.assert_frame_equal(expected_output, actual_output)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+import os
+from pathlib import Path
+path = Path.cwd().parent.parent
+os.chdir(path)
+from pvsystemprofiler.scripts.modules.script_functions import generate_list
+from pvsystemprofiler.scripts.modules.script_functions import get_commandline_inputs
+from pvsystemprofiler.scripts.modules.script_functions import split_commandline_options
+
+
+class TestScriptFunctions(unittest.TestCase):
+
+    def test_generate_list_check_json_without_location(self):
+        # INPUTS
+        inputs_dict = {'s3_location': None, 'check_json': True, 'estimation': 'report', 'input_site_file': None}
+
+        # Output
+        with self.assertRaises(ValueError):
+            generate_list(inputs_dict, None, None)
+
+    def test_commandline_options(self):
+        # INPUTS
+        positional_kwargs = ['run_partition_script.py', 'report', 'None', 'all', 's3://bucket/data/', '_signal',
+                             'ac_power_', 'results.csv', 'True', 'False', 'False', 'True', 'None', '-8', 's3',
+                             'parameter_estimation_script.py', 'pvi-user', 'pvi-dev']
+        input_kwargs = positional_kwargs[:2] + ['--workers', '4'] + positional_kwargs[2:] + \
+            ['--cache-dir', '/tmp/cache', '--manifest-max-age', '0.5']
+
+        # Expected Output
+        expected_output = ['--workers', '4', '--cache-dir', '/tmp/cache', '--manifest-max-age', '0.5']
+
+        # Output
+        actual_positional, actual_output = split_commandline_options(input_kwargs)
+        inputs_dict = get_commandline_inputs(input_kwargs)
+
+        self.assertListEqual(positional_kwargs, actual_positional)
+        self.assertListEqual(expected_output, actual_output)
+        self.assertListEqual(expected_output, inputs_dict['options'])
+        self.assertEqual(4, inputs_dict['workers'])
+        self.assertEqual('/tmp/cache', inputs_dict['cache_dir'])
+        self.assertEqual(1800., inputs_dict['manifest_max_age'])
+        self.assertEqual(1, inputs_dict['prefetch'])
+        self.assertEqual('s3', inputs_dict['data_source'])
+
+
+if __name__ == '__main__':
+    unittest.main()
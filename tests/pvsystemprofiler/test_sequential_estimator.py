@@ -0,0 +1,111 @@
+import unittest
+import os
+from pathlib import Path
+from unittest import mock
+import numpy as np
+import pandas as pd
+path = Path.cwd().parent.parent
+os.chdir(path)
+from pvsystemprofiler.sequential_estimator import SequentialEstimator, monthly_chunks
+
+
+class FakeDataHandler():
+    # stands in for the solar-data-tools pipeline, only counts the days of the input signal
+    runs = 0
+
+    def __init__(self, df):
+        self.num_days = df.index.normalize().nunique()
+
+    def run_pipeline(self, **kwargs):
+        FakeDataHandler.runs += 1
+
+
+def converging_estimator(data_handler, gmt_offset, **kwargs):
+    estimator = mock.Mock()
+    estimator.longitude = -122. + 100. / data_handler.num_days
+    estimator.latitude = 37.
+    return estimator
+
+
+def oscillating_estimator(data_handler, gmt_offset, **kwargs):
+    estimator = mock.Mock()
+    estimator.longitude = -122. + 5 * (-1) ** FakeDataHandler.runs
+    estimator.latitude = 37.
+    return estimator
+
+
+def make_signal(days):
+    index = pd.date_range('2020-01-01', periods=days * 24, freq='h')
+    return pd.DataFrame({'ac_power_01': np.arange(len(index), dtype=float)}, index=index)
+
+
+class TestSequentialEstimator(unittest.TestCase):
+
+    def setUp(self):
+        FakeDataHandler.runs = 0
+
+    def test_monthly_chunks(self):
+        # INPUTS
+        df = make_signal(91)
+        # chunks of a csv reader do not align with months
+        reader = iter([df.iloc[:1000], df.iloc[1000:1500], df.iloc[1500:]])
+
+        # Expected Output
+        expected_output = [(pd.Period('2020-01', 'M'), 31 * 24), (pd.Period('2020-02', 'M'), 29 * 24),
+                           (pd.Period('2020-03', 'M'), 31 * 24)]
+
+        # Output
+        actual_output = [(chunk.index[0].to_period('M'), len(chunk)) for chunk in monthly_chunks(reader)]
+
+        self.assertListEqual(expected_output, actual_output)
+
+    @mock.patch('pvsystemprofiler.sequential_estimator.DataHandler', FakeDataHandler)
+    @mock.patch('pvsystemprofiler.sequential_estimator.ConfigurationEstimator', converging_estimator)
+    def test_stop_on_convergence(self):
+        # INPUTS
+        chunks = monthly_chunks(make_signal(1096))
+
+        # Output
+        sest = SequentialEstimator(-8, tolerance=0.5, patience=2, max_days=None).run(chunks)
+
+        self.assertTrue(sest.converged)
+        self.assertLess(sest.days_read, 1096)
+        # chunks after convergence are not read
+        self.assertEqual(1096 - sest.days_read, sum(len(chunk) for chunk in chunks) // 24)
+        # the pipeline is rerun each time the data read has grown by `growth`, not after every chunk
+        self.assertEqual(FakeDataHandler.runs, len(sest.history_table))
+        self.assertLess(len(sest.history_table), sest.history_table['chunk'].iloc[-1])
+        self.assertTrue(np.all(np.diff(sest.history_table['days_read']) >= 0.5 * sest.history_table['days_read'][:-1]))
+
+    @mock.patch('pvsystemprofiler.sequential_estimator.DataHandler', FakeDataHandler)
+    @mock.patch('pvsystemprofiler.sequential_estimator.ConfigurationEstimator', oscillating_estimator)
+    def test_stop_on_max_days(self):
+        # INPUTS
+        chunks = monthly_chunks(make_signal(1096))
+
+        # Output
+        sest = SequentialEstimator(-8, max_days=365).run(chunks)
+
+        self.assertFalse(sest.converged)
+        self.assertGreaterEqual(sest.days_read, 365)
+        self.assertLess(sest.days_read, 365 + 31)
+        self.assertEqual(sest.days_read, sest.history_table['days_read'].iloc[-1])
+
+    @mock.patch('pvsystemprofiler.sequential_estimator.DataHandler', FakeDataHandler)
+    @mock.patch('pvsystemprofiler.sequential_estimator.ConfigurationEstimator', oscillating_estimator)
+    def test_stop_on_exhaustion(self):
+        # INPUTS
+        chunks = monthly_chunks(make_signal(300))
+
+        # Output
+        sest = SequentialEstimator(-8, max_days=None).run(chunks)
+
+        self.assertFalse(sest.converged)
+        self.assertEqual(300, sest.days_read)
+        # the estimates are updated with all the data read
+        self.assertEqual(300, sest.history_table['days_read'].iloc[-1])
+        self.assertLess(FakeDataHandler.runs, 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+import os
+from pathlib import Path
+from unittest import mock
+import numpy as np
+import pandas as pd
+path = Path.cwd().parent.parent
+os.chdir(path)
+from solardatatools.sunrise_sunset import rise_set_rough
+from pvsystemprofiler.study_planner import StudyPlanner
+from pvsystemprofiler.longitude_study import LongitudeStudy
+from pvsystemprofiler.latitude_study import LatitudeStudy
+from pvsystemprofiler.tilt_azimuth_study import TiltAzimuthStudy
+from tests.pvsystemprofiler.synthetic_data import make_data_handler, seasonal_day_length
+
+
+def rough_sunrise_sunset(filled_data_matrix=None, raw_data_matrix=None):
+    # deterministic stand-in for the sunrise/sunset optimizer
+    optimized_dict = {}
+    for suffix, matrix in [('raw', raw_data_matrix), ('f', filled_data_matrix)]:
+        if matrix is None:
+            values = {'est_sr': None, 'est_ss': None, 'meas_sr': None, 'meas_ss': None, 'thres': None}
+        else:
+            rise_set = rise_set_rough(matrix > 0.05 * np.max(matrix))
+            values = {'est_sr': rise_set['sunrises'], 'est_ss': rise_set['sunsets'], 'meas_sr': rise_set['sunrises'],
+                      'meas_ss': rise_set['sunsets'], 'thres': 5.}
+        for key, value in values.items():
+            optimized_dict[key + '_' + suffix] = value
+    return optimized_dict
+
+
+class TestStudyPlanner(unittest.TestCase):
+
+    @mock.patch('pvsystemprofiler.longitude_study.get_optimized_sunrise_sunset', rough_sunrise_sunset)
+    @mock.patch('pvsystemprofiler.latitude_study.get_optimized_sunrise_sunset', rough_sunrise_sunset)
+    @mock.patch('pvsystemprofiler.study_planner.get_optimized_sunrise_sunset', rough_sunrise_sunset)
+    def test_planner_parity(self):
+        # INPUTS
+        data_handler = make_data_handler(365, seasonal_day_length(365), noon=12.3)
+        ta_kwargs = {'lon_input': -122., 'threshold_quantile': [0.9],
+                     'cvx_parameter': [0.9], 'init_values': [[35], [30], [0]]}
+
+        # Expected Output
+        longitude = LongitudeStudy(data_handler, gmt_offset=-8)
+        longitude.run(verbose=False)
+        latitude = LatitudeStudy(data_handler)
+        latitude.run()
+        tilt_azimuth = TiltAzimuthStudy(data_handler, gmt_offset=-8, **ta_kwargs)
+        tilt_azimuth.run()
+
+        # Output
+        planner = StudyPlanner(data_handler, gmt_offset=-8)
+        planner.add_longitude_study()
+        planner.add_latitude_study()
+        planner.add_tilt_azimuth_study(**ta_kwargs)
+        studies = planner.run()
+
+        self.assertGreater(len(tilt_azimuth.results), 0)
+        pd.testing.assert_frame_equal(longitude.results, studies['longitude'].results)
+        pd.testing.assert_frame_equal(latitude.results, studies['latitude'].results)
+        pd.testing.assert_frame_equal(tilt_azimuth.results, studies['tilt_azimuth'].results)
+        # every intermediate result is released once its last consumer has finished
+        intermediates = set(planner.graph) - set(studies)
+        self.assertSetEqual(intermediates, set(planner.released_nodes))
+
+
+if __name__ == '__main__':
+    unittest.main()
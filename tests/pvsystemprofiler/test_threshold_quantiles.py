@@ -0,0 +1,25 @@
+import unittest
+import os
+from pathlib import Path
+import numpy as np
+path = Path.cwd().parent.parent
+os.chdir(path)
+from pvsystemprofiler.algorithms.tilt_azimuth.daytime_threshold_quantile import calculate_threshold_quantiles
+
+
+class TestThresholdQuantiles(unittest.TestCase):
+
+    def test_threshold_quantiles(self):
+        # INPUTS
+        np.random.seed(0)
+        data_matrix = np.random.uniform(low=0, high=5, size=(288, 40))
+        quantiles = [0.5, 0.55, 0.6, 0.65, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95]
+
+        actual_output = calculate_threshold_quantiles(data_matrix, quantiles)
+        for q in quantiles:
+            expected_output = np.quantile(data_matrix, q, axis=0)
+            np.testing.assert_array_almost_equal(actual_output[q], expected_output)
+
+
+if __name__ == '__main__':
+    unittest.main()
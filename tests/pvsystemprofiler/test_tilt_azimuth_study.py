@@ -0,0 +1,64 @@
+import unittest
+import os
+from pathlib import Path
+from unittest import mock
+import pandas as pd
+path = Path.cwd().parent.parent
+os.chdir(path)
+from pvsystemprofiler import tilt_azimuth_study
+from pvsystemprofiler.tilt_azimuth_study import TiltAzimuthStudy
+from tests.pvsystemprofiler.synthetic_data import make_data_handler, seasonal_day_length
+
+
+class TestTiltAzimuthStudy(unittest.TestCase):
+
+    def test_iter_results(self):
+        # INPUTS
+        data_handler = make_data_handler(365, seasonal_day_length(365), noon=12.3)
+        study_kwargs = {'lon_input': -122., 'daytime_threshold': 0.1, 'init_values': [[35, 40], [30, 20], [0, 10]],
+                        'cvx_parameter': [0.9], 'threshold_quantile': [0.9],
+                        'lat_true_value': 37., 'tilt_true_value': 30., 'azimuth_true_value': 0.}
+
+        # Expected Output
+        study = TiltAzimuthStudy(data_handler, **study_kwargs)
+        study.run()
+        expected_output = study.results
+
+        # Output
+        actual_output = pd.DataFrame(TiltAzimuthStudy(data_handler, **study_kwargs).iter_results())
+
+        self.assertGreater(len(expected_output), 1)
+        pd.testing.assert_frame_equal(expected_output, actual_output, check_dtype=False, check_categorical=False)
+
+    def test_lazy_costheta(self):
+        # INPUTS
+        data_handler = make_data_handler(365, seasonal_day_length(365), noon=12.3)
+        study = TiltAzimuthStudy(data_handler, lon_input=-122., daytime_threshold=0.1, init_values=[[35], [30], [0]],
+                                 cvx_parameter=[0.9], threshold_quantile=[0.9], lat_true_value=37.,
+                                 tilt_true_value=30., azimuth_true_value=0.)
+        calculate_costheta = tilt_azimuth_study.calculate_costheta
+        calls = []
+
+        def counting_costheta(*args, **kwargs):
+            calls.append(kwargs)
+            return calculate_costheta(*args, **kwargs)
+
+        # Expected Output
+        expected_shape = data_handler.filled_data_matrix.shape
+
+        # Output
+        with mock.patch('pvsystemprofiler.tilt_azimuth_study.calculate_costheta', counting_costheta):
+            study.run()
+            calls_after_run = len(calls)
+            estimated = study.costheta_estimated
+            ground_truth = study.ground_truth_costheta('cooper')
+            study.ground_truth_costheta('cooper')
+
+        # cos(theta) matrices are only calculated on access, the ground truth once per declination method
+        self.assertEqual(0, calls_after_run)
+        self.assertEqual(2, len(calls))
+        self.assertEqual(expected_shape, estimated.shape)
+        self.assertEqual(expected_shape, ground_truth.shape)
+
+if __name__ == '__main__':
+    unittest.main()
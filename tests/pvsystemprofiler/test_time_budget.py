@@ -0,0 +1,30 @@
+import unittest
+import os
+from pathlib import Path
+path = Path.cwd().parent.parent
+os.chdir(path)
+from pvsystemprofiler.utilities.time_budget import TimeBudget, get_time_budget
+
+
+class TestTimeBudget(unittest.TestCase):
+
+    def test_time_budget(self):
+        # INPUTS
+        budget = TimeBudget(10)
+        unlimited = get_time_budget(None)
+
+        # Output
+        self.assertFalse(budget.is_low())
+        self.assertFalse(budget.is_expired())
+        budget.start_time -= 6
+        self.assertTrue(budget.is_low())
+        self.assertFalse(budget.is_expired())
+        budget.start_time -= 6
+        self.assertTrue(budget.is_expired())
+        self.assertIsNone(unlimited)
+        self.assertIs(get_time_budget(budget), budget)
+        self.assertFalse(TimeBudget().is_low())
+
+
+if __name__ == '__main__':
+    unittest.main()